@@ -1,12 +1,14 @@
 from pathlib import Path
-import re
-import pandas as pd
+import csv, math, re
+from indice_resultados import IndiceResultados
 
 # === Ajustes principales ===
 RUNS_DIR = Path("runs") / "detect"          # carpeta donde YOLO guarda las corridas
 OUT_DIR  = Path("audit_out"); OUT_DIR.mkdir(exist_ok=True)
 CSV_OUT  = OUT_DIR / "learning_curve.csv"
 XLSX_OUT = OUT_DIR / "learning_curve.xlsx"
+INDEX_OUT = OUT_DIR / "results_index.json"
+BENCH_CSV = "bench_onnx.csv"                # export + latencia por corrida (run_series_train.py)
 
 # Columnas posibles según versión de YOLOv8
 CAND_M50   = ["metrics/mAP50(B)", "val/box/mAP50", "map50"]         # mAP@0.5
@@ -17,8 +19,9 @@ CAND_TPE   = ["time/epoch", "time"]                                 # tiempo por
 
 # ===== Helpers =====
 def pick_col(df, candidates):
+    cols = getattr(df, "columns", df)  # DataFrame o lista de cabeceras
     for c in candidates:
-        if c in df.columns:
+        if c in cols:
             return c
     return None
 
@@ -37,65 +40,85 @@ def extract_N_from_name(exp_dir: Path):
                 return int(m2.group(1))
     return None
 
-def best_row(df):
-    """Devuelve la fila (Series) con mejor mAP@0.5 si existe; si no, la última."""
-    c_m50 = pick_col(df, CAND_M50)
-    if c_m50 and df[c_m50].notna().any():
-        return df.loc[df[c_m50].idxmax()]
-    else:
-        return df.iloc[-1]
-
-# ===== Recolecta resultados =====
-rows = []
+def _f(x):
+    try: return float(x)
+    except (TypeError, ValueError): return float("nan")
+
+def leer_bench(exp_dir: Path):
+    """Columnas mAP50@v, mAP50_95@v, fps@v, p95_ms@v por variante exportada (v = imgsz[_int8])."""
+    p = exp_dir / BENCH_CSV
+    if not p.exists():
+        return {}
+    out = {}
+    with open(p, newline="", encoding="utf-8") as f:
+        for b in csv.DictReader(f):
+            for c in ("mAP50", "mAP50_95", "fps", "p95_ms"):
+                out[f"{c}@{b['variante']}"] = _f(b.get(c))
+    return out
+
+def frente_pareto(lat, acc):
+    """Máscara de puntos no dominados (menor latencia, mayor exactitud)."""
+    orden = sorted(range(len(lat)), key=lambda i: (lat[i], -acc[i]))
+    mask, mejor = [False]*len(lat), -math.inf
+    for i in orden:
+        if acc[i] > mejor:
+            mask[i], mejor = True, acc[i]
+    return mask
+
+def resumir_run(exp_dir: Path, res: Path):
+    """Fila resumen de una corrida (mejor época por mAP@0.5, si no la última). Lee results.csv con csv (sin pandas)."""
+    try:
+        with open(res, newline="", encoding="utf-8") as f:
+            r = csv.reader(f)
+            header = [h.strip() for h in next(r)]
+            data = [row for row in r if row]
+    except Exception:
+        return None
+    if not data:
+        return None
+    col = {h: i for i, h in enumerate(header)}
+    def serie(c): return [_f(row[col[c]]) if col[c] < len(row) else float("nan") for row in data] if c else None
+
+    c_m50, c_m5095 = pick_col(header, CAND_M50), pick_col(header, CAND_M5095)
+    c_p, c_r, c_tpe = pick_col(header, CAND_PREC), pick_col(header, CAND_REC), pick_col(header, CAND_TPE)
+
+    m50 = serie(c_m50)
+    validos = [i for i, v in enumerate(m50 or []) if not math.isnan(v)]
+    bi = max(validos, key=lambda i: m50[i]) if validos else len(data) - 1
+    def en_best(c): return serie(c)[bi] if c else float("nan")
+
+    ep = serie("epoch" if "epoch" in col else None)
+    row = {
+        "exp": exp_dir.name,
+        "N_train": extract_N_from_name(exp_dir),  # puede quedar None si no reconoce el patrón
+        "epoch": int(ep[bi]) if ep and not math.isnan(ep[bi]) else len(data)-1,
+        "mAP50": en_best(c_m50),
+        "mAP50_95": en_best(c_m5095),
+        "precision": en_best(c_p),
+        "recall": en_best(c_r),
+    }
+    # tiempo total aprox si hay time/epoch
+    if c_tpe:
+        row["time_total_epochs(s)"] = float(sum(v for v in serie(c_tpe) if not math.isnan(v)))
+    row.update(leer_bench(exp_dir))
+    return row
+
+# ===== Recolecta resultados (índice incremental: solo se re-parsean corridas nuevas o cambiadas) =====
 if not RUNS_DIR.exists():
     print("No encuentro", RUNS_DIR.resolve())
-else:
-    for exp_dir in sorted(RUNS_DIR.iterdir()):
-        if not exp_dir.is_dir():
-            continue
-        res = exp_dir / "results.csv"
-        if not res.exists():
-            continue
-        try:
-            df = pd.read_csv(res)
-        except Exception:
-            continue
-        if df.empty:
-            continue
-
-        N = extract_N_from_name(exp_dir)  # puede quedar None si no reconoce el patrón
-        br = best_row(df)
-
-        c_m50   = pick_col(df, CAND_M50)
-        c_m5095 = pick_col(df, CAND_M5095)
-        c_p     = pick_col(df, CAND_PREC)
-        c_r     = pick_col(df, CAND_REC)
-        c_tpe   = pick_col(df, CAND_TPE)
-
-        row = {
-            "exp": exp_dir.name,
-            "N_train": N,
-            "epoch": int(br.get("epoch", len(df)-1)),
-            "mAP50": float(br.get(c_m50, float("nan"))) if c_m50 else float("nan"),
-            "mAP50_95": float(br.get(c_m5095, float("nan"))) if c_m5095 else float("nan"),
-            "precision": float(br.get(c_p, float("nan"))) if c_p else float("nan"),
-            "recall": float(br.get(c_r, float("nan"))) if c_r else float("nan"),
-        }
-        # tiempo total aprox si hay time/epoch
-        if c_tpe:
-            try:
-                total_time = float(df[c_tpe].sum())
-                row["time_total_epochs(s)"] = total_time
-            except Exception:
-                pass
-
-        rows.append(row)
+rows, cambiados = IndiceResultados(INDEX_OUT).actualizar(RUNS_DIR, resumir_run, extras=(BENCH_CSV,))
 
 # ===== Tabla ordenada por N (si falta, por nombre)
 if not rows:
     print("No se encontraron results.csv en", RUNS_DIR.resolve())
     raise SystemExit
 
+if not cambiados and CSV_OUT.exists() and XLSX_OUT.exists():
+    print(f"Sin cambios en {len(rows)} corridas; {CSV_OUT} y {XLSX_OUT} siguen vigentes.")
+    raise SystemExit
+print(f"Corridas: {len(rows)} | nuevas/cambiadas: {len(cambiados)}")
+
+import pandas as pd
 tab = pd.DataFrame(rows)
 if tab["N_train"].notna().any():
     tab = tab.sort_values(["N_train", "exp"], ascending=[True, True])
@@ -105,29 +128,84 @@ else:
 tab.to_csv(CSV_OUT, index=False)
 print("CSV guardado:", CSV_OUT)
 
+# ===== Exactitud vs latencia: una fila por (corrida, variante exportada) + frente de Pareto
+largo = []
+for _, r in tab.iterrows():
+    for c in tab.columns:
+        if c.startswith("p95_ms@") and not math.isnan(r[c]) and not math.isnan(r.get("mAP50@" + c[7:], math.nan)):
+            v = c[7:]
+            largo.append({"exp": r["exp"], "N_train": r["N_train"], "variante": v, "p95_ms": r[c],
+                          "fps": r.get("fps@" + v), "mAP50": r["mAP50@" + v], "mAP50_95": r.get("mAP50_95@" + v)})
+pareto = pd.DataFrame(largo)
+if len(pareto):
+    pareto["pareto"] = frente_pareto(list(pareto["p95_ms"]), list(pareto["mAP50"]))
+    pareto = pareto.sort_values("p95_ms")
+    print("Frente de Pareto (p95 ms vs mAP50):")
+    print(pareto[pareto["pareto"]][["exp", "variante", "p95_ms", "fps", "mAP50"]].to_string(index=False))
+
 # ===== Excel + gráfico mAP50 vs N =====
 with pd.ExcelWriter(XLSX_OUT, engine="openpyxl") as xw:
     tab.to_excel(xw, sheet_name="learning_curve", index=False)
 
-    # gráfico (si tenemos N y mAP50)
+    # gráfico (si tenemos N y mAP50): dispersión para que N quede a escala, con la curva ajustada
+    # (curva_aprendizaje.py) extrapolada más allá del mayor N entrenado
     if tab["N_train"].notna().any() and tab["mAP50"].notna().any():
-        from openpyxl.chart import LineChart, Reference
+        from openpyxl.chart import ScatterChart, Reference, Series
         ws = xw.sheets["learning_curve"]
         # ubicar rangos
         n_rows = len(tab) + 1  # + header
-        # categorías (N_train)
-        cat = Reference(ws, min_col=2, min_row=2, max_row=n_rows)   # col B = N_train
-        # serie mAP50
+        xs = Reference(ws, min_col=2, min_row=2, max_row=n_rows)   # col B = N_train
         m50_col = list(tab.columns).index("mAP50") + 1  # 1-indexed
-        data = Reference(ws, min_col=m50_col, min_row=1, max_row=n_rows)  # incluye header
-        chart = LineChart()
+        obs = Series(Reference(ws, min_col=m50_col, min_row=2, max_row=n_rows), xs, title="mAP50 observado")
+        obs.marker.symbol = "circle"; obs.graphicalProperties.line.noFill = True
+        chart = ScatterChart()
         chart.title = "mAP@0.5 vs N (train)"
         chart.y_axis.title = "mAP@0.5"
         chart.x_axis.title = "N (imágenes de train)"
-        chart.add_data(data, titles_from_data=True)
-        chart.set_categories(cat)
-        chart.marker = None
+        chart.style = 13
+        chart.series.append(obs)
+        try:
+            from curva_aprendizaje import puntos_de_filas, tabla_ajuste
+            aj, curva = tabla_ajuste(puntos_de_filas(tab.to_dict("records"), RUNS_DIR))
+        except Exception as e:
+            print(f"[AVISO] Sin curva ajustada: {e}")
+            aj, curva = None, []
+        if aj is not None:
+            pd.DataFrame(curva, columns=["N", "mAP50_ajuste", "ic_inf", "ic_sup"]).to_excel(xw, sheet_name="ajuste", index=False)
+            wa = xw.sheets["ajuste"]
+            xa = Reference(wa, min_col=1, min_row=2, max_row=len(curva) + 1)
+            for col, titulo in ((2, f"ajuste ({aj.nombre})"), (3, "IC 90% inf"), (4, "IC 90% sup")):
+                sr = Series(Reference(wa, min_col=col, min_row=2, max_row=len(curva) + 1), xa, title=titulo)
+                sr.marker.symbol = "none"; sr.smooth = True
+                if col > 2: sr.graphicalProperties.line.dashStyle = "dash"
+                chart.series.append(sr)
         ws.add_chart(chart, "H2")
 
+    # dispersión latencia vs exactitud, con el frente de Pareto resaltado
+    if len(pareto):
+        from openpyxl.chart import ScatterChart, Reference, Series
+        from openpyxl.utils import get_column_letter
+        pareto.to_excel(xw, sheet_name="pareto", index=False)
+        ws = xw.sheets["pareto"]
+        cols = list(pareto.columns)
+        c_lat, c_acc = cols.index("p95_ms") + 1, cols.index("mAP50") + 1
+        n = len(pareto) + 1
+        chart = ScatterChart()
+        chart.title = "mAP@0.5 vs latencia CPU (p95)"
+        chart.x_axis.title = "p95 (ms)"
+        chart.y_axis.title = "mAP@0.5"
+        chart.style = 13
+        todos = Series(Reference(ws, min_col=c_acc, min_row=2, max_row=n),
+                       Reference(ws, min_col=c_lat, min_row=2, max_row=n), title="exportes")
+        todos.marker.symbol = "circle"; todos.graphicalProperties.line.noFill = True
+        chart.series.append(todos)
+        # el frente va en columnas a la derecha de la tabla (ordenado por latencia, se dibuja como línea)
+        frente = pareto[pareto["pareto"]][["p95_ms", "mAP50"]]
+        frente.to_excel(xw, sheet_name="pareto", index=False, startcol=len(cols) + 1)
+        f0 = len(cols) + 2
+        chart.series.append(Series(Reference(ws, min_col=f0 + 1, min_row=2, max_row=len(frente) + 1),
+                                   Reference(ws, min_col=f0, min_row=2, max_row=len(frente) + 1), title="frente de Pareto"))
+        ws.add_chart(chart, f"{get_column_letter(len(cols) + 5)}2")
+
 print("Excel guardado:", XLSX_OUT)
 print("\nTIPO: si ves N_train = NaN, renombra tus corridas como '..._N0500', '..._N1000', etc., o asegúrate de que 'args.yaml' contenga rutas 'train_XXXX'.")
@@ -0,0 +1,78 @@
+# almacen_candidatos.py
+# Almacén compacto de candidatos crudos del detector (antes de NMS, sobre un piso de confianza bajo),
+# para barrer umbrales conf/IoU sin volver a correr el modelo (ver barrido_umbrales.py).
+# Carpeta con dos archivos de registros fijos, solo-append, leídos con np.memmap:
+#   cands.bin   CAND_DTYPE: caja xyxy normalizada 0..1, score, clase; por imagen, ordenados por score desc
+#   imgs.bin    IMG_DTYPE: stem, tamaño original y rango [ini, ini+n) en cands.bin
+# Tras un corte, al reabrir se recortan registros a medias (imgs manda: lo que no tenga fila en imgs se descarta).
+from pathlib import Path
+import os
+import numpy as np
+from inferencia_onnx import candidatos, a_original
+
+PISO = 0.001   # mismo piso que usa `yolo detect val`
+
+CAND_DTYPE = np.dtype([("x1", "f4"), ("y1", "f4"), ("x2", "f4"), ("y2", "f4"), ("score", "f4"), ("cls", "u2")])
+IMG_DTYPE = np.dtype([("stem", "S128"), ("w", "u4"), ("h", "u4"), ("ini", "u8"), ("n", "u4")])
+
+def _registros(p: Path, dtype):
+    return p.stat().st_size//dtype.itemsize if p.exists() else 0
+
+class EscritorCandidatos:
+    """
+    esc = EscritorCandidatos("audit_out/cands_valid")
+    esc.agregar(stem, pred_crudo, meta, (h, w))   # pred_crudo: (4+nc, A) de Detector.crudo
+    esc.flush(); esc.cerrar()
+    """
+    def __init__(self, carpeta, piso=PISO):
+        self.dir = Path(carpeta); self.dir.mkdir(parents=True, exist_ok=True)
+        self.piso = piso
+        pi, pc = self.dir/"imgs.bin", self.dir/"cands.bin"
+        n_img = _registros(pi, IMG_DTYPE)
+        fin = 0
+        if n_img:
+            ult = np.fromfile(pi, dtype=IMG_DTYPE, count=1, offset=(n_img - 1)*IMG_DTYPE.itemsize)[0]
+            fin = int(ult["ini"]) + int(ult["n"])
+        fin = min(fin, _registros(pc, CAND_DTYPE))
+        for p, n, dt in ((pi, n_img, IMG_DTYPE), (pc, fin, CAND_DTYPE)):
+            if p.exists():
+                os.truncate(p, n*dt.itemsize)
+        self.n = fin
+        self.fi, self.fc = open(pi, "ab"), open(pc, "ab")
+
+    def agregar(self, stem, pred, meta, shape):
+        h, w = shape[:2]
+        xyxy, score, cls = candidatos(pred, self.piso)
+        orden = np.argsort(-score, kind="stable")
+        c = np.empty(len(orden), CAND_DTYPE)
+        xy = a_original(xyxy[orden], meta, shape) / np.array([w, h, w, h], np.float32)
+        c["x1"], c["y1"], c["x2"], c["y2"] = xy.T
+        c["score"], c["cls"] = score[orden], cls[orden]
+        fila = np.array([(stem.encode("utf-8")[:128], w, h, self.n, len(c))], IMG_DTYPE)
+        c.tofile(self.fc)          # primero los candidatos, luego la fila que los referencia
+        fila.tofile(self.fi)
+        self.n += len(c)
+
+    def flush(self):
+        for f in (self.fc, self.fi):
+            f.flush(); os.fsync(f.fileno())
+
+    def cerrar(self):
+        self.flush()
+        self.fc.close(); self.fi.close()
+
+class Candidatos:
+    """Lector: c = Candidatos(dir); c.stems; c[stem] -> registros CAND_DTYPE (vista memmap). Si un stem se repite, gana el último."""
+    def __init__(self, carpeta):
+        d = Path(carpeta)
+        self.imgs = np.fromfile(d/"imgs.bin", dtype=IMG_DTYPE)
+        n = int((self.imgs["ini"] + self.imgs["n"]).max()) if len(self.imgs) else 0
+        self.cands = np.memmap(d/"cands.bin", dtype=CAND_DTYPE, mode="r", shape=(n,)) if n else np.zeros(0, CAND_DTYPE)
+        self.fila = {s.decode("utf-8"): i for i, s in enumerate(self.imgs["stem"])}
+        self.stems = sorted(self.fila)
+
+    def __len__(self): return len(self.stems)
+
+    def __getitem__(self, stem):
+        r = self.imgs[self.fila[stem]]
+        return self.cands[int(r["ini"]):int(r["ini"]) + int(r["n"])]
@@ -0,0 +1,87 @@
+# barrido_umbrales.py
+# Barrido de umbrales conf x IoU(NMS) desde el almacén de candidatos crudos (almacen_candidatos.py),
+# sin tocar el modelo. Por cada IoU de NMS:
+#   - NMS una sola vez al conf más bajo de la grilla: el NMS greedy recorre por score descendente, así que
+#     subir el conf solo recorta la cola -> NMS(conf=c) = NMS(conf_min) ∩ {score >= c}
+#   - emparejado con labels una vez (evaluar_map.emparejar); cada conf es un corte sobre la cumsum de TP
+# Salida: audit_out/barrido_umbrales.csv con P, R, F1 (IoU de evaluación 0.5) por (iou_nms, conf),
+#         más mAP50 / mAP50-95 de cada iou_nms.
+# Uso:
+#   python infer_carpeta.py --onnx best.onnx --src valid/images --out audit_out/infer_valid --candidatos audit_out/cands_valid
+#   python barrido_umbrales.py --cands audit_out/cands_valid --labels valid/labels
+import argparse, csv, time
+from pathlib import Path
+import numpy as np
+from almacen_candidatos import Candidatos
+from evaluar_map import leer_labels, emparejar, metricas, NOMBRES
+from inferencia_onnx import nms, MAX_DET
+
+CONFS = np.round(np.arange(0.05, 0.951, 0.05), 2)
+IOUS_NMS = np.round(np.arange(0.30, 0.751, 0.05), 2)
+OUT_CSV = Path("audit_out")/"barrido_umbrales.csv"
+
+def aplicar_nms(cands: Candidatos, conf, iou, max_det=MAX_DET):
+    """{stem: (k,6) [cls, score, x1, y1, x2, y2]} tras filtro conf + NMS por clase (cajas normalizadas)."""
+    out = {}
+    for s in cands.stems:
+        c = cands[s]
+        c = c[c["score"] >= conf]             # ya vienen ordenados por score desc
+        xyxy = np.stack([c["x1"], c["y1"], c["x2"], c["y2"]], axis=1)
+        if len(c):
+            keep = nms(xyxy + c["cls"][:, None].astype(np.float32)*4.0, c["score"], iou, max_det)
+            c, xyxy = c[keep], xyxy[keep]
+        out[s] = np.column_stack([c["cls"], c["score"], xyxy]).astype(np.float64)
+    return out
+
+def curva_conf(tp50, conf, n_gt, confs):
+    """P, R, F1, TP, FP para cada umbral de confs (vectorizado con searchsorted)."""
+    orden = np.argsort(-conf, kind="stable")
+    acum = np.concatenate([[0], np.cumsum(tp50[orden])])
+    k = np.searchsorted(-conf[orden], -np.asarray(confs), side="right")   # #preds con score >= c
+    tp = acum[k]; fp = k - tp
+    p = np.where(k > 0, tp/np.maximum(k, 1), 1.0)
+    r = tp/max(n_gt, 1)
+    return p, r, 2*p*r/np.maximum(p + r, 1e-16), tp, fp
+
+def main():
+    ap = argparse.ArgumentParser(description="Barrido conf x IoU(NMS) sobre candidatos cacheados")
+    ap.add_argument("--cands", type=Path, required=True)
+    ap.add_argument("--labels", type=Path, required=True)
+    ap.add_argument("--confs", type=float, nargs="+", default=list(CONFS))
+    ap.add_argument("--ious", type=float, nargs="+", default=list(IOUS_NMS))
+    ap.add_argument("--out", type=Path, default=OUT_CSV)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    cands, gts = Candidatos(args.cands), leer_labels(args.labels)
+    stems = cands.stems                       # incluye las imágenes de fondo (candidatos sin .txt)
+    sin_cands = sum(1 for s in gts if s not in cands.fila)
+    if sin_cands:
+        print(f"[AVISO] {sin_cands} labels sin candidatos en {args.cands} (se excluyen)")
+    gts = {s: gts[s] for s in stems if s in gts}
+    n_gt = sum(len(g) for g in gts.values())
+    confs = sorted(args.confs)
+
+    filas = []
+    for iou in args.ious:
+        preds = aplicar_nms(cands, confs[0], iou)
+        tp, conf, cls_p, cls_g = emparejar(preds, gts, stems)
+        m = metricas(tp, conf, cls_p, cls_g)
+        p, r, f1, ntp, nfp = curva_conf(tp[:, 0], conf, n_gt, confs)
+        for j, c in enumerate(confs):
+            filas.append({"iou_nms": iou, "conf": c, "precision": round(float(p[j]), 4), "recall": round(float(r[j]), 4),
+                          "f1": round(float(f1[j]), 4), "tp": int(ntp[j]), "fp": int(nfp[j]), "fn": int(n_gt - ntp[j]),
+                          "mAP50": round(m[NOMBRES[2]], 4), "mAP50-95": round(m[NOMBRES[3]], 4)})
+    dt = time.perf_counter() - t0
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(filas[0])); w.writeheader(); w.writerows(filas)
+    mejor = max(filas, key=lambda x: x["f1"])
+    print(f"{len(filas)} combinaciones sobre {len(stems)} imágenes / {n_gt} instancias en {dt:.2f}s")
+    print(f"Mejor F1={mejor['f1']:.4f} con conf={mejor['conf']} iou_nms={mejor['iou_nms']} "
+          f"(P={mejor['precision']:.3f} R={mejor['recall']:.3f}, mAP50={mejor['mAP50']:.3f})")
+    print("CSV:", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_modelos.py
+# Export de pesos Ultralytics (.pt) a ONNX, cuantización INT8 estática (calibrada con imágenes reales,
+# mismo letterbox que en producción), validación del modelo exportado y medición de latencia en CPU con
+# scripts/bench_onnx_cpu.py (un proceso nuevo por medición: ni torch ni otra sesión compiten por los hilos).
+# Uso:
+#   from bench_modelos import exportar_onnx, medir_onnx
+#   onnx = exportar_onnx("runs/detect/x/weights/best.pt", 640)
+#   int8 = cuantizar_int8(onnx, sorted(Path("train/images").glob("*.jpg")), 640)
+#   validar(int8, "data.yaml", 640)   # (mAP50, mAP50-95) del modelo tal como se despliega
+#   medir_onnx(onnx, 640)      # {"fps": 41.3, "p95_ms": 27.9}
+from pathlib import Path
+import re, subprocess, sys
+
+CALIB_N = 64        # imágenes de calibración INT8
+BENCH = Path(__file__).resolve().parent/"scripts"/"bench_onnx_cpu.py"
+_PATRON = re.compile(r"FPS=([\d.]+)\s+p95\(ms\)=([\d.]+)")
+
+def exportar_onnx(pesos, imgsz, out=None):
+    """best.pt -> ONNX de entrada fija (imgsz). Por defecto <pesos>_<imgsz>.onnx junto a los pesos."""
+    from ultralytics import YOLO
+    pesos = Path(pesos)
+    out = Path(out) if out else pesos.with_name(f"{pesos.stem}_{imgsz}.onnx")
+    p = Path(YOLO(str(pesos)).export(format="onnx", imgsz=imgsz, dynamic=False))
+    if p.resolve() != out.resolve():
+        p.replace(out)
+    return out
+
+def medir_onnx(onnx, imgsz, images=None):
+    """Corre scripts/bench_onnx_cpu.py y devuelve {"fps", "p95_ms"} (None si falla)."""
+    cmd = [sys.executable, str(BENCH), "--onnx", str(onnx), "--imgsz", str(imgsz)]
+    if images:
+        cmd += ["--images", images]
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    m = _PATRON.search(res.stdout)
+    if res.returncode != 0 or not m:
+        print(f"[AVISO] Falló el benchmark de {onnx}: {(res.stderr or res.stdout).strip()[-300:]}")
+        return None
+    return {"fps": float(m.group(1)), "p95_ms": float(m.group(2))}
+
+def cuantizar_int8(onnx, imagenes, imgsz, out=None, n=CALIB_N):
+    """ONNX fp32 -> INT8 (QDQ, pesos por canal) calibrado con hasta n imágenes. Por defecto <onnx>_int8.onnx."""
+    import cv2
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    from preproceso import Preproceso
+    onnx = Path(onnx)
+    out = Path(out) if out else onnx.with_name(f"{onnx.stem}_int8.onnx")
+
+    class Lector(CalibrationDataReader):
+        def __init__(self):
+            import onnxruntime as ort
+            self.nombre = ort.InferenceSession(str(onnx), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            self.pre = Preproceso(imgsz)
+            self.it = iter(imagenes[:n])
+        def get_next(self):
+            for p in self.it:
+                bgr = cv2.imread(str(p))
+                if bgr is not None:
+                    self.pre(bgr, 0)
+                    return {self.nombre: self.pre.entrada.copy()}
+            return None
+
+    pre = out.with_suffix(".pre.onnx")      # inferencia de formas + fusiones antes de calibrar
+    quant_pre_process(str(onnx), str(pre), skip_symbolic_shape=True)   # entrada de tamaño fijo
+    try:
+        quantize_static(str(pre), str(out), Lector(), quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    finally:
+        pre.unlink(missing_ok=True)
+    return out
+
+def validar(modelo, data_yaml, imgsz, batch=8, device="cpu"):
+    """(mAP50, mAP50-95) con el validador de Ultralytics; acepta .pt o .onnx (este con batch 1)."""
+    from ultralytics import YOLO
+    batch = 1 if Path(modelo).suffix == ".onnx" else batch
+    r = YOLO(str(modelo), task="detect").val(data=str(data_yaml), imgsz=imgsz, batch=batch, device=device,
+                                             plots=False, verbose=False)
+    return float(r.box.map50), float(r.box.map)
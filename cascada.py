@@ -0,0 +1,164 @@
+# cascada.py
+# Detector en cascada: el modelo chico (yolov8n) corre en todos los frames y solo se escala al grande
+# (yolov8s/m) cuando la confianza máxima de placa del chico cae en una banda de incertidumbre [bajo, alto).
+#   - modo "frame":  el grande reprocesa el frame completo y sus detecciones reemplazan a las del chico
+#   - modo "region": el grande solo ve recortes (con margen) alrededor de las cajas dudosas del chico;
+#                    las cajas seguras del chico (>= alto) se conservan tal cual
+# Evaluación contra valid/labels: tasa de escalado, latencia media/p95 y P/R/F1/mAP50 por banda,
+# con las referencias "solo chico" y "solo grande".
+# Uso:
+#   python cascada.py --chico yolov8n.onnx --grande yolov8s.onnx --src valid/images --labels valid/labels \
+#                     --bandas 0.25-0.5 0.25-0.6 0.15-0.7 [--modo region]
+import argparse, csv, time
+from pathlib import Path
+import numpy as np
+import cv2
+from inferencia_onnx import Detector, nms, CONF, IOU, MAX_DET
+from preproceso import Preproceso
+from evaluar_map import leer_labels, emparejar, metricas, NOMBRES
+from barrido_umbrales import curva_conf
+from limpieza_etapas import IMG_EXTS
+
+BANDA = (0.25, 0.6)
+MARGEN = 1.0          # modo region: el recorte agrega MARGEN x ancho/alto de la caja por lado
+RECORTE_MIN = 96      # lado mínimo del recorte en px
+OUT_CSV = Path("audit_out")/"cascada.csv"
+
+class Cascada:
+    """
+    cas = Cascada("yolov8n.onnx", "yolov8s.onnx", banda=(0.25, 0.6))
+    dets, escalado = cas(bgr)        # dets (k,6) [x1,y1,x2,y2,score,cls] en px originales
+    chico/grande: ruta ONNX o Detector ya creado (para compartir sesiones entre varias bandas).
+    """
+    def __init__(self, chico, grande, banda=BANDA, modo="frame", conf=CONF, iou=IOU, hilos=None):
+        assert modo in ("frame", "region")
+        self.banda, self.modo, self.conf, self.iou = banda, modo, conf, iou
+        if not isinstance(chico, Detector):
+            chico = Detector(chico, hilos, min(conf, banda[0]), iou)
+        if not isinstance(grande, Detector):
+            grande = Detector(grande, hilos, conf, iou)
+        assert chico.conf <= banda[0], "el piso del chico debe ser <= al borde bajo de la banda"
+        self.chico, self.grande = chico, grande
+        self.pre_c, self.pre_g = Preproceso(self.chico.imgsz), Preproceso(self.grande.imgsz)
+
+    def _correr(self, det, pre, bgr):
+        meta = pre(bgr, 0)
+        return det.detectar(pre.entrada, [meta], [bgr.shape[:2]])[0]
+
+    def chico_dets(self, bgr):
+        return self._correr(self.chico, self.pre_c, bgr)
+
+    def grande_dets(self, bgr):
+        return self._correr(self.grande, self.pre_g, bgr)
+
+    def escala(self, d_chico):
+        """¿La confianza máxima del chico cae en la banda de incertidumbre?"""
+        top = float(d_chico[:, 4].max()) if len(d_chico) else 0.0
+        return self.banda[0] <= top < self.banda[1]
+
+    def _regiones(self, bgr, dudosas):
+        h, w = bgr.shape[:2]
+        out = []
+        for x1, y1, x2, y2 in dudosas[:, :4]:
+            bw, bh = x2 - x1, y2 - y1
+            mx, my = max(MARGEN*bw, (RECORTE_MIN - bw)/2), max(MARGEN*bh, (RECORTE_MIN - bh)/2)
+            a, b = int(max(0, x1 - mx)), int(max(0, y1 - my))
+            c, d = int(min(w, x2 + mx)), int(min(h, y2 + my))
+            if c - a < 2 or d - b < 2:
+                continue
+            r = self.grande_dets(np.ascontiguousarray(bgr[b:d, a:c])).copy()
+            r[:, [0, 2]] += a; r[:, [1, 3]] += b
+            out.append(r)
+        return np.concatenate(out) if out else np.zeros((0, 6), np.float32)
+
+    def __call__(self, bgr, d_chico=None, d_grande=None):
+        """d_chico / d_grande: detecciones ya calculadas para este frame (evita repetir inferencia al evaluar)."""
+        d = self.chico_dets(bgr) if d_chico is None else d_chico
+        if not self.escala(d):
+            return d[d[:, 4] >= self.conf], False
+        if self.modo == "frame":
+            return (self.grande_dets(bgr) if d_grande is None else d_grande), True
+        seguras = d[d[:, 4] >= self.banda[1]]
+        dudosas = d[(d[:, 4] >= self.banda[0]) & (d[:, 4] < self.banda[1])]
+        todas = np.concatenate([seguras, self._regiones(bgr, dudosas)])
+        if len(todas) == 0:
+            return todas, True
+        keep = nms(todas[:, :4] + todas[:, 5:6]*4096.0, todas[:, 4], self.iou, MAX_DET)
+        return todas[keep], True
+
+# ===== Evaluación =====
+def a_norm(d, shape):
+    """(k,6) px -> (k,6) [cls, score, x1..y2] normalizado (formato de evaluar_map)."""
+    h, w = shape[:2]
+    return np.column_stack([d[:, 5], d[:, 4], d[:, :4]/np.array([w, h, w, h], np.float32)]).astype(np.float64)
+
+def resumen(nombre, preds, gts, lat, escalados, conf):
+    tp, c, cls_p, cls_g = emparejar(preds, gts)      # incluye las imágenes de fondo (sin .txt)
+    m = metricas(tp, c, cls_p, cls_g)
+    p, r, f1, _, _ = curva_conf(tp[:, 0], c, len(cls_g), [conf])
+    lat = np.asarray(lat)*1000
+    return {"config": nombre, "escalado_%": round(100*np.mean(escalados), 1),
+            "lat_media_ms": round(float(lat.mean()), 2), "lat_p95_ms": round(float(np.percentile(lat, 95)), 2),
+            "precision": round(float(p[0]), 4), "recall": round(float(r[0]), 4), "f1": round(float(f1[0]), 4),
+            "mAP50": round(m[NOMBRES[2]], 4)}
+
+def main():
+    ap = argparse.ArgumentParser(description="Cascada chico -> grande: escalado, latencia y precisión por banda")
+    ap.add_argument("--chico", required=True)
+    ap.add_argument("--grande", required=True)
+    ap.add_argument("--src", type=Path, default=Path("valid/images"))
+    ap.add_argument("--labels", type=Path, default=Path("valid/labels"))
+    ap.add_argument("--bandas", nargs="+", default=[f"{BANDA[0]}-{BANDA[1]}"], help="bajo-alto, p.ej. 0.25-0.6")
+    ap.add_argument("--modo", choices=["frame", "region"], default="frame")
+    ap.add_argument("--conf", type=float, default=CONF)
+    ap.add_argument("--hilos", type=int, default=None)
+    ap.add_argument("--out", type=Path, default=OUT_CSV)
+    args = ap.parse_args()
+
+    bandas = [tuple(map(float, b.split("-"))) for b in args.bandas]
+    chico = Detector(args.chico, args.hilos, min([args.conf] + [b[0] for b in bandas]))
+    grande = Detector(args.grande, args.hilos, args.conf)
+    cascadas = [Cascada(chico, grande, b, args.modo, args.conf) for b in bandas]
+    base = cascadas[0]
+    gts = leer_labels(args.labels)
+    rutas = sorted(p for p in args.src.iterdir() if p.suffix.lower() in IMG_EXTS and p.stem in gts)
+    print(f"{len(rutas)} imágenes con label | modo {args.modo} | bandas {bandas}")
+
+    # cada modelo corre una vez por imagen; las bandas en modo frame reutilizan esas salidas
+    # (latencia de la cascada = chico + grande solo si escala). En modo region los recortes se infieren de verdad.
+    pc, pg = {}, {}
+    tc, tg = [], []
+    por_banda = [({}, [], []) for _ in bandas]
+    for ruta in rutas:
+        bgr = cv2.imread(str(ruta), cv2.IMREAD_COLOR)
+        if bgr is None:
+            continue
+        t0 = time.perf_counter(); dc = base.chico_dets(bgr); t1 = time.perf_counter()
+        dg = base.grande_dets(bgr); t2 = time.perf_counter()
+        tc.append(t1 - t0); tg.append(t2 - t1)
+        pc[ruta.stem] = a_norm(dc[dc[:, 4] >= args.conf], bgr.shape)
+        pg[ruta.stem] = a_norm(dg, bgr.shape)
+        for cas, (preds, lat, esc) in zip(cascadas, por_banda):
+            if args.modo == "frame":
+                d, e = cas(bgr, dc, dg)
+                lat.append(tc[-1] + (tg[-1] if e else 0.0))
+            else:
+                t = time.perf_counter(); d, e = cas(bgr, dc)
+                lat.append(tc[-1] + time.perf_counter() - t)
+            preds[ruta.stem] = a_norm(d, bgr.shape); esc.append(e)
+
+    filas = [resumen("solo chico", pc, gts, tc, [False]*len(tc), args.conf),
+             resumen("solo grande", pg, gts, tg, [True]*len(tg), args.conf)]
+    for (bajo, alto), (preds, lat, esc) in zip(bandas, por_banda):
+        filas.append(resumen(f"cascada {args.modo} [{bajo},{alto})", preds, gts, lat, esc, args.conf))
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(filas[0])); w.writeheader(); w.writerows(filas)
+    for r in filas:
+        print(f"{r['config']:34s} escalado={r['escalado_%']:5.1f}%  lat={r['lat_media_ms']:7.2f}ms (p95 {r['lat_p95_ms']:.2f})"
+              f"  P={r['precision']:.3f} R={r['recall']:.3f} F1={r['f1']:.3f} mAP50={r['mAP50']:.3f}")
+    print("CSV:", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# control_carga.py
+# Control de carga por SLO de latencia extremo a extremo. Escalera de niveles de degradación:
+#   0..k  imgsz exportados de mayor a menor (un ONNX por tamaño: el imgsz queda fijo al exportar)
+#   luego, con el imgsz mínimo: procesar 1 de cada 2 frames, diferir el OCR de detecciones de baja
+#   confianza, 1 de cada 3 frames
+# Se observa el p95 de una ventana de latencias: si supera ALTO x SLO se baja un nivel; si queda bajo
+# BAJO x SLO durante ENFRIAMIENTO segundos se sube uno (histéresis para no oscilar). Cada cambio se
+# registra con su motivo (JSONL en audit_out/control_carga.jsonl y por consola).
+from collections import deque, namedtuple
+from pathlib import Path
+import json, time
+import numpy as np
+from telemetria import REG
+
+ALTO, BAJO = 0.9, 0.5      # fracciones del SLO para bajar / subir de nivel
+VENTANA = 64               # latencias consideradas para el p95
+MIN_MUESTRAS = 16
+PERMANENCIA = 0.5          # s mínimos en un nivel antes de volver a degradar (que el cambio haga efecto)
+ENFRIAMIENTO = 3.0         # s con holgura sostenida antes de recuperar calidad
+LOG = Path("audit_out")/"control_carga.jsonl"
+
+Nivel = namedtuple("Nivel", "imgsz salto diferir_ocr modelo")   # modelo: índice en la lista de detectores
+
+def escalera(tamanos):
+    """Niveles de menor a mayor degradación; tamanos[i] = imgsz del modelo i."""
+    if len(set(tamanos)) != len(tamanos):
+        raise ValueError(f"imgsz repetidos entre modelos {list(tamanos)}: cada nivel necesita un tamaño distinto")
+    orden = sorted(range(len(tamanos)), key=lambda i: -tamanos[i])
+    m = orden[-1]
+    return ([Nivel(tamanos[i], 1, False, i) for i in orden] +
+            [Nivel(tamanos[m], 2, False, m), Nivel(tamanos[m], 2, True, m), Nivel(tamanos[m], 3, True, m)])
+
+class ControladorSLO:
+    """
+    ctl = ControladorSLO(slo_ms=150, niveles=escalera([640, 480, 320]))
+    ctl.observar(latencia_s)      # por frame entregado
+    ctl.revisar()                 # por batch; devuelve True si cambió de nivel
+    ctl.nivel                     # Nivel(imgsz, salto, diferir_ocr, modelo) vigente
+    """
+    def __init__(self, slo_ms, niveles, ventana=VENTANA, alto=ALTO, bajo=BAJO,
+                 permanencia=PERMANENCIA, enfriamiento=ENFRIAMIENTO, log=LOG):
+        self.slo = slo_ms/1000.0
+        self.niveles, self.alto, self.bajo = list(niveles), alto, bajo
+        self.permanencia, self.enfriamiento = permanencia, enfriamiento
+        self.lat = deque(maxlen=ventana)
+        self.i = 0
+        self.t_cambio = self.t_holgura = time.perf_counter()
+        self.cambios = []
+        self.log = Path(log) if log else None
+        self._medidor = REG.medidor("placas_nivel_degradacion", "Nivel de degradación vigente (0 = calidad completa)")
+
+    @property
+    def nivel(self):
+        return self.niveles[self.i]
+
+    def observar(self, lat_s):
+        self.lat.append(lat_s)
+
+    def _cambiar(self, j, razon, p95):
+        de, a = self.niveles[self.i], self.niveles[j]
+        ev = {"ts": time.time(), "de": self.i, "a": j, "razon": razon, "p95_ms": round(p95*1000, 1),
+              "slo_ms": round(self.slo*1000, 1), "nivel": a._asdict()}
+        print(f"[CONTROL] nivel {self.i}->{j} ({razon}): imgsz {de.imgsz}->{a.imgsz}, "
+              f"1/{a.salto} frames, OCR diferido={'sí' if a.diferir_ocr else 'no'}", flush=True)
+        self.cambios.append(ev)
+        if self.log:
+            self.log.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(ev) + "\n")
+        self.i = j
+        self.lat.clear()                       # las latencias viejas no describen el nivel nuevo
+        self.t_cambio = self.t_holgura = time.perf_counter()
+        self._medidor.fijar(j)
+
+    def revisar(self):
+        if len(self.lat) < MIN_MUESTRAS:
+            return False
+        ahora = time.perf_counter()
+        p95 = float(np.percentile(self.lat, 95))
+        if p95 > self.alto*self.slo:
+            self.t_holgura = ahora
+            if self.i + 1 < len(self.niveles) and ahora - self.t_cambio >= self.permanencia:
+                self._cambiar(self.i + 1, f"p95 {p95*1000:.0f}ms > {self.alto:.0%} del SLO", p95)
+                return True
+        elif p95 < self.bajo*self.slo:
+            if self.i > 0 and ahora - self.t_holgura >= self.enfriamiento:
+                self._cambiar(self.i - 1, f"p95 {p95*1000:.0f}ms < {self.bajo:.0%} del SLO por {self.enfriamiento:.0f}s", p95)
+                return True
+        else:
+            self.t_holgura = ahora
+        return False
@@ -0,0 +1,64 @@
+# coreset.py
+# Selección diversa (greedy k-center) para construir subsets anidados más informativos que el top-N por calidad.
+# Descriptores baratos por imagen: bits del pHash, estadísticas de cajas del label, brillo.
+from pathlib import Path
+import numpy as np
+
+N_BOX_STATS = 6  # n_cajas, cx, cy, w, h, log(área) medios
+
+def box_stats(lbl: Path):
+    """Estadísticas de cajas de un label YOLO: (n, cx, cy, w, h, log_area) medios. Ceros si no se puede leer."""
+    try:
+        rows = [ln.split() for ln in lbl.read_text(encoding="utf-8").splitlines() if ln.strip()]
+        b = np.array([list(map(float, r[1:5])) for r in rows if len(r) >= 5], dtype=np.float64).reshape(-1, 4)
+    except Exception:
+        return np.zeros(N_BOX_STATS, np.float32)
+    if len(b) == 0:
+        return np.zeros(N_BOX_STATS, np.float32)
+    area = np.clip(b[:, 2]*b[:, 3], 1e-6, None)
+    return np.array([len(b), *b.mean(axis=0), np.log(area).mean()], dtype=np.float32)
+
+def phash_bits(pha):
+    """uint64 (n,) -> bits (n,64) float32."""
+    pha = np.ascontiguousarray(np.asarray(pha, dtype=">u8"))
+    return np.unpackbits(pha.view(np.uint8).reshape(-1, 8), axis=1).astype(np.float32)
+
+def _std(x):
+    x = np.asarray(x, dtype=np.float32)
+    s = x.std(axis=0)
+    return (x - x.mean(axis=0)) / np.where(s > 0, s, 1)
+
+def descriptores(pha, stats, bri, peso_phash=1.0, peso_cajas=1.0, peso_brillo=0.5):
+    """Matriz (n,d) float32. Cada bloque se escala para que su distancia típica sea comparable."""
+    bloques = [phash_bits(pha) * (peso_phash / np.sqrt(64/2))]            # Hamming/32 ~ 1 en hashes no relacionados
+    bloques.append(_std(stats) * (peso_cajas / np.sqrt(2*stats.shape[1])))
+    bloques.append(_std(np.asarray(bri).reshape(-1, 1)) * (peso_brillo / np.sqrt(2)))
+    return np.ascontiguousarray(np.concatenate(bloques, axis=1), dtype=np.float32)
+
+def kcenter(X, k, calidad=None, peso_calidad=0.1, bloque=8192):
+    """
+    Greedy k-center: devuelve el orden de selección (k índices). Cada prefijo es un subset anidado.
+    Empieza por el de mejor calidad; en cada paso elige el punto más lejano al conjunto elegido,
+    ponderado por calidad: score = dist * (1 - peso_calidad + peso_calidad*q), q en [0,1].
+    """
+    n = len(X)
+    k = min(k, n)
+    if k == 0: return np.zeros(0, dtype=np.int64)
+    if calidad is None:
+        q = np.ones(n, np.float32)
+    else:
+        q = np.argsort(np.argsort(calidad, kind="stable"), kind="stable").astype(np.float32) / max(n - 1, 1)
+    factor2 = ((1 - peso_calidad) + peso_calidad*q)**2  # se compara sobre dist^2 (sin sqrt)
+    sq = np.einsum("ij,ij->i", X, X)
+    dmin = np.full(n, np.inf, dtype=np.float32)
+    orden = np.empty(k, dtype=np.int64)
+    c = int(np.argmax(q))
+    for t in range(k):
+        orden[t] = c
+        # distancia^2 a c, por bloques para acotar memoria temporal
+        for a in range(0, n, bloque):
+            d = sq[a:a+bloque] - 2*(X[a:a+bloque] @ X[c]) + sq[c]
+            np.minimum(dmin[a:a+bloque], np.maximum(d, 0), out=dmin[a:a+bloque])
+        dmin[c] = -1  # ya elegido: score negativo, nunca gana
+        c = int(np.argmax(dmin * factor2))
+    return orden
@@ -0,0 +1,138 @@
+# cosecha_video.py
+# Cosecha de frames de video para crecer el dataset sin inundar train/ de casi-duplicados:
+#   - se recorre el video en streaming (cap.grab() para los frames que no se evalúan: sin decodificar color)
+#   - pHash (mismo esquema que imagehash.phash: gris 32x32 -> DCT -> 8x8 > mediana, 64 bits) sobre el frame
+#     reducido; el frame se queda solo si su Hamming a TODOS los últimos RECIENTES guardados supera HAMMING_MIN
+#   - filtros de calidad de limpieza_etapas (MIN_VAR_LAPLACE, MIN_BRIGHT/MAX_BRIGHT), solo para los candidatos
+#   - escritura directa al layout YOLO (<out>/<split>/images) en hilos aparte (cola acotada); la fila del
+#     manifiesto CSV se escribe solo cuando el JPEG quedó en disco
+# Uso:
+#   python cosecha_video.py --videos grabaciones/*.mp4 --out . [--reparto 0.8 0.1 0.1 --cada 2 --hamming 6]
+import argparse, csv, hashlib, time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import cv2
+from limpieza_etapas import lap_var, bright_v, MIN_VAR_LAPLACE, MIN_BRIGHT, MAX_BRIGHT
+from registros import hamming
+
+HAMMING_MIN = 6        # distinto "de verdad" (limpieza_etapas marca casi-duplicado con <= 3)
+RECIENTES = 64         # hashes guardados contra los que se compara
+CADA = 1               # evaluar 1 de cada N frames
+CALIDAD_JPEG = 95
+SPLITS = ("train", "valid", "test")
+
+def phash64(bgr):
+    """pHash de 64 bits como entero (compatible con registros.phash_int(imagehash.phash(...)))."""
+    g = cv2.cvtColor(cv2.resize(bgr, (32, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    d = cv2.dct(np.float32(g))[:8, :8]
+    bits = (d > np.median(d)).ravel()
+    return np.uint64(int.from_bytes(np.packbits(bits).tobytes(), "big"))
+
+def split_de(nombre, reparto):
+    """Split determinista por hash del nombre (relanzar no mueve frames entre splits)."""
+    u = int.from_bytes(hashlib.sha1(nombre.encode()).digest()[:4], "big")/2**32
+    acum = 0.0
+    for s, p in zip(SPLITS, reparto):
+        acum += p
+        if u < acum:
+            return s
+    return SPLITS[len(reparto) - 1]
+
+def _confirmar(fut, fila, manifiesto, stats):
+    """Espera una escritura; la fila del manifiesto va solo si cv2.imwrite devolvió True."""
+    try:
+        ok = fut.result()
+    except cv2.error:
+        ok = False
+    if ok:
+        manifiesto.writerow(fila)
+        stats["guardados"] += 1
+    else:
+        stats["error_escritura"] += 1
+
+def cosechar(video: Path, out: Path, reparto, escritor, manifiesto, cada=CADA, hamming_min=HAMMING_MIN,
+             recientes=RECIENTES, calidad=CALIDAD_JPEG, en_vuelo=4):
+    """`en_vuelo` acota los frames encolados al escritor (cada uno es un frame completo en memoria)."""
+    cap = cv2.VideoCapture(str(video))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    ring = np.zeros(recientes, np.uint64); n_ring = 0; pos = 0
+    stats = Counter()
+    pend = deque()       # (futuro de imwrite, fila del manifiesto)
+    # videos con el mismo nombre en carpetas distintas (cam1/2024-05-01.mp4, cam2/2024-05-01.mp4) no se pisan
+    prefijo = f"{video.stem}_{hashlib.sha1(str(video.resolve()).encode()).hexdigest()[:8]}"
+    n = -1
+    while True:
+        n += 1
+        if n % cada:
+            if not cap.grab(): break
+            continue
+        ok, frame = cap.read()
+        if not ok:
+            break
+        stats["evaluados"] += 1
+        h = phash64(frame)
+        if n_ring and int(hamming(h, ring[:n_ring]).min()) <= hamming_min:
+            stats["casi_duplicado"] += 1; continue
+        chico = cv2.resize(frame, (frame.shape[1]//4 or 1, frame.shape[0]//4 or 1), interpolation=cv2.INTER_AREA)
+        bri = bright_v(chico)        # la media de V no cambia al reducir con INTER_AREA
+        if bri < MIN_BRIGHT or bri > MAX_BRIGHT:
+            stats["exposicion"] += 1; continue
+        var = lap_var(frame)         # a resolución completa, como en limpieza_etapas
+        if var < MIN_VAR_LAPLACE:
+            stats["borroso"] += 1; continue
+        ring[pos] = h; pos = (pos + 1) % recientes; n_ring = min(n_ring + 1, recientes)
+        nombre = f"{prefijo}_{n:06d}"
+        split = split_de(nombre, reparto)
+        dst = out/split/"images"/f"{nombre}.jpg"
+        if dst.exists():             # relanzar sobre el mismo video: el frame ya está (y en el manifiesto)
+            stats["ya_existe"] += 1; continue
+        if len(pend) >= en_vuelo:
+            _confirmar(*pend.popleft(), manifiesto, stats)
+        pend.append((escritor.submit(cv2.imwrite, str(dst), frame, [cv2.IMWRITE_JPEG_QUALITY, calidad]),
+                     [video.name, n, f"{n/fps:.3f}", split, dst.name, f"{int(h):016x}", f"{var:.1f}", f"{bri:.1f}"]))
+    cap.release()
+    while pend:
+        _confirmar(*pend.popleft(), manifiesto, stats)
+    stats["frames"] = n
+    return stats, n/fps
+
+def main():
+    ap = argparse.ArgumentParser(description="Cosecha de frames de video con dedup por pHash y filtros de calidad")
+    ap.add_argument("--videos", type=Path, nargs="+", required=True)
+    ap.add_argument("--out", type=Path, default=Path("."), help="raíz del dataset (se escribe en <split>/images)")
+    ap.add_argument("--reparto", type=float, nargs="+", default=[1.0], help="fracciones train [valid [test]]")
+    ap.add_argument("--cada", type=int, default=CADA)
+    ap.add_argument("--hamming", type=int, default=HAMMING_MIN)
+    ap.add_argument("--recientes", type=int, default=RECIENTES)
+    ap.add_argument("--escritores", type=int, default=2)
+    args = ap.parse_args()
+    assert abs(sum(args.reparto) - 1) < 1e-6 and len(args.reparto) <= 3, "--reparto debe sumar 1 (máx. 3 splits)"
+
+    for s in SPLITS[:len(args.reparto)]:
+        (args.out/s/"images").mkdir(parents=True, exist_ok=True)
+    man_path = args.out/"audit_out"/"cosecha_video.csv"
+    man_path.parent.mkdir(parents=True, exist_ok=True)
+    nuevo = not man_path.exists()
+    total, dur_total, t0 = Counter(), 0.0, time.perf_counter()
+    with open(man_path, "a", newline="", encoding="utf-8") as fm, ThreadPoolExecutor(args.escritores) as ex:
+        man = csv.writer(fm)
+        if nuevo:
+            man.writerow(["video", "frame", "t_s", "split", "imagen", "phash", "var_laplace", "brillo"])
+        for v in args.videos:
+            t = time.perf_counter()
+            st, dur = cosechar(v, args.out, args.reparto, ex, man, args.cada, args.hamming, args.recientes,
+                               en_vuelo=2*args.escritores)
+            dt = time.perf_counter() - t
+            total.update(st); dur_total += dur
+            print(f"{v.name}: {st['guardados']}/{st['frames']} frames guardados | casi-dup {st['casi_duplicado']} "
+                  f"borrosos {st['borroso']} exposición {st['exposicion']} ya existían {st['ya_existe']} "
+              f"errores {st['error_escritura']} | {dur/max(dt,1e-9):.1f}x tiempo real")
+    dt = time.perf_counter() - t0
+    print(f"Total: {total['guardados']} de {total['frames']} frames ({100*total['guardados']/max(total['frames'],1):.1f}%) "
+          f"| {dur_total/max(dt,1e-9):.1f}x tiempo real | manifiesto: {man_path}")
+    print("Los frames no tienen label: anotarlos antes de entrenar.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# cuarentena.py
+# Motor de movimientos a cuarentena/papelera con diario (journal) y deshacer rápido.
+#   1) se planifican todos los movimientos (src -> dst) antes de tocar nada
+#   2) se ejecutan por lotes: os.rename si src y dst están en el mismo volumen,
+#      copia+borrado en paralelo si la cuarentena está en otro volumen
+#   3) cada lote se agrega a un diario JSONL (solo append) antes de ejecutarse
+#   4) `python cuarentena.py undo <diario>` reproduce el diario al revés sin re-escanear el dataset
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse, json, os, shutil
+
+JOURNAL_DIR = Path("audit_out")/"journal"
+LOTE = 512          # movimientos por lote antes de escribir al diario
+WORKERS = 8         # hilos para copias entre volúmenes
+
+def _dev(p: Path):
+    while not p.exists():
+        p = p.parent
+    return os.stat(p).st_dev
+
+def _mover_uno(src, dst, mismo_fs):
+    if mismo_fs:
+        os.rename(src, dst)
+    else:
+        shutil.move(src, dst)
+
+class Cuarentena:
+    """Plan de movimientos + ejecución por lotes con diario append-only."""
+    def __init__(self, journal: Path = None, workers=WORKERS):
+        self.journal = Path(journal) if journal else JOURNAL_DIR/f"moves_{datetime.now():%Y%m%d_%H%M%S_%f}.jsonl"
+        self.workers = workers
+        self.pendientes = []     # [(src, dst)]
+        self._destinos = set()
+        self._fuentes = set()
+        self.movidos = 0
+
+    def _append(self, *entradas):
+        if not self.journal.exists():   # el diario se crea con el primer lote: sin movimientos no queda archivo
+            self.journal.parent.mkdir(parents=True, exist_ok=True)
+            entradas = ({"op": "inicio", "ts": datetime.now().isoformat(timespec="seconds"), "cwd": os.getcwd()},) + entradas
+        with open(self.journal, "a", encoding="utf-8") as f:
+            for e in entradas:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            f.flush(); os.fsync(f.fileno())
+
+    def agregar(self, src: Path, dst_dir: Path):
+        """Planifica mover src a dst_dir; evita pisar archivos con el mismo nombre. Devuelve el destino
+        (None si src ya estaba en el plan, p. ej. un label compartido por dos imágenes)."""
+        src = Path(src).resolve()
+        if src in self._fuentes:
+            return None
+        dst_dir = Path(dst_dir).resolve()
+        dst = dst_dir/src.name
+        k = 1
+        while dst in self._destinos or dst.exists():
+            dst = dst_dir/f"{src.stem}__{k}{src.suffix}"; k += 1
+        self._destinos.add(dst)
+        self._fuentes.add(src)
+        self.pendientes.append((src, dst))
+        return dst
+
+    def ejecutar(self):
+        """Ejecuta el plan pendiente por lotes y lo registra en el diario."""
+        plan, self.pendientes = self.pendientes, []
+        self._destinos.clear()
+        self._fuentes.clear()
+        n = _ejecutar(plan, self.workers, lambda lote: self._append(*({"op": "mv", "src": str(s), "dst": str(d)} for s, d in lote)))
+        self.movidos += n
+        return n
+
+def _ejecutar(plan, workers, registrar):
+    """Mueve (src, dst) por lotes. Cada lote se registra (registrar(lote)) ANTES de moverlo,
+    así un corte a mitad de lote no deja movimientos sin diario. Devuelve cuántos movió."""
+    for d in {dst.parent for _, dst in plan}:
+        d.mkdir(parents=True, exist_ok=True)
+    devs = {}
+    def dev(p):
+        if p not in devs: devs[p] = _dev(p)
+        return devs[p]
+    n = 0
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for i in range(0, len(plan), LOTE):
+            lote = [(s, d) for s, d in plan[i:i+LOTE] if s.exists()]
+            if not lote: continue
+            registrar(lote)
+            mismo = [(s, d) for s, d in lote if dev(s.parent) == dev(d.parent)]
+            otro = [(s, d) for s, d in lote if dev(s.parent) != dev(d.parent)]
+            for s, d in mismo:
+                _mover_uno(s, d, True)
+            list(ex.map(lambda sd: _mover_uno(sd[0], sd[1], False), otro))
+            n += len(lote)
+    return n
+
+def leer_diario(journal: Path):
+    movs, deshecho = [], False
+    with open(journal, encoding="utf-8") as f:
+        for ln in f:
+            if not ln.strip(): continue
+            try:
+                e = json.loads(ln)
+            except Exception:
+                break  # línea truncada por un corte: lo anterior es válido
+            if e.get("op") == "mv":
+                movs.append((Path(e["src"]), Path(e["dst"])))
+            elif e.get("op") == "deshecho":
+                deshecho = True
+    return movs, deshecho
+
+def deshacer(journal: Path, workers=WORKERS, force=False):
+    """Reproduce el diario al revés (dst -> src). Devuelve cuántos archivos restauró."""
+    journal = Path(journal)
+    movs, deshecho = leer_diario(journal)
+    if deshecho and not force:
+        print(f"[AVISO] {journal} ya fue deshecho (usa --force para repetir).")
+        return 0
+    plan = [(d, s) for s, d in reversed(movs) if d.exists() and not s.exists()]
+    def registrar(lote):
+        with open(journal, "a", encoding="utf-8") as f:
+            for d, s in lote:
+                f.write(json.dumps({"op": "undo", "src": str(d), "dst": str(s)}, ensure_ascii=False) + "\n")
+    n = _ejecutar(plan, workers, registrar)
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "deshecho", "ts": datetime.now().isoformat(timespec="seconds"), "n": n}) + "\n")
+    print(f"Restaurados: {n} de {len(movs)} movimientos ({journal})")
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Diario de movimientos a cuarentena: listar / deshacer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="Lista los diarios en audit_out/journal")
+    u = sub.add_parser("undo", help="Deshace un diario (por defecto el más reciente)")
+    u.add_argument("journal", nargs="?", type=Path)
+    u.add_argument("--force", action="store_true")
+    u.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+
+    diarios = sorted(JOURNAL_DIR.glob("*.jsonl"))
+    if args.cmd == "list":
+        for j in diarios:
+            movs, deshecho = leer_diario(j)
+            print(f"{j}  movimientos={len(movs)}{'  (deshecho)' if deshecho else ''}")
+        return
+    journal = args.journal or (diarios[-1] if diarios else None)
+    if journal is None:
+        print("No hay diarios en", JOURNAL_DIR)
+        return
+    deshacer(journal, args.workers, args.force)
+
+if __name__ == "__main__":
+    main()
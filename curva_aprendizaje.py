@@ -0,0 +1,241 @@
+# curva_aprendizaje.py
+# Extrapolación de la curva de aprendizaje (mAP50 vs N de train) a partir de pocas corridas:
+#   - puntos: filas resumen de learning_curve_incremental.csv / learning_curve.csv; si una corrida quedó a
+#     medias (menos épocas que las pedidas en su args.yaml) su mAP final se estima ajustando la curva por
+#     época m(e) = a - b·e^-c y entra al ajuste con más incertidumbre
+#   - modelos: potencia m(N) = 1 - b·N^-c (error -> 0) y saturante m(N) = a - b·N^-c (techo a < 1);
+#     con 4+ N distintos se elige por AICc
+#   - intervalos: bootstrap paramétrico (se simulan los puntos con su sigma alrededor de la curva ajustada
+#     y se reajusta; los parámetros están muy correlacionados y la normal de pcov da intervalos absurdos)
+#   - sugerencia: un N pendiente vale la pena si la ganancia esperada sobre el mejor observado supera
+#     MIN_GANANCIA o si la predicción es todavía muy incierta (intervalo > MAX_ANCHO)
+# Uso:
+#   python curva_aprendizaje.py [--csv audit_out/learning_curve.csv --hasta 5000]
+#   from curva_aprendizaje import vale_la_pena   # run_series_train.py con NS_AUTO = True
+from collections import namedtuple
+from pathlib import Path
+import argparse, csv, math, re
+import numpy as np
+from scipy.optimize import curve_fit
+
+SUMMARY_CSV = Path("audit_out")/"learning_curve_incremental.csv"
+AGREGADO_CSV = Path("audit_out")/"learning_curve.csv"
+RUNS_DIR = Path("runs")/"detect"
+OUT_CSV = Path("audit_out")/"curva_aprendizaje.csv"
+
+SIGMA = 0.01           # ruido asumido de un mAP50 de corrida completa (semillas, split de val)
+MIN_EPOCAS = 5         # épocas mínimas para extrapolar una corrida a medias
+MIN_PUNTOS = 3         # N distintos necesarios para ajustar
+MIN_GANANCIA = 0.01    # mAP50 esperado a ganar para que valga entrenar otro N
+MAX_ANCHO = 0.05       # intervalo más ancho que esto: entrenar informa aunque la ganancia media sea chica
+NIVEL = 0.90
+SIMS = 400
+
+Punto = namedtuple("Punto", "N map50 sigma parcial exp")
+Ajuste = namedtuple("Ajuste", "nombre f popt aicc n y s")
+
+def _f(x):
+    try: return float(x)
+    except (TypeError, ValueError): return float("nan")
+
+def potencia(n, b, c):
+    return 1.0 - b*np.power(n, -c)
+
+def saturante(n, a, b, c):
+    return a - b*np.power(n, -c)
+
+# (función, p0, límites)
+MODELOS = {
+    "potencia": (potencia, (1.0, 0.3), ((0.0, 0.0), (np.inf, 3.0))),
+    "saturante": (saturante, (0.9, 1.0, 0.3), ((0.0, 0.0, 0.0), (1.0, np.inf, 3.0))),
+}
+
+def _epocas_pedidas(exp_dir: Path):
+    p = exp_dir/"args.yaml"
+    if p.exists():
+        m = re.search(r"^epochs:\s*(\d+)", p.read_text(encoding="utf-8", errors="ignore"), re.M)
+        if m: return int(m.group(1))
+    return None
+
+def _serie_map50(results_csv: Path):
+    with open(results_csv, newline="", encoding="utf-8") as f:
+        r = csv.reader(f)
+        header = [h.strip() for h in next(r)]
+        data = [row for row in r if row]
+    for c in ("metrics/mAP50(B)", "val/box/mAP50", "map50"):
+        if c in header:
+            k = header.index(c)
+            return np.array([_f(row[k]) if k < len(row) else np.nan for row in data])
+    return None
+
+def extrapolar_epocas(m, objetivo):
+    """mAP50 por época (serie incompleta) -> (estimación en `objetivo` épocas, desvío) o None."""
+    e = np.flatnonzero(~np.isnan(m)) + 1.0
+    y = m[~np.isnan(m)]
+    if len(y) < MIN_EPOCAS:
+        return None
+    try:
+        popt, pcov = curve_fit(lambda x, a, b, c: a - b*np.power(x, -c), e, y, p0=(y.max(), y.max(), 0.5),
+                               bounds=((0, 0, 0), (1, np.inf, 5)), maxfev=20000)
+    except (RuntimeError, ValueError):
+        return None
+    a, b, c = popt
+    est = max(float(a - b*objetivo**-c), float(y.max()))
+    # sensibilidad a los parámetros (método delta) + el salto que falta recorrer
+    g = np.array([1.0, -objetivo**-c, b*math.log(objetivo)*objetivo**-c])
+    var = float(g @ pcov @ g) if np.all(np.isfinite(pcov)) else (est - y.max())**2
+    return est, math.sqrt(max(var, 0.0)) + SIGMA + 0.5*(est - y[-1])
+
+def puntos_de_filas(filas, runs_dir=RUNS_DIR):
+    """Filas resumen (exp, N_train, mAP50[, results_csv]) -> [Punto]; completa las corridas a medias."""
+    out = []
+    for r in filas:
+        n, m50 = _f(r.get("N_train")), _f(r.get("mAP50"))
+        if math.isnan(n) or math.isnan(m50) or n <= 0:
+            continue
+        exp = str(r.get("exp", ""))
+        res = Path(r["results_csv"]) if r.get("results_csv") else runs_dir/exp/"results.csv"
+        sigma, parcial = SIGMA, False
+        if res.exists():
+            serie, objetivo = _serie_map50(res), _epocas_pedidas(res.parent)
+            if serie is not None and objetivo and len(serie) < objetivo:
+                ext = extrapolar_epocas(serie, objetivo)
+                if ext is None:
+                    continue            # demasiado corta para decir algo de su mAP final
+                m50, sigma, parcial = ext[0], ext[1], True
+        out.append(Punto(int(n), m50, sigma, parcial, exp))
+    return out
+
+def leer_puntos(csvs=(SUMMARY_CSV, AGREGADO_CSV), runs_dir=RUNS_DIR):
+    """Une los CSV resumen disponibles; una corrida (exp) repetida cuenta una vez con su última fila
+    (el incremental guarda las re-corridas al final y learning_curve.csv, leído después, tiene la última palabra)."""
+    por_exp, sin_exp = {}, []
+    for p in csvs:
+        p = Path(p)
+        if not p.exists(): continue
+        with open(p, newline="", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                if r.get("exp"):
+                    por_exp[r["exp"]] = r
+                else:
+                    sin_exp.append(r)
+    return puntos_de_filas(list(por_exp.values()) + sin_exp, runs_dir)
+
+def ajustar(puntos):
+    """Ajuste ponderado por 1/sigma (tomado como desvío real); devuelve el mejor Ajuste por AICc (o None si no hay datos suficientes)."""
+    if len({p.N for p in puntos}) < MIN_PUNTOS:
+        return None
+    n = np.array([p.N for p in puntos], float)
+    y = np.array([p.map50 for p in puntos], float)
+    s = np.array([p.sigma for p in puntos], float)
+    mejor = None
+    for nombre, (f, p0, lim) in MODELOS.items():
+        k = len(p0)
+        if len(y) - k < 1 or (k == 3 and len({p.N for p in puntos}) < 4):
+            continue
+        try:
+            popt, pcov = curve_fit(f, n, y, p0=p0, sigma=s, absolute_sigma=True, bounds=lim, maxfev=20000)
+        except (RuntimeError, ValueError):
+            continue
+        chi2 = float(np.sum(((y - f(n, *popt))/s)**2))     # sigma conocido: AIC = chi2 + 2k (+ corrección)
+        aicc = chi2 + 2*k + (2*k*(k + 1)/(len(y) - k - 1) if len(y) - k - 1 > 0 else 0.0)
+        if mejor is None or aicc < mejor.aicc:
+            mejor = Ajuste(nombre, f, popt, aicc, n, y, s)
+    return mejor
+
+def predecir(aj, ns, nivel=NIVEL, sims=SIMS, semilla=0):
+    """(media, inferior, superior) del mAP50 en cada N de `ns`."""
+    ns = np.asarray(ns, float)
+    media = aj.f(ns, *aj.popt)
+    _, _, lim = MODELOS[aj.nombre]
+    rng = np.random.default_rng(semilla)
+    base, ys = aj.f(aj.n, *aj.popt), []
+    for _ in range(sims):
+        try:
+            p, _ = curve_fit(aj.f, aj.n, base + rng.normal(0.0, aj.s), p0=aj.popt, sigma=aj.s,
+                             absolute_sigma=True, bounds=lim, maxfev=5000)
+        except (RuntimeError, ValueError):
+            continue
+        ys.append(aj.f(ns, *p))
+    if not ys:
+        return media, np.full_like(media, np.nan), np.full_like(media, np.nan)
+    ys = np.clip(np.stack(ys), 0.0, 1.0)
+    a = (1 - nivel)/2
+    return media, np.quantile(ys, a, axis=0), np.quantile(ys, 1 - a, axis=0)
+
+def evaluar_ns(aj, puntos, candidatos, min_ganancia=MIN_GANANCIA, max_ancho=MAX_ANCHO):
+    """[(N, media, lo, hi, vale, motivo)] para los N candidatos."""
+    mejor = max(p.map50 for p in puntos)
+    hechos = {p.N for p in puntos if not p.parcial}
+    media, lo, hi = predecir(aj, candidatos)
+    out = []
+    for N, m, l, h in zip(candidatos, media, lo, hi):
+        gan, ancho = m - mejor, h - l
+        if N in hechos:
+            vale, motivo = False, "ya entrenado"
+        elif gan >= min_ganancia:
+            vale, motivo = True, f"ganancia esperada {gan:+.3f}"
+        elif ancho > max_ancho:
+            vale, motivo = True, f"predicción incierta (IC {l:.3f}-{h:.3f})"
+        else:
+            vale, motivo = False, f"ganancia esperada {gan:+.3f} < {min_ganancia} (IC {l:.3f}-{h:.3f})"
+        out.append((int(N), float(m), float(l), float(h), vale, motivo))
+    return out
+
+def vale_la_pena(N, csvs=(SUMMARY_CSV, AGREGADO_CSV), runs_dir=RUNS_DIR):
+    """Para el planificador de la serie: (entrenar?, motivo). Sin ajuste posible, siempre se entrena."""
+    puntos = leer_puntos(csvs, runs_dir)
+    aj = ajustar(puntos)
+    if aj is None:
+        return True, f"solo {len({p.N for p in puntos})} N con resultado (mínimo {MIN_PUNTOS} para extrapolar)"
+    _, _, _, _, vale, motivo = evaluar_ns(aj, puntos, [N])[0]
+    return vale, motivo
+
+def tabla_ajuste(puntos, hasta=None, pasos=40):
+    """Curva ajustada sobre una grilla de N (para gráficos): (Ajuste, [(N, media, lo, hi)]) o (None, [])."""
+    aj = ajustar(puntos)
+    if aj is None:
+        return None, []
+    n_max = max(p.N for p in puntos)
+    grilla = np.unique(np.round(np.geomspace(min(p.N for p in puntos), hasta or 2*n_max, pasos)).astype(int))
+    media, lo, hi = predecir(aj, grilla)
+    return aj, [(int(n), float(m), float(l), float(h)) for n, m, l, h in zip(grilla, media, lo, hi)]
+
+def main():
+    ap = argparse.ArgumentParser(description="Ajuste y extrapolación de la curva de aprendizaje (mAP50 vs N)")
+    ap.add_argument("--csv", type=Path, nargs="+", default=[SUMMARY_CSV, AGREGADO_CSV])
+    ap.add_argument("--runs", type=Path, default=RUNS_DIR)
+    ap.add_argument("--candidatos", type=int, nargs="+", help="N a evaluar (por defecto NS de run_series_train.py)")
+    ap.add_argument("--hasta", type=int, help="N máximo de la grilla de extrapolación (por defecto 2x el mayor N)")
+    ap.add_argument("--min-ganancia", type=float, default=MIN_GANANCIA)
+    args = ap.parse_args()
+
+    puntos = leer_puntos(args.csv, args.runs)
+    for p in sorted(puntos):
+        print(f"N={p.N:>6}  mAP50={p.map50:.3f} ±{p.sigma:.3f}" + ("  (extrapolado de una corrida a medias)" if p.parcial else "") + f"  {p.exp}")
+    aj, tabla = tabla_ajuste(puntos, args.hasta)
+    if aj is None:
+        raise SystemExit(f"[AVISO] Hacen falta al menos {MIN_PUNTOS} N distintos con resultado; hay {len({p.N for p in puntos})}.")
+    print(f"\nModelo: {aj.nombre}  parámetros: {np.round(aj.popt, 4).tolist()}  AICc {aj.aicc:.1f}")
+
+    if args.candidatos:
+        cand = args.candidatos
+    else:
+        from run_series_train import NS
+        cand = NS
+    print(f"\n{'N':>6} {'mAP50':>6} {'IC ' + str(int(NIVEL*100)) + '%':>15}  decisión")
+    filas = evaluar_ns(aj, puntos, cand, args.min_ganancia)
+    for N, m, l, h, vale, motivo in filas:
+        print(f"{N:>6} {m:>6.3f} {l:>7.3f}-{h:<7.3f}  {'ENTRENAR' if vale else 'saltar'}: {motivo}")
+    print("Sugeridos:", [N for N, *_, vale, _ in filas if vale] or "ninguno (la curva ya no promete mejoras)")
+
+    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["N", "mAP50_pred", "ic_inf", "ic_sup", "modelo"])
+        for N, m, l, h in tabla:
+            w.writerow([N, f"{m:.4f}", f"{l:.4f}", f"{h:.4f}", aj.nombre])
+    print("Curva ajustada:", OUT_CSV)
+
+if __name__ == "__main__":
+    main()
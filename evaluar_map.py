@@ -0,0 +1,203 @@
+# evaluar_map.py
+# Evaluador mAP en proceso (sin Ultralytics): predicciones vs carpeta labels/ YOLO.
+# Mismo criterio que `yolo detect val`:
+#   - emparejado por umbral IoU: pares ordenados por IoU, una GT por predicción y viceversa
+#     (a igualdad, gana la predicción de mayor confianza)
+#   - AP por clase con interpolación COCO de 101 puntos; P y R al umbral de confianza de máximo F1
+# Todo vectorizado sobre el conjunto completo (sin bucle por imagen): los pares (pred, gt) de la
+# misma imagen se generan con repeat/cumsum y el emparejado sale de np.unique sobre esos pares.
+# Predicciones aceptadas:
+#   - salida de infer_carpeta.py (carpeta con det_*.jsonl o un .jsonl): dets [x1,y1,x2,y2,conf,cls] en px
+#   - carpeta de .txt de `yolo predict save_txt save_conf`: cls cx cy w h conf (normalizados)
+# Uso:
+#   python evaluar_map.py --pred audit_out/infer_valid --labels valid/labels [--json audit_out/eval_valid.json]
+import argparse, json, time
+from pathlib import Path
+import numpy as np
+
+IOUS = np.linspace(0.5, 0.95, 10)
+_trapz = getattr(np, "trapezoid", None) or np.trapz
+# nombres como en results.csv de Ultralytics (los primeros de CAND_* en agrega_resultados.py)
+NOMBRES = ("metrics/precision(B)", "metrics/recall(B)", "metrics/mAP50(B)", "metrics/mAP50-95(B)")
+
+# ===== Carga =====
+def leer_labels(labels_dir: Path):
+    """{stem: array (k,5) [cls, x1, y1, x2, y2] normalizado}. Polígonos -> caja min/max.
+    Las GT se toman tal cual (clase original, sin filtro de área ni de rango), como las ve el validador."""
+    out = {}
+    for p in Path(labels_dir).glob("*.txt"):
+        filas = []
+        for ln in p.read_text(encoding="utf-8", errors="ignore").splitlines():
+            parts = ln.split()
+            try:
+                cls, nums = int(float(parts[0])), np.asarray(parts[1:], np.float64)
+            except (IndexError, ValueError):
+                continue
+            if len(nums) == 4:
+                cx, cy, w, h = nums
+                filas.append((cls, cx - w/2, cy - h/2, cx + w/2, cy + h/2))
+            elif len(nums) >= 6 and len(nums) % 2 == 0:
+                xy = nums.reshape(-1, 2)
+                filas.append((cls, *xy.min(axis=0), *xy.max(axis=0)))
+        out[p.stem] = np.asarray(filas, np.float64).reshape(-1, 5)
+    return out
+
+def leer_preds(pred: Path):
+    """{stem: array (k,6) [cls, conf, x1, y1, x2, y2] normalizado}."""
+    pred = Path(pred)
+    jsonl = [pred] if pred.suffix == ".jsonl" else sorted(pred.glob("det_*.jsonl")) or sorted(pred.glob("*.jsonl"))
+    out = {}
+    if jsonl:
+        for p in jsonl:
+            for ln in open(p, encoding="utf-8"):
+                try:
+                    r = json.loads(ln)
+                except Exception:
+                    continue
+                if "error" in r:
+                    continue
+                d = np.asarray(r["dets"], np.float64).reshape(-1, 6)
+                esc = np.array([r["w"], r["h"], r["w"], r["h"]], np.float64)
+                out[Path(r["path"]).stem] = np.column_stack([d[:, 5], d[:, 4], d[:, :4]/esc])
+        return out
+    for p in pred.glob("*.txt"):
+        a = np.loadtxt(p, ndmin=2).reshape(-1, 6) if p.stat().st_size else np.zeros((0, 6))
+        cx, cy, w, h = a[:, 1], a[:, 2], a[:, 3], a[:, 4]
+        out[p.stem] = np.column_stack([a[:, 0], a[:, 5], cx - w/2, cy - h/2, cx + w/2, cy + h/2])
+    return out
+
+def aplanar(por_imagen, stems, ncol):
+    """dict por imagen -> (img_id, filas) concatenados, en el orden de `stems`."""
+    partes = [por_imagen.get(s, np.zeros((0, ncol))) for s in stems]
+    n = np.array([len(a) for a in partes], np.int64)
+    filas = np.concatenate(partes) if partes else np.zeros((0, ncol))
+    return np.repeat(np.arange(len(stems)), n), filas, n
+
+# ===== Emparejado =====
+def pares_misma_imagen(img_p, n_g):
+    """Todos los pares (i_pred, j_gt) con la misma imagen. img_p ordenado; n_g = #gt por imagen."""
+    ini_g = np.concatenate([[0], np.cumsum(n_g)[:-1]])
+    k = n_g[img_p]                                   # gts candidatas por predicción
+    ip = np.repeat(np.arange(len(img_p)), k)
+    off = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+    return ip, np.repeat(ini_g[img_p], k) + off
+
+def iou_pares(a, b):
+    iw = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    ih = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = iw*ih
+    area = lambda x: (x[:, 2] - x[:, 0])*(x[:, 3] - x[:, 1])
+    return inter/(area(a) + area(b) - inter + 1e-9)
+
+def tp_matriz(img_p, pred, n_g, gt):
+    """(n_pred, 10) bool: la predicción es TP a cada umbral de IOUS. pred ordenado por (imagen, -conf)."""
+    tp = np.zeros((len(pred), len(IOUS)), bool)
+    ip, jg = pares_misma_imagen(img_p, n_g)
+    iou = iou_pares(pred[ip, 2:6], gt[jg, 1:5])
+    ok = pred[ip, 0] == gt[jg, 0]
+    ip, jg, iou = ip[ok], jg[ok], iou[ok]
+    orden = np.argsort(-iou, kind="stable")
+    ip, jg, iou = ip[orden], jg[orden], iou[orden]
+    for t, thr in enumerate(IOUS):
+        m = iou >= thr
+        a, b = ip[m], jg[m]
+        _, k = np.unique(a, return_index=True)       # cada predicción: su GT de mayor IoU
+        a, b = a[k], b[k]                            # queda ordenado por índice de predicción (= mayor conf primero)
+        _, k = np.unique(b, return_index=True)       # cada GT: la predicción de mayor confianza
+        tp[a[k], t] = True
+    return tp
+
+# ===== AP =====
+def ap_101(rec, prec):
+    r = np.concatenate([[0.0], rec, [1.0]])
+    p = np.concatenate([[1.0], prec, [0.0]])
+    p = np.flip(np.maximum.accumulate(np.flip(p)))
+    x = np.linspace(0, 1, 101)
+    return _trapz(np.interp(x, r, p), x)
+
+def suavizar(y, f=0.1):
+    """Media móvil con bordes replicados (la que usa Ultralytics sobre la curva F1)."""
+    nf = round(len(y)*f*2)//2 + 1
+    p = np.ones(nf//2)
+    return np.convolve(np.concatenate([p*y[0], y, p*y[-1]]), np.ones(nf)/nf, mode="valid")
+
+def metricas(tp, conf, cls_p, cls_g):
+    """P, R (al máximo F1 medio), mAP50, mAP50-95 y AP por clase."""
+    orden = np.argsort(-conf, kind="stable")
+    tp, conf, cls_p = tp[orden], conf[orden], cls_p[orden]
+    clases = np.unique(cls_g).astype(int)      # como Ultralytics: solo clases con GT
+    px = np.linspace(0, 1, 1000)
+    ap = np.zeros((len(clases), len(IOUS)))
+    p_c, r_c = np.zeros((len(clases), 1000)), np.zeros((len(clases), 1000))
+    for ci, c in enumerate(clases):
+        m = cls_p == c
+        n_gt, n_p = int((cls_g == c).sum()), int(m.sum())
+        if n_p == 0:
+            continue
+        tpc = np.cumsum(tp[m], axis=0)
+        fpc = np.cumsum(~tp[m], axis=0)
+        rec = tpc/(n_gt + 1e-16)
+        prec = tpc/(tpc + fpc)
+        r_c[ci] = np.interp(-px, -conf[m], rec[:, 0], left=0)
+        p_c[ci] = np.interp(-px, -conf[m], prec[:, 0], left=1)
+        for t in range(len(IOUS)):
+            ap[ci, t] = ap_101(rec[:, t], prec[:, t])
+    f1 = 2*p_c*r_c/(p_c + r_c + 1e-16)
+    i = int(suavizar(f1.mean(0)).argmax()) if len(clases) else 0
+    return {
+        NOMBRES[0]: float(p_c[:, i].mean()) if len(clases) else 0.0,
+        NOMBRES[1]: float(r_c[:, i].mean()) if len(clases) else 0.0,
+        NOMBRES[2]: float(ap[:, 0].mean()) if len(clases) else 0.0,
+        NOMBRES[3]: float(ap.mean()) if len(clases) else 0.0,
+        "conf_f1": float(px[i]),
+        "ap50_por_clase": {int(c): float(ap[k, 0]) for k, c in enumerate(clases)},
+    }
+
+def emparejar(preds, gts, stems=None):
+    """Matriz TP del conjunto: (tp (n_pred,10), conf, cls_pred, cls_gt). stems: imágenes a evaluar (por defecto,
+    las de gts y preds: una imagen sin .txt es de fondo, sin GT, y sus predicciones cuentan como FP)."""
+    stems = sorted(set(gts) | set(preds)) if stems is None else list(stems)
+    img_p, pred, _ = aplanar(preds, stems, 6)
+    _, gt, n_g = aplanar(gts, stems, 5)
+    # orden (imagen, -conf): dentro de cada imagen, menor índice = mayor confianza
+    orden = np.lexsort((-pred[:, 1], img_p))
+    img_p, pred = img_p[orden], pred[orden]
+    return tp_matriz(img_p, pred, n_g, gt), pred[:, 1], pred[:, 0], gt[:, 0]
+
+def evaluar(preds, gts, stems=None):
+    """preds/gts: dicts por stem (leer_preds / leer_labels)."""
+    stems = sorted(set(gts) | set(preds)) if stems is None else list(stems)
+    tp, conf, cls_p, cls_g = emparejar(preds, gts, stems)
+    res = metricas(tp, conf, cls_p, cls_g)
+    res.update(imagenes=len(stems), instancias=int(len(cls_g)), predicciones=int(len(conf)),
+               solo_pred=sum(1 for s in stems if s not in gts))
+    return res
+
+def main():
+    ap = argparse.ArgumentParser(description="mAP/P/R de un archivo de predicciones contra una carpeta labels/ YOLO")
+    ap.add_argument("--pred", type=Path, required=True, help="salida de infer_carpeta.py (.jsonl o carpeta) o carpeta de .txt YOLO")
+    ap.add_argument("--labels", type=Path, required=True)
+    ap.add_argument("--json", type=Path, default=None, help="guardar métricas en JSON")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    gts, preds = leer_labels(args.labels), leer_preds(args.pred)
+    t1 = time.perf_counter()
+    faltan = sum(1 for s in gts if s not in preds)
+    if faltan:
+        print(f"[AVISO] {faltan} imágenes con label sin predicciones (cuentan como no detectadas)")
+    res = evaluar(preds, gts)
+    t2 = time.perf_counter()
+
+    print(f"Imágenes: {res['imagenes']} ({res['solo_pred']} sin label: fondo) | instancias: {res['instancias']} "
+          f"| predicciones: {res['predicciones']}")
+    for k in NOMBRES:
+        print(f"  {k:22s} {res[k]:.4f}")
+    print(f"Lectura {t1-t0:.2f}s | evaluación {t2-t1:.3f}s")
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps(res, indent=2), encoding="utf-8")
+        print("JSON:", args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# indice_resultados.py
+# Índice persistente de corridas: exp -> (mtime/size de results.csv y de los `extras`, fila resumen).
+# Solo se vuelve a parsear una corrida si cambió alguno; las corridas borradas salen del índice.
+from pathlib import Path
+import json, os
+
+INDEX_PATH = Path("audit_out")/"results_index.json"
+
+class IndiceResultados:
+    def __init__(self, path: Path = INDEX_PATH):
+        self.path = Path(path)
+        self.entradas = {}
+        if self.path.exists():
+            try:
+                self.entradas = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entradas = {}  # índice corrupto: se reconstruye
+
+    def actualizar(self, runs_dir: Path, resumir, extras=()):
+        """
+        Recorre runs_dir/*/results.csv y llama resumir(exp_dir, results_csv) -> dict|None
+        solo para corridas nuevas o modificadas. `extras`: otros archivos de la corrida que también
+        entran en la firma (p. ej. bench_onnx.csv). Devuelve (filas, cambiados:set[str]).
+        """
+        vistos, cambiados = set(), set()
+        if runs_dir.exists():
+            with os.scandir(runs_dir) as it:
+                dirs = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+            for e in dirs:
+                res = Path(e.path)/"results.csv"
+                try:
+                    st = os.stat(res)
+                except OSError:
+                    continue
+                vistos.add(e.name)
+                firma = [st.st_mtime_ns, st.st_size]
+                for x in extras:
+                    try:
+                        sx = os.stat(Path(e.path)/x)
+                        firma += [sx.st_mtime_ns, sx.st_size]
+                    except OSError:
+                        firma += [None, None]
+                ent = self.entradas.get(e.name)
+                if ent and ent.get("firma") == firma:
+                    continue
+                self.entradas[e.name] = {"firma": firma, "row": resumir(Path(e.path), res)}
+                cambiados.add(e.name)
+        for exp in set(self.entradas) - vistos:
+            del self.entradas[exp]
+            cambiados.add(exp)
+        if cambiados:
+            self.guardar()
+        filas = [ent["row"] for _, ent in sorted(self.entradas.items()) if ent["row"]]
+        return filas, cambiados
+
+    def guardar(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entradas, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
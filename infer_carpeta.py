@@ -0,0 +1,239 @@
+# infer_carpeta.py
+# Inferencia masiva y reanudable del detector ONNX sobre carpetas de imágenes.
+#   - recorre rutas en streaming (os.scandir recursivo), decodifica + preprocesa en un pool de hilos
+#   - agrupa en batches para el detector; escribe detecciones en chunks JSONL (opcional: Parquet por chunk)
+#   - reanudable: las salidas son el checkpoint. Al relanzar se salta lo ya hecho, por (ruta, tamaño, mtime)
+#     sin leer el archivo, o por SHA1 (limpieza_etapas.sha1) si el archivo se movió/renombró
+# Uso:
+#   python infer_carpeta.py --onnx best.onnx --src test/images --out audit_out/infer_test
+import argparse, json, os, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import cv2
+from inferencia_onnx import Detector, postproceso, CONF, IOU
+from preproceso import Preproceso
+from limpieza_etapas import sha1, IMG_EXTS
+from almacen_candidatos import EscritorCandidatos, PISO
+from telemetria import REG, ETAPAS, TAM_BATCH
+
+BATCH = 8
+DECODERS = max(2, (os.cpu_count() or 2)//2)
+CHUNK = 5000          # registros por archivo de salida
+REPORTE_S = 5.0
+
+SALTOS = {k: REG.contador("placas_cache_aciertos_total", "Imágenes ya procesadas (reanudación)", {"clave": k}) for k in ("firma", "sha1")}
+NUEVAS = REG.contador("placas_cache_fallos_total", "Imágenes sin resultado previo")
+DESCARTES = REG.contador("placas_descartes_total", "Imágenes descartadas", {"motivo": "decode"})
+
+def iter_rutas(src: Path):
+    pila = [src]
+    while pila:
+        d = pila.pop()
+        with os.scandir(d) as it:
+            ents = sorted(it, key=lambda e: e.name)
+        for e in reversed(ents):
+            if e.is_dir(follow_symlinks=False):
+                pila.append(e.path)
+        for e in ents:
+            if e.is_file() and os.path.splitext(e.name)[1].lower() in IMG_EXTS:
+                yield e.path
+
+def cargar_hechos(out: Path):
+    """Lee los chunks existentes (ignora una última línea truncada). Devuelve (por_firma, por_sha, n, ultimo_chunk)."""
+    por_firma, por_sha, n, ultimo = set(), set(), 0, -1
+    for p in sorted(out.glob("det_*.jsonl")):
+        ultimo = max(ultimo, int(p.stem.split("_")[1]))
+        with open(p, encoding="utf-8") as f:
+            for ln in f:
+                try:
+                    r = json.loads(ln)
+                except Exception:
+                    continue
+                por_firma.add((r["path"], r["size"], r["mtime_ns"]))
+                por_sha.add(r["sha1"]); n += 1
+    return por_firma, por_sha, n, ultimo
+
+class Salida:
+    """Chunks det_NNNNN.jsonl con append + flush por batch; rota cada CHUNK registros (y opcionalmente a Parquet)."""
+    def __init__(self, out: Path, ultimo: int, parquet=False):
+        self.out, self.parquet = out, parquet
+        self.k = ultimo if ultimo >= 0 else 0
+        self.p = out/f"det_{self.k:05d}.jsonl"
+        self.n = 0
+        if self.p.exists():
+            recortar_parcial(self.p)
+            self.n = sum(1 for _ in open(self.p, encoding="utf-8"))
+        self.f = open(self.p, "a", encoding="utf-8")
+
+    def escribir(self, regs):
+        for r in regs:
+            self.f.write(json.dumps(r, separators=(",", ":")) + "\n")
+        self.f.flush(); os.fsync(self.f.fileno())
+        self.n += len(regs)
+        if self.n >= CHUNK:
+            self.rotar()
+
+    def rotar(self):
+        self.f.close()
+        if self.parquet: a_parquet(self.p)
+        self.k += 1; self.n = 0
+        self.p = self.out/f"det_{self.k:05d}.jsonl"
+        self.f = open(self.p, "a", encoding="utf-8")
+
+    def cerrar(self):
+        self.f.close()
+        if self.parquet and self.n: a_parquet(self.p)
+
+def recortar_parcial(p: Path):
+    """Si un corte dejó la última línea a medias, la descarta para que el append siguiente no la pegue."""
+    data = p.read_bytes()
+    if data and not data.endswith(b"\n"):
+        with open(p, "r+b") as f:
+            f.truncate(data.rfind(b"\n") + 1)
+
+def a_parquet(p: Path):
+    try:
+        import pyarrow as pa, pyarrow.parquet as pq
+    except ImportError:
+        print("[AVISO] pyarrow no instalado: se conserva solo JSONL")
+        return
+    regs = [json.loads(ln) for ln in open(p, encoding="utf-8") if ln.strip()]
+    for r in regs: r["dets"] = json.dumps(r["dets"])
+    pq.write_table(pa.Table.from_pylist(regs), p.with_suffix(".parquet"))
+
+def decodificar(ruta, libres, pre, hechos):
+    """Hilo decodificador: firma -> (salta?) -> bytes -> sha1 -> imdecode -> letterbox a un slot libre.
+    Solo toma slot (de `libres`) la imagen que de verdad se preprocesa; lo libera inferir()."""
+    por_firma, por_sha = hechos
+    t0 = time.perf_counter()
+    st = os.stat(ruta)
+    base = {"path": ruta, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if (ruta, st.st_size, st.st_mtime_ns) in por_firma:
+        SALTOS["firma"].inc(); return None
+    data = np.fromfile(ruta, dtype=np.uint8)
+    base["sha1"] = sha1(data.data)
+    if base["sha1"] in por_sha:
+        SALTOS["sha1"].inc(); return None
+    NUEVAS.inc()
+    bgr = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    t1 = time.perf_counter(); ETAPAS["decode"].observar(t1 - t0)
+    if bgr is None:
+        DESCARTES.inc()
+        return {**base, "error": "decode", "dets": []}, None, None, t0
+    base["h"], base["w"] = bgr.shape[:2]
+    slot = libres.popleft()
+    meta = pre(bgr, slot)
+    ETAPAS["preproceso"].observar(time.perf_counter() - t1)
+    return base, meta, slot, t0
+
+def main():
+    ap = argparse.ArgumentParser(description="Inferencia masiva reanudable sobre carpetas de imágenes")
+    ap.add_argument("--onnx", required=True)
+    ap.add_argument("--src", type=Path, required=True, nargs="+")
+    ap.add_argument("--out", type=Path, default=Path("audit_out")/"infer")
+    ap.add_argument("--batch", type=int, default=BATCH)
+    ap.add_argument("--decoders", type=int, default=DECODERS)
+    ap.add_argument("--conf", type=float, default=CONF)
+    ap.add_argument("--iou", type=float, default=IOU)
+    ap.add_argument("--hilos", type=int, default=None, help="intra-op threads de ONNX Runtime")
+    ap.add_argument("--parquet", action="store_true", help="además de JSONL, escribe cada chunk cerrado como Parquet (pyarrow)")
+    ap.add_argument("--candidatos", type=Path, default=None, help="guardar también candidatos crudos pre-NMS (almacen_candidatos) en esta carpeta")
+    ap.add_argument("--piso", type=float, default=PISO, help="conf mínima de los candidatos guardados")
+    ap.add_argument("--metricas", type=int, default=None, metavar="PUERTO", help="exponer /metrics (Prometheus) en 127.0.0.1:PUERTO")
+    ap.add_argument("--sin-conteo", action="store_true", help="no contar archivos antes (sin ETA)")
+    args = ap.parse_args()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    por_firma, por_sha, n_prev, ultimo = cargar_hechos(args.out)
+    total = None if args.sin_conteo else sum(1 for s in args.src for _ in iter_rutas(s))
+    print(f"Ya procesadas: {n_prev}" + (f" | archivos en origen: {total}" if total is not None else ""))
+
+    det = Detector(args.onnx, args.hilos, args.conf, args.iou)
+    # batch fijo si el modelo se exportó con batch estático
+    b0 = det.sess.get_inputs()[0].shape[0]
+    fijo = isinstance(b0, int)
+    B = b0 if fijo else args.batch
+    R = 2*B + 2*args.decoders          # slots del anillo: en vuelo + batch en inferencia
+    libres = deque(range(R))           # slots sin dueño (popleft/append son atómicos entre hilos)
+    pre = Preproceso(det.imgsz, batch=R)
+    lote = np.empty((B, 3, det.imgsz, det.imgsz), np.float32)
+    salida = Salida(args.out, ultimo, args.parquet)
+    cands = EscritorCandidatos(args.candidatos, args.piso) if args.candidatos else None
+
+    rutas = (r for s in args.src for r in iter_rutas(s))
+    pend, batch = deque(), []
+    REG.medidor("placas_cola_decode", "Imágenes en decodificación/espera de batch", fuente=lambda: len(pend))
+    if args.metricas:
+        REG.servir(args.metricas)
+    hechos_n = saltados = 0
+    t0 = t_rep = time.perf_counter(); cpu0 = time.process_time()
+
+    def inferir(batch):
+        slots = [s for _, _, s, _ in batch]
+        if slots == list(range(slots[0], slots[0] + len(slots))) and not (fijo and len(slots) < B):
+            x = pre.entrada[slots[0]:slots[0] + len(slots)]   # slots contiguos: vista sin copia
+        else:
+            np.take(pre.entrada, slots, axis=0, out=lote[:len(slots)])
+            x = lote if fijo else lote[:len(slots)]           # batch estático: el resto del lote es relleno
+        t = time.perf_counter()
+        pred = det.crudo(x)
+        ETAPAS["inferencia"].observar(time.perf_counter() - t); TAM_BATCH.observar(len(batch))
+        regs = []
+        for i, (reg, meta, _, t_ini) in enumerate(batch):
+            t = time.perf_counter()
+            d = postproceso(pred[i], meta, det.conf, det.iou, det.max_det, (reg["h"], reg["w"]))
+            ahora = time.perf_counter()
+            ETAPAS["nms"].observar(ahora - t); ETAPAS["total"].observar(ahora - t_ini)
+            if cands:
+                cands.agregar(Path(reg["path"]).stem, pred[i], meta, (reg["h"], reg["w"]))
+            regs.append({**reg, "dets": np.round(d, 2).tolist()})
+        libres.extend(slots)
+        return regs
+
+    try:
+        with ThreadPoolExecutor(args.decoders) as ex:
+            agotado = False
+            while True:
+                # cada pendiente puede tomar a lo sumo un slot: con pend + batch <= R nunca falta uno
+                while not agotado and len(pend) + len(batch) < R:
+                    r = next(rutas, None)
+                    if r is None:
+                        agotado = True; break
+                    pend.append(ex.submit(decodificar, r, libres, pre, (por_firma, por_sha)))
+                if not pend and not batch:
+                    break
+                listos = []
+                if pend:
+                    res = pend.popleft().result()
+                    if res is None:
+                        saltados += 1
+                    elif res[1] is None:
+                        listos.append(res[0])
+                    else:
+                        batch.append(res)
+                if batch and (len(batch) == B or (agotado and not pend)):
+                    listos += inferir(batch); batch = []
+                if listos:
+                    if cands: cands.flush()   # los candidatos nunca quedan detrás del checkpoint JSONL
+                    salida.escribir(listos); hechos_n += len(listos)
+                ahora = time.perf_counter()
+                if ahora - t_rep >= REPORTE_S:
+                    t_rep = ahora
+                    vel = hechos_n/(ahora - t0)
+                    cpu = (time.process_time() - cpu0)/(ahora - t0)/(os.cpu_count() or 1)*100
+                    faltan = (total - hechos_n - saltados) if total is not None else None
+                    eta = f" | ETA {faltan/vel/60:.1f} min" if faltan is not None and vel > 0 else ""
+                    print(f"{hechos_n} nuevas, {saltados} saltadas | {vel:.1f} img/s | CPU {cpu:.0f}%{eta}", flush=True)
+    finally:
+        salida.cerrar()
+        if cands: cands.cerrar()
+        REG.a_json(args.out/"metricas.json")
+        REG.detener()
+
+    dt = time.perf_counter() - t0
+    print(f"Listo: {hechos_n} imágenes nuevas en {dt:.1f}s ({hechos_n/max(dt,1e-9):.1f} img/s), {saltados} ya procesadas. Salida: {args.out}")
+
+if __name__ == "__main__":
+    main()
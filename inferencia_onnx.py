@@ -0,0 +1,113 @@
+# inferencia_onnx.py
+# Piezas comunes de inferencia con el detector YOLOv8 exportado a ONNX (CPU):
+# sesión, letterbox, NMS vectorizado y postproceso de la salida (1, 4+nc, A) -> cajas en píxeles originales.
+import numpy as np
+import cv2
+import onnxruntime as ort
+
+IMGSZ = 640
+CONF = 0.25
+IOU = 0.45
+MAX_DET = 300
+PAD_VALOR = 114
+
+def crear_sesion(onnx_path, hilos=None):
+    so = ort.SessionOptions()
+    if hilos:
+        so.intra_op_num_threads = hilos
+        so.inter_op_num_threads = 1
+    return ort.InferenceSession(str(onnx_path), sess_options=so, providers=["CPUExecutionProvider"])
+
+def imgsz_de(sess, defecto=IMGSZ):
+    """Lado de entrada del modelo si es estático; si no, el defecto."""
+    shp = sess.get_inputs()[0].shape
+    return shp[-1] if isinstance(shp[-1], int) else defecto
+
+def letterbox(bgr, imgsz=IMGSZ):
+    """Versión directa: resize + pad + RGB + float + CHW. Devuelve (tensor (3,S,S) float32, (r, padx, pady))."""
+    h, w = bgr.shape[:2]
+    r = min(imgsz/h, imgsz/w)
+    nw, nh = int(round(w*r)), int(round(h*r))
+    padx, pady = (imgsz - nw)//2, (imgsz - nh)//2
+    img = cv2.resize(bgr, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), PAD_VALOR, dtype=np.uint8)
+    canvas[pady:pady+nh, padx:padx+nw] = img
+    x = canvas[..., ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(x), (r, padx, pady)
+
+def nms(xyxy, scores, iou=IOU, max_det=MAX_DET):
+    """NMS greedy con IoU vectorizado. Devuelve índices conservados (orden de score descendente)."""
+    orden = np.argsort(-scores, kind="stable")
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    keep = []
+    while orden.size and len(keep) < max_det:
+        i = orden[0]
+        keep.append(i)
+        rest = orden[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw*ih
+        orden = rest[inter / (area[i] + area[rest] - inter + 1e-9) <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+def candidatos(pred, conf=CONF):
+    """Salida cruda (4+nc, A) -> (xyxy en espacio letterbox, score, cls) con score >= conf (antes de NMS)."""
+    p = pred.T
+    cls_scores = p[:, 4:]
+    cls = cls_scores.argmax(axis=1)
+    score = cls_scores[np.arange(len(p)), cls]
+    m = score >= conf
+    p, score, cls = p[m], score[m], cls[m]
+    xyxy = np.empty((len(p), 4), dtype=np.float32)
+    xyxy[:, 0] = p[:, 0] - p[:, 2]/2; xyxy[:, 1] = p[:, 1] - p[:, 3]/2
+    xyxy[:, 2] = p[:, 0] + p[:, 2]/2; xyxy[:, 3] = p[:, 1] + p[:, 3]/2
+    return xyxy, score.astype(np.float32), cls
+
+def a_original(xyxy, meta, shape=None):
+    """Deshace el letterbox: espacio de entrada del modelo -> píxeles de la imagen original."""
+    r, padx, pady = meta
+    out = (xyxy - np.array([padx, pady, padx, pady], dtype=np.float32)) / r
+    if shape is not None:
+        h, w = shape[:2]
+        out[:, [0, 2]] = out[:, [0, 2]].clip(0, w)
+        out[:, [1, 3]] = out[:, [1, 3]].clip(0, h)
+    return out
+
+def postproceso(pred, meta, conf=CONF, iou=IOU, max_det=MAX_DET, shape=None):
+    """(4+nc, A) -> array (k,6) float32 [x1,y1,x2,y2,score,cls] en píxeles originales."""
+    xyxy, score, cls = candidatos(pred, conf)
+    if len(score) == 0:
+        return np.zeros((0, 6), np.float32)
+    # NMS por clase: desplaza cada clase para que no se solapen entre sí
+    off = cls[:, None].astype(np.float32) * 4096.0
+    keep = nms(xyxy + off, score, iou, max_det)
+    out = np.empty((len(keep), 6), np.float32)
+    out[:, :4] = a_original(xyxy[keep], meta, shape)
+    out[:, 4] = score[keep]; out[:, 5] = cls[keep]
+    return out
+
+class Detector:
+    """Sesión ONNX + postproceso. detectar(batch (B,3,S,S), metas) -> lista de arrays (k,6)."""
+    def __init__(self, onnx_path, hilos=None, conf=CONF, iou=IOU, max_det=MAX_DET, imgsz=None):
+        self.sess = crear_sesion(onnx_path, hilos)
+        self.input = self.sess.get_inputs()[0].name
+        self.dinamico = not isinstance(self.sess.get_inputs()[0].shape[-1], int)
+        self.imgsz = imgsz or imgsz_de(self.sess)   # export dinámico sin imgsz: IMGSZ por defecto
+        self.conf, self.iou, self.max_det = conf, iou, max_det
+
+    def crudo(self, batch):
+        return self.sess.run(None, {self.input: batch})[0]
+
+    def crudo_sin_copia(self, batch):
+        """Igual que crudo() pero enlaza el buffer de entrada (p.ej. memoria compartida) sin copiarlo."""
+        io = self.sess.io_binding()
+        io.bind_cpu_input(self.input, batch)
+        io.bind_output(self.sess.get_outputs()[0].name)
+        self.sess.run_with_iobinding(io)
+        return io.copy_outputs_to_cpu()[0]
+
+    def detectar(self, batch, metas, shapes=None):
+        pred = self.crudo(batch)
+        shapes = shapes or [None]*len(metas)
+        return [postproceso(pred[i], metas[i], self.conf, self.iou, self.max_det, shapes[i]) for i in range(len(metas))]
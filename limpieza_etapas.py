@@ -1,11 +1,17 @@
 # limpieza_etapas.py
+# Distribuido (varias máquinas o procesos sobre el mismo árbol ROOT):
+#   python limpieza_etapas.py --shard 0/4      # en cada nodo i: escaneo + SHA1 + pHash + labels de su parte
+#   python limpieza_etapas.py --merge          # un nodo: une los shards y corre A-D con un único plan
 from pathlib import Path
 from collections import defaultdict, Counter
-import argparse, csv, hashlib, shutil
+import argparse, csv, hashlib, io, os, shutil
 import cv2, numpy as np
 from PIL import Image
 import imagehash
 from tqdm import tqdm
+from cuarentena import Cuarentena
+from shards import Shards
+from registros import TablaRutas, LIMPIEZA_DTYPE, construir, phash_int, hamming, grupos
 
 # ====== CONFIG ======
 ROOT = Path(".")
@@ -20,24 +26,33 @@ MIN_BRIGHT, MAX_BRIGHT = 40, 230  # exposición
 ALLOWED_CLASSES = None    # None = no forzar clase; {0} si solo “placa”
 MIN_BOX_AREA = 0.0005     # cajas diminutas
 
+# Si existe, el escaneo lee las imágenes de los shards (shards.py pack) en vez de archivo por archivo
+SHARDS_DIR = None         # p. ej. Path("shards")
+
+# Partición por hash de "split/nombre" (--shard i/N): None = ver todo el árbol
+SHARD = None              # (i, N)
+
 # Salidas
 Q = ROOT/"_quarantine"
 LOG_DIR = ROOT/"audit_out"
-for d in ["duplicates_exact","duplicates_near","too_small","blurry","exposure_review","bad_label","tiny_box"]:
-    (Q/d).mkdir(parents=True, exist_ok=True)
-LOG_DIR.mkdir(exist_ok=True)
+SHARD_OUT = LOG_DIR/"limpieza_shards"
+Q_SUBDIRS = ["duplicates_exact","duplicates_near","too_small","blurry","exposure_review","bad_label","tiny_box"]
 
 # ====== helpers ======
-def sha1(p:Path, chunk=1<<20):
+def sha1(p, chunk=1<<20):
+    """SHA1 hex de un archivo (por bloques) o de bytes ya leídos."""
+    if isinstance(p, (bytes, bytearray, memoryview)):
+        return hashlib.sha1(p).hexdigest()
     h=hashlib.sha1()
     with open(p,"rb") as f:
         for b in iter(lambda:f.read(chunk), b""):
             h.update(b)
     return h.hexdigest()
 
-def phash(p:Path):
+def phash(p):
+    """pHash de un archivo o de bytes ya leídos (mismo camino PIL en ambos casos)."""
     try:
-        im = Image.open(p).convert("RGB")
+        im = Image.open(io.BytesIO(p) if isinstance(p, (bytes, bytearray, memoryview)) else p).convert("RGB")
         return imagehash.phash(im)
     except Exception:
         return None
@@ -77,118 +92,230 @@ def yolo_valid(lines):
     if tiny: return False, "tiny_box_only"
     return True, ""
 
-def move_pair(img:Path, lbl:Path, dst_dir:Path, reason:str, writer, dry=False):
+LBL_OK, LBL_BAD, LBL_TINY = 1, 2, 3   # columna "lbl" (0 = sin calcular)
+
+def codigo_label(lbl:Path):
+    ok, why = yolo_valid(yolo_read(lbl))
+    if ok: return LBL_OK
+    return LBL_TINY if why=="tiny_box_only" else LBL_BAD
+
+def en_shard(split, nombre):
+    """True si la imagen toca a este nodo. Depende solo de la ruta relativa: igual en todas las máquinas."""
+    if SHARD is None: return True
+    i, n = SHARD
+    return int.from_bytes(hashlib.sha1(f"{split}/{nombre}".encode("utf-8")).digest()[:8], "big") % n == i
+
+# Columnas del escaneo que necesita cada etapa (B desempata casi-duplicados por w*h y var)
+CAMPOS_ETAPA = {"A": {"sha"}, "B": {"pha", "calidad"}, "C": {"calidad"}, "D": set()}
+CAMPOS_TODOS = {"sha", "pha", "calidad"}
+
+def fila_scan(si, data, campos=CAMPOS_TODOS):
+    """Tupla LIMPIEZA_DTYPE a partir de los bytes del archivo (se leen una vez), solo con los `campos` pedidos:
+    sha (SHA1), pha (pHash con PIL, como phash()), calidad (decode cv2: w, h, var, bri). El resto queda en 0."""
+    dig = hashlib.sha1(data).digest() if "sha" in campos else b""
+    pha, ok = phash_int(phash(data)) if "pha" in campos else (0, False)
+    if "calidad" not in campos:
+        return (si, True, 0, 0, 0.0, 0.0, pha, ok, dig, 0)
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        return (si, True, 0, 0, 0.0, 0.0, pha, ok, dig, 0)
+    h,w = bgr.shape[:2]
+    return (si, True, w, h, lap_var(bgr), bright_v(bgr), pha, ok, dig, 0)
+
+def move_pair(img:Path, lbl:Path, dst_dir:Path, reason:str, writer, dry=False, plan=None):
+    """Con `plan` (cuarentena.Cuarentena) solo planifica; el movimiento real ocurre en plan.ejecutar()."""
     dst_dir.mkdir(parents=True, exist_ok=True)
     if dry:
         writer.writerow([reason, str(img), str(lbl if lbl and lbl.exists() else ""), str(dst_dir), "DRY"])
         return
-    dst_img = dst_dir/img.name
     writer.writerow([reason, str(img), str(lbl if lbl and lbl.exists() else ""), str(dst_dir), "MOVED"])
-    shutil.move(str(img), str(dst_img))
+    if plan is not None:
+        plan.agregar(img, dst_dir)
+        if lbl and lbl.exists(): plan.agregar(lbl, dst_dir)
+        return
+    shutil.move(str(img), str(dst_dir/img.name))
     if lbl and lbl.exists():
         shutil.move(str(lbl), str(dst_dir/lbl.name))
 
-def scan():
-    items=[]
-    for split in SPLITS:
+def iter_scan(rutas, campos=CAMPOS_TODOS):
+    """Genera una tupla (LIMPIEZA_DTYPE) por imagen de este shard; registra su ruta en `rutas`.
+    Sin `campos` (p. ej. --only D) no se lee ningún archivo."""
+    for si, split in enumerate(SPLITS):
         img_dir = ROOT/split/"images"
-        lbl_dir = ROOT/split/"labels"
-        imgs = [p for p in img_dir.glob("*") if p.suffix.lower() in IMG_EXTS]
-        for img in tqdm(imgs, desc=f"escaneando {split}"):
-            lbl = lbl_dir/(img.stem+".txt")
-            rec = {"split":split, "img":img, "lbl":lbl, "exists":img.exists()}
-            bgr = read_img(img)
-            if bgr is None:
-                rec.update({"w":0,"h":0,"var":0.0,"bri":0.0})
-            else:
-                h,w = bgr.shape[:2]
-                rec.update({"w":w,"h":h,"var":lap_var(bgr),"bri":bright_v(bgr)})
-            items.append(rec)
-    return items
+        d = rutas.dir_id(img_dir)
+        if SHARDS_DIR and (Path(SHARDS_DIR)/f"{split}.idx.npy").exists():
+            yield from iter_scan_shards(rutas, si, split, d, campos)
+            continue
+        nombres = sorted(n for n in os.listdir(img_dir) if Path(n).suffix.lower() in IMG_EXTS) if img_dir.exists() else []
+        nombres = [n for n in nombres if en_shard(split, n)]
+        for nombre in tqdm(nombres, desc=f"escaneando {split}"):
+            rutas.agregar(d, nombre)
+            if not campos:
+                yield fila_scan(si, b"", campos); continue
+            with open(img_dir/nombre, "rb") as f:
+                yield fila_scan(si, f.read(), campos)
+
+def iter_scan_shards(rutas, si, split, d, campos=CAMPOS_TODOS):
+    """Igual que iter_scan pero tomando los bytes de imagen de los shards. Manda el disco: se recorren los nombres
+    que siguen en <split>/images; si un archivo no está en el pack o cambió de tamaño/mtime desde `shards.py pack`,
+    se lee del disco (lo que se mueve es el archivo actual)."""
+    sh = Shards(SHARDS_DIR, split)
+    img_dir = rutas.dirs[d]
+    en_pack = {sh.nombre(i): i for i in range(len(sh))}
+    con_mtime = "img_mtime_ns" in sh.idx.dtype.names     # packs viejos: solo se compara el tamaño
+    ents = sorted((e for e in os.scandir(img_dir) if Path(e.name).suffix.lower() in IMG_EXTS),
+                  key=lambda e: e.name) if img_dir.exists() else []
+    nuevos = cambiados = 0
+    for e in tqdm(ents, desc=f"escaneando {split} (shards)"):
+        if not en_shard(split, e.name): continue
+        rutas.agregar(d, e.name)
+        if not campos:
+            yield fila_scan(si, b"", campos); continue
+        i = en_pack.get(e.name)
+        if i is not None:
+            st, r = e.stat(), sh.idx[i]
+            if st.st_size == r["img_len"] and (not con_mtime or st.st_mtime_ns == r["img_mtime_ns"]):
+                yield fila_scan(si, bytes(sh.img_bytes(i)), campos); continue
+            cambiados += 1
+        else:
+            nuevos += 1
+        with open(e.path, "rb") as f:
+            yield fila_scan(si, f.read(), campos)
+    if nuevos or cambiados:
+        print(f"[AVISO] {split}: {nuevos} imágenes fuera del pack y {cambiados} modificadas después de empaquetar "
+              f"(leídas del disco). Re-empaquetar: python shards.py pack --out {SHARDS_DIR}")
+    if not con_mtime:
+        print(f"[AVISO] {split}: el índice de {SHARDS_DIR} no guarda mtime; solo se detectan cambios de tamaño")
+
+def scan(campos=CAMPOS_TODOS):
+    """Devuelve (rec, rutas): array estructurado LIMPIEZA_DTYPE + tabla de rutas internada."""
+    rutas = TablaRutas()
+    rec = construir(iter_scan(rutas, campos), dtype=LIMPIEZA_DTYPE)
+    return rec, rutas
+
+def calcular_shard(scan_res):
+    """Todo lo que depende de leer archivos, para las filas de este nodo (el merge no vuelve a leer imágenes).
+    SHA1, pHash y calidad ya vienen de fila_scan (todos: el merge puede correr cualquier etapa); aquí, los labels."""
+    rec, rutas = scan_res
+    for i in tqdm(range(len(rec)), desc="labels"):
+        rec["lbl"][i] = codigo_label(rutas.lbl(i))
+
+def guardar_shard(scan_res, out:Path):
+    rec, rutas = scan_res
+    i, n = SHARD
+    out.mkdir(parents=True, exist_ok=True)
+    p = out/f"shard_{i}of{n}.npz"
+    tmp = p.with_suffix(".tmp.npz")
+    np.savez(tmp, rec=rec, nombres=np.array([rutas.nombre(k) for k in range(len(rec))], dtype=str),
+             shard=np.array([i, n]))
+    os.replace(tmp, p)
+    return p
+
+def cargar_shards(carpeta:Path):
+    """Une los shard_*ofN.npz en el orden del escaneo de un solo nodo (split, nombre) -> (rec, rutas)."""
+    partes = [np.load(p) for p in sorted(carpeta.glob("shard_*of*.npz"))]
+    if not partes:
+        raise SystemExit(f"[ERROR] No hay shards en {carpeta}")
+    ns = {int(z["shard"][1]) for z in partes}
+    if len(ns) != 1:
+        raise SystemExit(f"[ERROR] Shards de particiones distintas en {carpeta}: N={sorted(ns)}")
+    n = ns.pop()
+    faltan = sorted(set(range(n)) - {int(z["shard"][0]) for z in partes})
+    if faltan:
+        raise SystemExit(f"[ERROR] Faltan shards {faltan} de {n} en {carpeta}")
+    rec = np.concatenate([z["rec"] for z in partes])
+    nombres = np.concatenate([z["nombres"] for z in partes])
+    orden = np.lexsort((nombres, rec["split"]))
+    rec, nombres = rec[orden], nombres[orden]
+    rutas = TablaRutas()
+    dirs = [rutas.dir_id(ROOT/s/"images") for s in SPLITS]
+    for k in range(len(rec)):
+        rutas.agregar(dirs[rec["split"][k]], str(nombres[k]))
+        # lo que ya no está (movido a mano o por otra corrida) no entra en el plan
+        if not rutas.img(k).exists(): rec["vivo"][k] = False
+    print(f"[MERGE] {len(partes)} shards, {len(rec)} imágenes ({int((~rec['vivo']).sum())} ya no existen)")
+    return rec, rutas
+
+def mover(rec, rutas, i, dst_dir, reason, writer, dry, plan=None):
+    move_pair(rutas.img(i), rutas.lbl(i), dst_dir, reason, writer, dry, plan)
+    if not dry: rec["vivo"][i] = False
 
 # ====== Etapas ======
-def etapa_A_duplicados_exactos(items, writer, dry):
-    bysha=defaultdict(list)
-    for it in items:
-        if it["img"].exists():
-            bysha[sha1(it["img"])].append(it)
+def etapa_A_duplicados_exactos(scan_res, writer, dry, plan=None):
+    rec, rutas = scan_res
+    idx = np.flatnonzero(rec["vivo"])
+    digs = rec["sha"][idx]      # calculado en el escaneo (mismos bytes que se decodificaron)
+    train = SPLITS.index("train") if "train" in SPLITS else -1
     moved=0
-    for sha, group in bysha.items():
-        if len(group)<=1: continue
-        keep = next((g for g in group if g["split"]=="train"), group[0])
-        for it in group:
-            if it is keep: continue
-            if it["img"].exists():
-                move_pair(it["img"], it["lbl"], Q/"duplicates_exact", "duplicate_exact", writer, dry)
-                moved += 1
+    for group in grupos(digs, idx):
+        en_train = group[rec["split"][group]==train]
+        keep = en_train[0] if len(en_train) else group[0]
+        for i in group:
+            if i == keep: continue
+            mover(rec, rutas, i, Q/"duplicates_exact", "duplicate_exact", writer, dry, plan)
+            moved += 1
     print(f"[A] Duplicados exactos movidos: {moved}")
     return moved
 
-def etapa_B_casi_duplicados(items, writer, dry):
-    # pHash solo de archivos existentes
-    recs=[]
-    for it in items:
-        if not it["img"].exists(): continue
-        h = phash(it["img"])
-        recs.append({**it, "pha": str(h) if h else ""})
-
-    # SOLO entre splits distintos (evita vaciar train)
-    buckets=defaultdict(list)
-    for r in recs:
-        if not r["pha"]: continue
-        for other in ("train","valid","test"):
-            if other == r["split"]: continue
-            key = (r["pha"][:4], tuple(sorted([r["split"], other])))
-            buckets[key].append(r)
-
-    moved=0; visited=set()
-    def ham(a,b): return imagehash.hex_to_hash(a)-imagehash.hex_to_hash(b)
-
-    for _, grp in buckets.items():
-        n=len(grp)
-        for i in range(n):
-            for j in range(i+1,n):
-                a,b = grp[i], grp[j]
-                if not a["img"].exists() or not b["img"].exists(): continue
-                if a["img"] in visited or b["img"] in visited: continue
-                if not a["pha"] or not b["pha"]: continue
-                d = ham(a["pha"], b["pha"])
-                if d <= NEAR_DUP_HAMMING:
-                    qa = (a["w"]*a["h"], a["var"])
-                    qb = (b["w"]*b["h"], b["var"])
-                    keep, drop = (a,b) if qa >= qb else (b,a)
-                    move_pair(drop["img"], drop["lbl"], Q/"duplicates_near", f"near_duplicate_h{d}", writer, dry)
-                    visited.add(drop["img"]); moved += 1
+def etapa_B_casi_duplicados(scan_res, writer, dry, plan=None):
+    rec, rutas = scan_res
+    # el pHash (entero de 64 bits en la columna) ya viene del escaneo, también tras --merge;
+    # aquí solo se reintenta desde el archivo lo que PIL no pudo abrir
+    idx = np.flatnonzero(rec["vivo"])
+    for i in tqdm(idx[~rec["tiene_pha"][idx]], desc="pHash"):
+        rec["pha"][i], rec["tiene_pha"][i] = phash_int(phash(rutas.img(i)))
+
+    # SOLO entre splits distintos (evita vaciar train): cubeta = (prefijo 16 bits, par de splits)
+    con_pha = idx[rec["tiene_pha"][idx]]
+    prefijo = (rec["pha"][con_pha] >> np.uint64(48)).astype(np.uint16)
+    caido = ~rec["vivo"].copy()
+    calidad = np.stack([rec["w"].astype(np.int64)*rec["h"], rec["var"]], axis=1)
+
+    moved=0
+    for sa in range(len(SPLITS)):
+        for sb in range(sa+1, len(SPLITS)):
+            m = np.isin(rec["split"][con_pha], (sa, sb))
+            for grp in grupos(prefijo[m], con_pha[m]):
+                pha = rec["pha"][grp]
+                for k in range(len(grp)):
+                    a = grp[k]
+                    if caido[a]: continue
+                    ds = hamming(pha[k], pha[k+1:])
+                    for off in np.flatnonzero(ds <= NEAR_DUP_HAMMING):
+                        if caido[a]: break
+                        b = grp[k+1+off]
+                        if caido[b]: continue
+                        keep, drop = (a,b) if tuple(calidad[a]) >= tuple(calidad[b]) else (b,a)
+                        mover(rec, rutas, drop, Q/"duplicates_near", f"near_duplicate_h{ds[off]}", writer, dry, plan)
+                        caido[drop] = True; moved += 1
     print(f"[B] Casi-duplicados movidos: {moved}")
     return moved
 
-def etapa_C_calidad(items, writer, dry):
-    m_small=m_blur=m_expo=0
-    for it in items:
-        if not it["img"].exists(): continue
-        if it["w"]<MIN_W or it["h"]<MIN_H:
-            move_pair(it["img"], it["lbl"], Q/"too_small", "too_small", writer, dry); m_small+=1; continue
-        if it["var"]<MIN_VAR_LAPLACE:
-            move_pair(it["img"], it["lbl"], Q/"blurry", "blurry", writer, dry); m_blur+=1; continue
-        if it["bri"]<MIN_BRIGHT or it["bri"]>MAX_BRIGHT:
-            move_pair(it["img"], it["lbl"], Q/"exposure_review", "exposure_extreme", writer, dry); m_expo+=1; continue
+def etapa_C_calidad(scan_res, writer, dry, plan=None):
+    rec, rutas = scan_res
+    vivo = rec["vivo"]
+    small = vivo & ((rec["w"]<MIN_W) | (rec["h"]<MIN_H))
+    blur = vivo & ~small & (rec["var"]<MIN_VAR_LAPLACE)
+    expo = vivo & ~small & ~blur & ((rec["bri"]<MIN_BRIGHT) | (rec["bri"]>MAX_BRIGHT))
+    for mask, sub, reason in ((small, "too_small", "too_small"),
+                              (blur, "blurry", "blurry"),
+                              (expo, "exposure_review", "exposure_extreme")):
+        for i in np.flatnonzero(mask):
+            mover(rec, rutas, i, Q/sub, reason, writer, dry, plan)
+    m_small, m_blur, m_expo = int(small.sum()), int(blur.sum()), int(expo.sum())
     print(f"[C] Pequeñas: {m_small} | Borrosas: {m_blur} | Exposición extrema: {m_expo}")
     return m_small+m_blur+m_expo
 
-def etapa_D_labels(writer, dry):
+def etapa_D_labels(scan_res, writer, dry, plan=None):
+    rec, rutas = scan_res
     moved=Counter()
-    for split in SPLITS:
-        img_dir = ROOT/split/"images"
-        for img in img_dir.glob("*"):
-            if img.suffix.lower() not in IMG_EXTS or not img.exists(): continue
-            lbl = img.parent.parent/"labels"/(img.stem+".txt")
-            lines = yolo_read(lbl)
-            ok, why = yolo_valid(lines)
-            if ok: continue
-            reason = "bad_label" if why!="tiny_box_only" else "tiny_box"
-            dst = Q/("bad_label" if reason=="bad_label" else "tiny_box")
-            move_pair(img, lbl, dst, reason, writer, dry)
-            moved[reason]+=1
+    for i in np.flatnonzero(rec["vivo"]):
+        if not rutas.img(i).exists(): continue
+        c = rec["lbl"][i] or codigo_label(rutas.lbl(i))
+        if c == LBL_OK: continue
+        reason = "bad_label" if c==LBL_BAD else "tiny_box"
+        mover(rec, rutas, i, Q/reason, reason, writer, dry, plan)
+        moved[reason]+=1
     print(f"[D] Labels movidos -> {dict(moved)}")
     return sum(moved.values())
 
@@ -203,8 +330,27 @@ def main():
     ap.add_argument("--only", choices=list("ABCD"), help="Corre solo una etapa")
     ap.add_argument("--from", dest="from_stage", choices=list("ABCD"), help="Corre desde esta etapa en adelante")
     ap.add_argument("--dry-run", action="store_true", help="No mueve archivos, solo registra en log")
+    ap.add_argument("--shards", type=Path, help="Escanea leyendo desde shards (ver shards.py)")
+    ap.add_argument("--shard", metavar="i/N", help="Solo calcula la parte i de N (sin mover) y la guarda para --merge")
+    ap.add_argument("--merge", action="store_true", help="Une los resultados de --shard y corre las etapas sobre todo")
+    ap.add_argument("--shard-dir", type=Path, default=SHARD_OUT, help="Carpeta (compartida) de resultados por shard")
     args=ap.parse_args()
+    global SHARDS_DIR, SHARD
+    if args.shards:
+        SHARDS_DIR = args.shards
+    if args.shard:
+        i, n = map(int, args.shard.split("/"))
+        if not 0 <= i < n: ap.error("--shard i/N requiere 0 <= i < N")
+        SHARD = (i, n)
+        scan_res = scan()
+        calcular_shard(scan_res)
+        p = guardar_shard(scan_res, args.shard_dir)
+        print(f"[SHARD {i}/{n}] {len(scan_res[0])} imágenes -> {p}")
+        return
 
+    for d in Q_SUBDIRS:
+        (Q/d).mkdir(parents=True, exist_ok=True)
+    LOG_DIR.mkdir(exist_ok=True)
     moves_log = LOG_DIR/"moves_log.csv"
     with open(moves_log, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f); writer.writerow(["reason","src_img","src_lbl","dst_dir","action"])
@@ -212,9 +358,8 @@ def main():
         stages = [("A", etapa_A_duplicados_exactos),
                   ("B", etapa_B_casi_duplicados),
                   ("C", etapa_C_calidad),
-                  ("D", lambda items, w, d: etapa_D_labels(w, d))]
-
-        items = scan()
+                  ("D", etapa_D_labels)]
+        plan = None if args.dry_run else Cuarentena()
 
         run = []
         if args.only:
@@ -225,16 +370,22 @@ def main():
         else:
             run = stages
 
+        # el escaneo solo calcula lo que usan las etapas elegidas (--only C no paga SHA1 ni pHash)
+        campos = set().union(*(CAMPOS_ETAPA[k] for k, _ in run))
+        scan_res = cargar_shards(args.shard_dir) if args.merge else scan(campos)
+        rec, rutas = scan_res
+        print(f"Escaneadas: {len(rec)} imágenes ({(rec.nbytes + rutas.nbytes())/max(len(rec),1):.0f} bytes/imagen en memoria)")
+
         print("Conteo inicial:", count_now())
         for k, fn in run:
-            if k=="D":
-                fn(items, writer, args.dry_run)
-            else:
-                fn(items, writer, args.dry_run)
+            fn(scan_res, writer, args.dry_run, plan)
+            if plan is not None: plan.ejecutar()
             print(f"Conteo tras {k}:", count_now(), "\n")
 
     print("Log:", moves_log)
     print("Cuarentena:", Q)
+    if plan is not None and plan.movidos:
+        print(f"Diario: {plan.journal} ({plan.movidos} archivos). Para revertir: python cuarentena.py undo {plan.journal}")
 
 if __name__=="__main__":
     main()
@@ -1,10 +1,11 @@
 from pathlib import Path
-from collections import defaultdict
-import shutil, csv
+import argparse, os, shutil, csv
 import cv2, numpy as np
 from PIL import Image
 import imagehash
 from tqdm import tqdm
+from registros import TablaRutas, construir, phash_int, hamming, grupos
+from coreset import box_stats, descriptores, kcenter
 
 ROOT = Path(".")
 SRC_IMG = ROOT/"train/images"
@@ -23,6 +24,16 @@ MIN_BOX_AREA = 0.0005
 PHASH_HAMMING_MAX = 3           # dedup intra-train
 PHASH_PREFIX = 4
 
+# Selección: "calidad" = top-N por (resolución, varianza); "kcenter" = greedy k-center sobre
+# descriptores (pHash, cajas, brillo) ponderado por calidad -> subsets anidados más diversos
+SELECCION = "calidad"
+PESO_CALIDAD = 0.1
+
+ap = argparse.ArgumentParser(description="Construye subsets anidados de train para la serie de tamaños")
+ap.add_argument("--modo", choices=["calidad", "kcenter"], default=SELECCION)
+ap.add_argument("--peso-calidad", type=float, default=PESO_CALIDAD)
+args = ap.parse_args()
+
 def read_img(p):
     img = cv2.imread(str(p), cv2.IMREAD_COLOR)
     if img is not None: return img
@@ -39,6 +50,7 @@ def read_img(p):
         return None
 
 def lap_var(img): return float(cv2.Laplacian(img, cv2.CV_64F).var())
+def bright_v(img): return float(np.mean(cv2.cvtColor(img, cv2.COLOR_BGR2HSV)[...,2]))
 
 def yolo_ok(lbl: Path):
     if not lbl.exists(): return False
@@ -57,66 +69,68 @@ def yolo_ok(lbl: Path):
         if w*h >= MIN_BOX_AREA: any_big=True
     return any_big
 
-def phash_hex(p):
-    try: return str(imagehash.phash(Image.open(p).convert("RGB")))
-    except Exception: return ""
-
-def ham(a,b): return imagehash.hex_to_hash(a) - imagehash.hex_to_hash(b)
-def quality_key(w,h,var): return (w*h, var)
-
-# 1) Recolectar candidatos "buenos" del train
-items=[]
-imgs=[p for p in SRC_IMG.glob("*") if p.suffix.lower() in IMG_EXTS]
-for img in tqdm(imgs, desc="Escaneando train"):
-    lbl=SRC_LBL/(img.stem+".txt")
-    if not yolo_ok(lbl): continue
-    bgr=read_img(img)
-    if bgr is None: continue
-    h,w=bgr.shape[:2]
-    if w<MIN_W or h<MIN_H: continue
-    var=lap_var(bgr)
-    if var<MIN_VAR_LAPLACE: continue
-    pha=phash_hex(img)
-    items.append({"img":img,"lbl":lbl,"w":w,"h":h,"var":var,"pha":pha})
-
+def phash(p):
+    try: return imagehash.phash(Image.open(p).convert("RGB"))
+    except Exception: return None
+
+# 1) Recolectar candidatos "buenos" del train (columnar: una fila por imagen + rutas internadas)
+def iter_candidatos(rutas):
+    d = rutas.dir_id(SRC_IMG)
+    nombres = sorted(n for n in os.listdir(SRC_IMG) if Path(n).suffix.lower() in IMG_EXTS)
+    for nombre in tqdm(nombres, desc="Escaneando train"):
+        img = SRC_IMG/nombre
+        if not yolo_ok(SRC_LBL/(img.stem+".txt")): continue
+        bgr=read_img(img)
+        if bgr is None: continue
+        h,w=bgr.shape[:2]
+        if w<MIN_W or h<MIN_H: continue
+        var=lap_var(bgr)
+        if var<MIN_VAR_LAPLACE: continue
+        pha, ok = phash_int(phash(img))
+        rutas.agregar(d, nombre)
+        yield (0, True, w, h, var, bright_v(bgr), pha, ok)
+
+rutas = TablaRutas()
+items = construir(iter_candidatos(rutas))
 print("Candidatos tras filtros:", len(items))
 
 # 2) Deduplicación intra-train por pHash (clusters y conservar el de mayor calidad)
-buckets=defaultdict(list)
-for it in items:
-    key = it["pha"][:PHASH_PREFIX] if it["pha"] else f"nohash_{it['img'].suffix}"
-    buckets[key].append(it)
-
-visited=set(); pool=[]
-for _, lst in tqdm(buckets.items(), desc="Deduplicando pHash"):
-    n=len(lst)
-    taken=[False]*n
-    for i in range(n):
-        if taken[i]: continue
-        cluster=[lst[i]]; taken[i]=True
-        for j in range(i+1,n):
-            if taken[j]: continue
-            a,b=lst[i], lst[j]
-            if a["pha"] and b["pha"] and ham(a["pha"], b["pha"])<=PHASH_HAMMING_MAX:
-                cluster.append(b); taken[j]=True
-        best=max(cluster, key=lambda x: quality_key(x["w"],x["h"],x["var"]))
-        if best["img"] not in visited:
-            pool.append(best); visited.add(best["img"])
+area = items["w"].astype(np.int64)*items["h"]
+var = items["var"]
+con_pha = np.flatnonzero(items["tiene_pha"])
+prefijo = (items["pha"][con_pha] >> np.uint64(64 - 4*PHASH_PREFIX)).astype(np.uint64)
+
+elegido = np.zeros(len(items), dtype=bool)
+for grp in tqdm(grupos(prefijo, con_pha, min_tam=1), desc="Deduplicando pHash"):
+    pha = items["pha"][grp]
+    libre = np.ones(len(grp), dtype=bool)
+    for i in range(len(grp)):
+        if not libre[i]: continue
+        cl = i + np.flatnonzero(libre[i:] & (hamming(pha[i], pha[i:]) <= PHASH_HAMMING_MAX))
+        libre[cl] = False
+        # mayor calidad = (área, varianza); ante empate el primero
+        c = grp[cl]
+        best = c[np.lexsort((-np.arange(len(c)), var[c], area[c]))[-1]]
+        elegido[best] = True
 
 # añade los que no entraron por hash (raros)
-for it in items:
-    if it["img"] not in visited:
-        pool.append(it); visited.add(it["img"])
+elegido[~items["tiene_pha"]] = True
 
-# dedup final por ruta
-pool = list({it["img"]:it for it in pool}.values())
-pool.sort(key=lambda x: quality_key(x["w"],x["h"],x["var"]), reverse=True)
+pool = np.flatnonzero(elegido)
+pool = pool[np.lexsort((var[pool], area[pool]))[::-1]]
 print("Post-dedup:", len(pool))
 
 # 3) Construir subsets cumulativos
 report_rows=[]
 maxN = len(pool)
 targets = [min(t, maxN) for t in TARGETS]
+if args.modo == "kcenter":
+    # ranking por orden de selección k-center (cada prefijo cubre el espacio de descriptores)
+    stats = np.stack([box_stats(rutas.lbl(i)) for i in tqdm(pool, desc="Descriptores")]) if len(pool) else np.zeros((0, 6), np.float32)
+    X = descriptores(items["pha"][pool], stats, items["bri"][pool])
+    orden = kcenter(X, max(targets, default=0), calidad=-np.arange(len(pool)), peso_calidad=args.peso_calidad)
+    pool = pool[orden]
+    print(f"Selección k-center: {len(pool)} imágenes ordenadas")
 # Garantiza acumulativo: top-N viene del mismo ranking
 for N in targets:
     out_dir = OUT_ROOT/f"train_{N}"
@@ -125,15 +139,16 @@ for N in targets:
 
     subset = pool[:N]
     # copiar
-    for it in tqdm(subset, desc=f"Copiando subset {N}"):
-        shutil.copy2(it["img"], out_dir/"images"/it["img"].name)
-        shutil.copy2(it["lbl"], out_dir/"labels"/it["lbl"].name)
+    for i in tqdm(subset, desc=f"Copiando subset {N}"):
+        img, lbl = rutas.img(i), rutas.lbl(i)
+        shutil.copy2(img, out_dir/"images"/img.name)
+        shutil.copy2(lbl, out_dir/"labels"/lbl.name)
 
     # lista y yaml
     lst = out_dir/f"train_{N}.txt"
     with open(lst, "w", encoding="utf-8") as f:
-        for it in subset:
-            f.write(str((out_dir/"images"/it["img"].name).resolve()).replace("\\","/")+"\n")
+        for i in subset:
+            f.write(str((out_dir/"images"/rutas.nombre(i)).resolve()).replace("\\","/")+"\n")
 
     yaml = f"""path: {str(out_dir.resolve()).replace('\\','/')}
 train: train_{N}.txt
@@ -143,13 +158,13 @@ nc: 1
 names: ["license-plate"]
 """
     (out_dir/f"data_{N}.yaml").write_text(yaml, encoding="utf-8")
-    report_rows.append([N, len(subset)])
+    report_rows.append([N, len(subset), args.modo])
 
 # 4) Reporte simple
 with open(AUDIT/"subsets_series_report.csv","w",newline="",encoding="utf-8") as f:
-    w=csv.writer(f); w.writerow(["N","seleccionados"]); w.writerows(report_rows)
+    w=csv.writer(f); w.writerow(["N","seleccionados","modo"]); w.writerows(report_rows)
 
 print("Listo. Subsets en:", OUT_ROOT)
 print("Reporte:", AUDIT/"subsets_series_report.csv")
 print("Entrena con, por ejemplo:\n  yolo detect train data=\"subsets_series/train_1000/data_1000.yaml\" model=\"yolov8n.pt\" imgsz=640 epochs=50 batch=16 device=0 project=\"runs\" name=\"placas_v8n_N1000\"")
-py -3.13 make_subsets_series.py
+# Uso: py -3.13 make_subsets_series.py [--modo kcenter]
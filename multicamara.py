@@ -0,0 +1,300 @@
+# multicamara.py
+# Planificador multi-cámara con batching entre flujos sobre un único detector ONNX:
+#   - un hilo lector por flujo (cv2.VideoCapture; archivos locales a su FPS nativo para simular cámaras)
+#     deja frames en un buffer acotado por flujo; si el flujo va más rápido que el detector, se descarta
+#     el frame más viejo (drop contado por flujo) -> la latencia no crece sin límite
+#   - el planificador arma batches mezclando flujos: round-robin, o ponderado justo (tiempo virtual tipo
+#     WFQ: cada frame servido avanza el reloj del flujo en 1/peso; se sirve el flujo con menor reloj)
+#   - los resultados vuelven a cada flujo por su callback; estadísticas por flujo: latencia captura->resultado,
+#     procesados/descartados y equidad (índice de Jain sobre la fracción servida / peso)
+# Uso:
+#   python multicamara.py --onnx best.onnx --videos cam1.mp4 cam2.mp4 cam3.mp4 [--modo ponderado --pesos 2 1 1]
+#   python multicamara.py --onnx best.onnx --videos cam1.mp4 --barrido 1 2 4 8 16   # throughput vs nº de flujos
+#   python multicamara.py --onnx best640.onnx --modelos best480.onnx best320.onnx --slo-ms 150 ...  (control_carga.py)
+import argparse, threading, time
+from collections import deque
+import numpy as np
+import cv2
+from inferencia_onnx import Detector, postproceso, CONF, IOU
+from preproceso import Preproceso
+from telemetria import REG, ETAPAS, TAM_BATCH
+from control_carga import ControladorSLO, escalera
+
+BATCH = 8
+BUFFER = 2          # frames en espera por flujo (más = más latencia, menos drops)
+ESPERA_MAX = 0.005  # s que el planificador espera para completar un batch
+UMBRAL_OCR = 0.5    # con OCR diferido, las detecciones bajo este score esperan a que baje la carga
+DIFERIDOS_MAX = 256
+
+class Flujo:
+    """Fuente de frames con buffer acotado. al_resultado(flujo, n_frame, dets, latencia_s) opcional."""
+    def __init__(self, nombre, fuente, peso=1.0, buffer=BUFFER, tiempo_real=True, al_resultado=None, bucle=False):
+        self.nombre, self.fuente, self.peso = nombre, fuente, float(peso)
+        self.buf = deque()
+        self.maxbuf, self.tiempo_real, self.bucle = buffer, tiempo_real, bucle
+        self.al_resultado = al_resultado
+        self.capturados = self.procesados = self.descartados = self.saltados = 0
+        self.latencias = []
+        self.reloj = 0.0                       # tiempo virtual (modo ponderado)
+        self.terminado = False
+        self._lock = threading.Lock()
+        self._hay_lugar = threading.Condition(self._lock)
+        self._drops = REG.contador("placas_descartes_total", "Imágenes descartadas", {"motivo": "buffer", "flujo": nombre})
+        REG.medidor("placas_cola_flujo", "Frames en espera por flujo", {"flujo": nombre}, fuente=lambda: len(self.buf))
+
+    def iniciar(self, parar: threading.Event):
+        self._parar = parar
+        threading.Thread(target=self._leer, daemon=True, name=f"lector-{self.nombre}").start()
+
+    def _leer(self):
+        cap = cv2.VideoCapture(self.fuente)
+        if not cap.isOpened():
+            print(f"[AVISO] {self.nombre}: no se pudo abrir {self.fuente}")
+            self.terminado = True
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        dt, t_sig, n = 1.0/fps, time.perf_counter(), 0
+        desde_inicio = 0                       # frames leídos desde la apertura o el último rebobinado
+        while not self._parar.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                if self.bucle and desde_inicio:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0); desde_inicio = 0; continue
+                if self.bucle:                 # rebobinar no dio ningún frame: sin esto el hilo gira sin fin
+                    print(f"[AVISO] {self.nombre}: {self.fuente} no entrega frames; se deja de leer")
+                break
+            desde_inicio += 1
+            if self.tiempo_real:
+                t_sig += dt
+                espera = t_sig - time.perf_counter()
+                if espera > 0: time.sleep(espera)
+            with self._lock:
+                if len(self.buf) >= self.maxbuf:
+                    if self.tiempo_real:       # cámara en vivo: se pierde el frame más viejo
+                        self.buf.popleft(); self.descartados += 1; self._drops.inc()
+                    else:                      # archivo sin ritmo: se espera lugar (sin pérdidas)
+                        while len(self.buf) >= self.maxbuf and not self._parar.is_set():
+                            self._hay_lugar.wait(0.05)
+                self.buf.append((n, time.perf_counter(), frame))
+                self.capturados += 1
+            n += 1
+        cap.release()
+        self.terminado = True
+
+    def tomar(self):
+        with self._lock:
+            item = self.buf.popleft() if self.buf else None
+            self._hay_lugar.notify()
+        return item
+
+    def entregar(self, n, t_cap, dets):
+        lat = time.perf_counter() - t_cap
+        self.procesados += 1
+        self.latencias.append(lat)
+        ETAPAS["total"].observar(lat)
+        if self.al_resultado:
+            self.al_resultado(self, n, dets, lat)
+        return lat
+
+class Planificador:
+    """
+    plan = Planificador(Detector("best.onnx"), flujos, modo="ponderado", batch=8)
+    plan.correr(segundos=30)     # o plan.correr() hasta que terminen todos los flujos
+    Con control de carga: det = [Detector por imgsz exportado], control = ControladorSLO(...);
+    ocr(frame, det_fila) opcional se llama por detección (diferido en los niveles que lo indiquen).
+    """
+    def __init__(self, det, flujos, modo="rr", batch=BATCH, espera_max=ESPERA_MAX, control=None, ocr=None):
+        assert modo in ("rr", "ponderado")
+        self.flujos, self.modo, self.espera_max = list(flujos), modo, espera_max
+        self.control, self.ocr = control, ocr
+        self.cfg = []                          # por modelo (Nivel.modelo): (Detector, Preproceso, batch fijo?)
+        for d in (det if isinstance(det, (list, tuple)) else [det]):
+            b0 = d.sess.get_inputs()[0].shape[0]
+            fijo = isinstance(b0, int)
+            self.cfg.append((d, Preproceso(d.imgsz, batch=b0 if fijo else batch), fijo))
+        self.diferidos = deque(maxlen=DIFERIDOS_MAX)
+        self._saltos = REG.contador("placas_descartes_total", "Imágenes descartadas", {"motivo": "salto"})
+        self._rr = 0
+        self._v, self._activos = 0.0, set()  # tiempo virtual global (reloj del último servido) y flujos con cola
+        self.batches, self.t_total = 0, 0.0
+
+    def _actual(self):
+        if self.control:
+            return self.cfg[self.control.nivel.modelo]
+        return max(self.cfg, key=lambda c: c[0].imgsz)
+
+    def _elegir(self):
+        """Siguiente flujo con frames, según el modo. None si no hay nada en espera."""
+        listos = [f for f in self.flujos if f.buf]
+        if not listos:
+            return None
+        if self.modo == "ponderado":
+            # un flujo que vuelve de estar vacío no acumula crédito: su reloj se adelanta al tiempo virtual
+            # global (si no, con un reloj viejo acapararía el servicio hasta alcanzar a los demás)
+            activos = set(listos)
+            for f in activos - self._activos:
+                f.reloj = max(f.reloj, self._v)
+            self._activos = activos
+            f = min(listos, key=lambda f: f.reloj)
+            self._v = f.reloj
+            f.reloj += 1.0/f.peso
+            return f
+        n = len(self.flujos)
+        for k in range(n):
+            f = self.flujos[(self._rr + k) % n]
+            if f.buf:
+                self._rr = (self._rr + k + 1) % n
+                return f
+        return None
+
+    def _armar_batch(self, pre):
+        lote, limite = [], time.perf_counter() + self.espera_max
+        salto = self.control.nivel.salto if self.control else 1
+        while len(lote) < len(pre.entrada):
+            f = self._elegir()
+            item = f.tomar() if f else None
+            if item is None:
+                if lote and time.perf_counter() >= limite:
+                    break
+                if all(x.terminado and not x.buf for x in self.flujos):
+                    break
+                time.sleep(0.0005); continue
+            n, t_cap, frame = item
+            if salto > 1 and n % salto:
+                f.saltados += 1; self._saltos.inc()
+                continue
+            t = time.perf_counter()
+            meta = pre(frame, len(lote))
+            ETAPAS["preproceso"].observar(time.perf_counter() - t)
+            lote.append((f, n, t_cap, meta, frame))
+        return lote
+
+    def _ocr(self, frame, dets):
+        """OCR por detección; en niveles con OCR diferido, las de score bajo se encolan para más tarde."""
+        t = time.perf_counter()
+        diferir = self.control is not None and self.control.nivel.diferir_ocr
+        for d in dets:
+            if diferir and d[4] < UMBRAL_OCR:
+                self.diferidos.append((frame, d))
+            else:
+                self.ocr(frame, d)
+        ETAPAS["ocr"].observar(time.perf_counter() - t)
+
+    def _drenar_diferidos(self, n):
+        for _ in range(min(n, len(self.diferidos))):
+            frame, d = self.diferidos.popleft()
+            self.ocr(frame, d)
+
+    def correr(self, segundos=None):
+        parar = threading.Event()
+        for f in self.flujos:
+            f.iniciar(parar)
+        t0 = time.perf_counter()
+        try:
+            while segundos is None or time.perf_counter() - t0 < segundos:
+                det, pre, fijo = self._actual()
+                lote = self._armar_batch(pre)
+                if not lote:
+                    break
+                # batch estático: siempre el buffer completo (los slots sobrantes se ignoran)
+                x = pre.entrada if fijo else pre.entrada[:len(lote)]
+                t = time.perf_counter()
+                pred = det.crudo(x)
+                ETAPAS["inferencia"].observar(time.perf_counter() - t); TAM_BATCH.observar(len(lote))
+                self.batches += 1
+                for i, (f, n, t_cap, meta, frame) in enumerate(lote):
+                    t = time.perf_counter()
+                    dets = postproceso(pred[i], meta, det.conf, det.iou, det.max_det, frame.shape[:2])
+                    ETAPAS["nms"].observar(time.perf_counter() - t)
+                    if self.ocr:
+                        self._ocr(frame, dets)
+                    lat = f.entregar(n, t_cap, dets)
+                    if self.control:
+                        self.control.observar(lat)
+                if self.control:
+                    self.control.revisar()
+                if self.ocr and self.diferidos and not (self.control and self.control.nivel.diferir_ocr):
+                    self._drenar_diferidos(len(lote))
+        finally:
+            parar.set()
+            self.t_total = time.perf_counter() - t0
+
+    def reporte(self):
+        filas = []
+        for f in self.flujos:
+            lat = np.asarray(f.latencias)*1000 if f.latencias else np.zeros(1)
+            filas.append({"flujo": f.nombre, "peso": f.peso, "capturados": f.capturados, "procesados": f.procesados,
+                          "descartados": f.descartados, "saltados": f.saltados, "servido": f.procesados/max(f.capturados, 1),
+                          "fps": f.procesados/max(self.t_total, 1e-9),
+                          "lat_p50_ms": float(np.percentile(lat, 50)), "lat_p95_ms": float(np.percentile(lat, 95))})
+        # Jain sobre throughput normalizado por peso: 1 = reparto exactamente proporcional a los pesos
+        x = np.array([r["procesados"]/r["peso"] for r in filas], float)
+        jain = float(x.sum()**2/(len(x)*(x**2).sum())) if x.any() else 1.0
+        total = sum(r["procesados"] for r in filas)/max(self.t_total, 1e-9)
+        return filas, jain, total
+
+def imprimir(filas, jain, total, batches, t):
+    for r in filas:
+        print(f"  {r['flujo']:10s} peso={r['peso']:.1f}  proc={r['procesados']:5d}/{r['capturados']:5d} "
+              f"({100*r['servido']:5.1f}%)  drops={r['descartados']:4d} saltos={r['saltados']:4d}  {r['fps']:6.1f} fps  "
+              f"lat p50={r['lat_p50_ms']:6.1f}ms p95={r['lat_p95_ms']:6.1f}ms")
+    print(f"  total {total:.1f} fps | batch medio {sum(r['procesados'] for r in filas)/max(batches,1):.2f} | "
+          f"Jain={jain:.3f} | {t:.1f}s")
+
+def main():
+    ap = argparse.ArgumentParser(description="Planificador multi-cámara con batching entre flujos")
+    ap.add_argument("--onnx", required=True)
+    ap.add_argument("--videos", nargs="+", required=True)
+    ap.add_argument("--pesos", type=float, nargs="+", default=None)
+    ap.add_argument("--modo", choices=["rr", "ponderado"], default="rr")
+    ap.add_argument("--batch", type=int, default=BATCH)
+    ap.add_argument("--buffer", type=int, default=BUFFER)
+    ap.add_argument("--segundos", type=float, default=20.0)
+    ap.add_argument("--conf", type=float, default=CONF)
+    ap.add_argument("--iou", type=float, default=IOU)
+    ap.add_argument("--hilos", type=int, default=None)
+    ap.add_argument("--sin-ritmo", action="store_true", help="leer los archivos lo más rápido posible, sin descartar")
+    ap.add_argument("--barrido", type=int, nargs="+", default=None,
+                    help="repetir con N flujos (reciclando --videos) y reportar throughput total por N")
+    ap.add_argument("--metricas", type=int, default=None, metavar="PUERTO")
+    ap.add_argument("--slo-ms", type=float, default=None, help="activar control de carga con este SLO de latencia p95")
+    ap.add_argument("--modelos", nargs="+", default=[], help="el mismo detector exportado a imgsz menores (niveles del control)")
+    ap.add_argument("--imgsz", type=int, nargs="+", default=None,
+                    help="imgsz de --onnx y cada --modelos, en orden (obligatorio si alguno es export dinámico)")
+    ap.add_argument("--ocr-ms", type=float, default=0.0, help="simular un OCR de este costo (CPU) por detección")
+    args = ap.parse_args()
+
+    modelos = [args.onnx] + args.modelos
+    if args.imgsz and len(args.imgsz) != len(modelos):
+        ap.error(f"--imgsz necesita {len(modelos)} valores (uno por modelo)")
+    det = [Detector(m, args.hilos, args.conf, args.iou, imgsz=args.imgsz[i] if args.imgsz else None)
+           for i, m in enumerate(modelos)]
+    dinamicos = [m for m, d in zip(modelos, det) if d.dinamico]
+    if len(det) > 1 and dinamicos and not args.imgsz:
+        ap.error(f"export(s) con entrada dinámica {dinamicos}: indicar el tamaño de cada modelo con --imgsz")
+    if args.metricas:
+        REG.servir(args.metricas)
+    ocr = None
+    if args.ocr_ms:
+        def ocr(frame, d, costo=args.ocr_ms/1000):
+            t = time.perf_counter()
+            while time.perf_counter() - t < costo:
+                pass
+
+    def flujos(n):
+        pesos = args.pesos or [1.0]*len(args.videos)
+        return [Flujo(f"cam{i}", args.videos[i % len(args.videos)], pesos[i % len(pesos)], args.buffer,
+                      not args.sin_ritmo, bucle=True) for i in range(n)]
+
+    for n in (args.barrido or [len(args.videos)]):
+        ctl = ControladorSLO(args.slo_ms, escalera([d.imgsz for d in det])) if args.slo_ms else None
+        plan = Planificador(det, flujos(n), args.modo, args.batch, control=ctl, ocr=ocr)
+        plan.correr(args.segundos)
+        filas, jain, total = plan.reporte()
+        print(f"[{n} flujo(s), modo {args.modo}]")
+        imprimir(filas, jain, total, plan.batches, plan.t_total)
+        if ctl:
+            print(f"  control: {len(ctl.cambios)} cambio(s) de nivel, nivel final {ctl.i} {tuple(ctl.nivel)} (log: {ctl.log})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# podar_canales.py
+# Poda estructurada de canales del detector entrenado, a varios niveles de esparsidad:
+#   1) C2f -> C2f_v2: el split (chunk) de C2f no lo sigue el grafo de dependencias de torch-pruning;
+#      se parte su cv1 en dos convoluciones 1x1 con los mismos pesos (salida idéntica, podable por rama)
+#   2) poda por norma L2 de los filtros (MetaPruner), canales redondeados a múltiplos de 8 para que los
+#      kernels de CPU no queden con bloques a medias; la cabeza Detect no se poda
+#   3) fine-tune corto con el setup de CPU de run_series_train.py sobre subsets_series/train_<N>
+#   4) export ONNX + latencia con scripts/bench_onnx_cpu.py (bench_modelos.py)
+# Resultado: audit_out/poda_canales.csv (exactitud vs latencia; la fila 0.0 es el modelo sin podar).
+# Requiere: pip install torch-pruning>=1.3
+# Uso:
+#   python podar_canales.py --pesos runs/detect/placas_v8n_N2514/weights/best.pt [--N 500 --esparsidad 0.2 0.35 0.5 --epochs 10]
+# Los best.pt podados guardan el módulo completo (con C2f_v2): cargarlos desde Python con este directorio
+# en el path; para desplegar se usa el ONNX.
+from pathlib import Path
+import argparse, copy, csv
+import torch
+import torch.nn as nn
+from ultralytics import YOLO
+from ultralytics.nn.modules import C2f, Conv, Detect
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils.torch_utils import get_flops
+from run_series_train import NS, IMGSZ, DEVICE, BATCH, PROJECT, BASE
+from bench_modelos import exportar_onnx, medir_onnx, validar
+
+ESPARSIDADES = [0.2, 0.35, 0.5]   # fracción de canales a quitar por capa
+EPOCHS_FT = 10
+REDONDEO = 8
+NAME_PREFIX = "placas_poda_s"     # quedará placas_poda_s035, etc.
+OUT_CSV = BASE/"audit_out"/"poda_canales.csv"
+
+class C2f_v2(nn.Module):
+    """C2f con cv1 partido en cv0/cv1 (sin chunk). Se construye desde un C2f ya entrenado."""
+    def __init__(self, c2f: C2f):
+        super().__init__()
+        self.c = c = c2f.c
+        c1 = c2f.cv1.conv.in_channels
+        self.cv0, self.cv1 = Conv(c1, c, 1, 1), Conv(c1, c, 1, 1)
+        for k, dst in enumerate((self.cv0, self.cv1)):
+            sl = slice(k*c, (k + 1)*c)
+            dst.act = c2f.cv1.act
+            dst.conv.weight.data.copy_(c2f.cv1.conv.weight.data[sl])
+            for n in ("weight", "bias", "running_mean", "running_var"):
+                getattr(dst.bn, n).data.copy_(getattr(c2f.cv1.bn, n).data[sl])
+            dst.bn.eps, dst.bn.momentum = c2f.cv1.bn.eps, c2f.cv1.bn.momentum
+        self.cv2, self.m = c2f.cv2, c2f.m
+        for a in ("i", "f", "type", "np"):       # atributos que usa DetectionModel al recorrer las capas
+            if hasattr(c2f, a): setattr(self, a, getattr(c2f, a))
+
+    def forward(self, x):
+        y = [self.cv0(x), self.cv1(x)]
+        y.extend(m(y[-1]) for m in self.m)
+        return self.cv2(torch.cat(y, 1))
+
+def reemplazar_c2f(mod):
+    for nombre, hijo in mod.named_children():
+        if type(hijo) is C2f:
+            setattr(mod, nombre, C2f_v2(hijo))
+        else:
+            reemplazar_c2f(hijo)
+
+def contar(modelo, imgsz):
+    """(millones de parámetros, GFLOPs a imgsz; 0 si falta thop)."""
+    return sum(p.numel() for p in modelo.parameters())/1e6, get_flops(modelo, imgsz)
+
+def podar(modelo, esparsidad, imgsz=IMGSZ):
+    import torch_pruning as tp
+    modelo = copy.deepcopy(modelo).float().eval()   # el checkpoint viene en half
+    reemplazar_c2f(modelo)
+    for p in modelo.parameters():
+        p.requires_grad_(True)
+    pr = tp.pruner.MetaPruner(modelo, torch.randn(1, 3, imgsz, imgsz),
+                              importance=tp.importance.MagnitudeImportance(p=2),
+                              pruning_ratio=esparsidad, round_to=REDONDEO,
+                              ignored_layers=[m for m in modelo.modules() if isinstance(m, Detect)])
+    pr.step()
+    return modelo
+
+def afinar(modelo, pesos, data_yaml, nombre, epochs, imgsz=IMGSZ):
+    """Fine-tune con el trainer de Ultralytics sobre el modelo ya podado (no se reconstruye desde el yaml)."""
+    tr = DetectionTrainer(overrides=dict(model=str(pesos), data=str(data_yaml), epochs=epochs, imgsz=imgsz,
+                                         batch=BATCH, device=DEVICE, project=PROJECT, name=nombre,
+                                         exist_ok=True, plots=False))
+    tr.model = modelo           # setup_model() no toca un nn.Module ya asignado
+    tr.train()
+    return Path(tr.best)
+
+def fila(esp, pesos, modelo, data_yaml, imgsz):
+    params, gflops = contar(modelo, imgsz)
+    m50, m5095 = validar(pesos, data_yaml, imgsz, BATCH, DEVICE)
+    onnx = exportar_onnx(pesos, imgsz)
+    lat = medir_onnx(onnx, imgsz) or {"fps": float("nan"), "p95_ms": float("nan")}
+    r = {"esparsidad": esp, "params_M": round(params, 3), "GFLOPs": round(gflops, 2), "mAP50": m50, "mAP50_95": m5095,
+         **lat, "pesos": str(pesos), "onnx": str(onnx)}
+    print(f"[s={esp:.2f}] {r['params_M']}M params | {r['GFLOPs']} GFLOPs | mAP50 {m50:.3f} | "
+          f"mAP50-95 {m5095:.3f} | {lat['fps']:.1f} FPS | p95 {lat['p95_ms']:.1f} ms")
+    return r
+
+def main():
+    ap = argparse.ArgumentParser(description="Poda estructurada de canales + fine-tune + ONNX + benchmark CPU")
+    ap.add_argument("--pesos", type=Path, required=True, help="best.pt del detector entrenado")
+    ap.add_argument("--N", type=int, default=NS[0], help="subset de subsets_series para el fine-tune")
+    ap.add_argument("--esparsidad", type=float, nargs="+", default=ESPARSIDADES)
+    ap.add_argument("--epochs", type=int, default=EPOCHS_FT)
+    ap.add_argument("--imgsz", type=int, default=IMGSZ)
+    args = ap.parse_args()
+
+    data_yaml = BASE/"subsets_series"/f"train_{args.N}"/f"data_{args.N}.yaml"
+    if not data_yaml.exists():
+        raise SystemExit(f"[ERROR] No existe {data_yaml}. ¿Ya generaste subsets_series para N={args.N}?")
+
+    base = YOLO(str(args.pesos)).model
+    filas = [fila(0.0, args.pesos, base, data_yaml, args.imgsz)]
+    for esp in args.esparsidad:
+        podado = podar(base, esp, args.imgsz)
+        best = afinar(podado, args.pesos, data_yaml, f"{NAME_PREFIX}{round(esp*100):03d}", args.epochs, args.imgsz)
+        filas.append(fila(esp, best, YOLO(str(best)).model, data_yaml, args.imgsz))
+
+    ref = filas[0]
+    for r in filas:
+        r["speedup"] = round(r["fps"]/ref["fps"], 2) if ref["fps"] == ref["fps"] else float("nan")
+        r["delta_mAP50"] = round(r["mAP50"] - ref["mAP50"], 4)
+    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(filas[0]))
+        w.writeheader(); w.writerows(filas)
+
+    print(f"\n{'esparsidad':>10} {'GFLOPs':>7} {'mAP50':>6} {'ΔmAP50':>7} {'FPS':>7} {'p95 ms':>7} {'speedup':>7}")
+    for r in filas:
+        print(f"{r['esparsidad']:>10.2f} {r['GFLOPs']:>7.2f} {r['mAP50']:>6.3f} {r['delta_mAP50']:>+7.3f} "
+              f"{r['fps']:>7.1f} {r['p95_ms']:>7.1f} {r['speedup']:>6.2f}x")
+    print("Tabla:", OUT_CSV)
+
+if __name__ == "__main__":
+    # se corre desde el módulo importado (no __main__) para que los .pt guardados referencien
+    # podar_canales.C2f_v2 y se puedan cargar desde otros scripts
+    import podar_canales
+    podar_canales.main()
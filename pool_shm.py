@@ -0,0 +1,166 @@
+# pool_shm.py
+# Pool multi-proceso de inferencia ONNX con entrega de frames sin copia:
+#   - los decodificadores (hilos del proceso principal) escriben el tensor preprocesado en un
+#     anillo de slots de multiprocessing.shared_memory
+#   - cada worker carga el modelo una sola vez y lee su slot in-place (io_binding, sin pickle del frame)
+#   - por las colas solo viajan descriptores pequeños: (slot, job, meta) y (job, detecciones)
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import os, queue, threading, time
+import numpy as np
+import cv2
+from inferencia_onnx import Detector, postproceso, CONF, IOU, IMGSZ
+from preproceso import Preproceso
+from telemetria import REG, ETAPAS
+
+def _worker(onnx_path, shm_name, shape, hilos, conf, iou, tareas, resultados, libres):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    det = Detector(onnx_path, hilos, conf, iou)
+    try:
+        while True:
+            t = tareas.get()
+            if t is None:
+                break
+            slot, job, meta, forma = t
+            t0 = time.perf_counter()
+            pred = det.crudo_sin_copia(buf[slot:slot+1])
+            libres.put(slot)  # el slot se libera apenas termina la inferencia
+            t1 = time.perf_counter()
+            dets = postproceso(pred[0], meta, det.conf, det.iou, det.max_det, forma)
+            # tiempos medidos en el worker; el registro de métricas vive en el proceso principal
+            resultados.put((job, dets, t1 - t0, time.perf_counter() - t1, os.getpid()))
+    finally:
+        del buf
+        shm.close()
+
+class PoolInferencia:
+    """
+    with PoolInferencia("best.onnx", workers=4) as pool:
+        for ruta, dets in pool.mapa(rutas): ...
+    """
+    def __init__(self, onnx_path, workers=2, slots=None, imgsz=IMGSZ, hilos_por_worker=1,
+                 decoders=2, conf=CONF, iou=IOU):
+        self.workers, self.decoders, self.imgsz = workers, decoders, imgsz
+        n_slots = slots or 2*workers + decoders
+        self.shape = (n_slots, 3, imgsz, imgsz)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape))*4)
+        self.buf = np.ndarray(self.shape, dtype=np.float32, buffer=self.shm.buf)
+        self.pre = Preproceso(imgsz, dst=self.buf)  # letterbox directo sobre el slot compartido
+        ctx = mp.get_context("spawn")
+        self.tareas, self.resultados, self.libres = ctx.Queue(), ctx.Queue(), ctx.Queue()
+        for s in range(n_slots):
+            self.libres.put(s)
+        self.procs = [ctx.Process(target=_worker, daemon=True,
+                                  args=(str(onnx_path), self.shm.name, self.shape, hilos_por_worker, conf, iou,
+                                        self.tareas, self.resultados, self.libres))
+                      for _ in range(workers)]
+        for p in self.procs:
+            p.start()
+        self.t_inferencia = []
+        self._siguiente = 0   # ids de job únicos entre llamadas a mapa (los resultados viejos no se confunden)
+        REG.medidor("placas_pool_tareas", "Frames encolados esperando worker", fuente=self.tareas.qsize)
+        REG.medidor("placas_pool_slots_libres", "Slots libres del anillo compartido", fuente=self.libres.qsize)
+
+    def enviar(self, job, bgr, parar=None):
+        """Toma un slot libre (bloquea si el anillo está lleno), escribe el tensor y encola el descriptor.
+        Con `parar` (threading.Event) deja de esperar slot cuando se activa y devuelve False."""
+        while True:
+            try:
+                slot = self.libres.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if parar is not None and parar.is_set():
+                    return False
+        t0 = time.perf_counter()
+        meta = self.pre(bgr, slot)
+        ETAPAS["preproceso"].observar(time.perf_counter() - t0)
+        self.tareas.put((slot, job, meta, bgr.shape[:2]))
+        return True
+
+    def _revisar_workers(self):
+        """Un worker muerto (p. ej. el modelo no cargó) nunca va a responder: mejor fallar que esperar."""
+        for p in self.procs:
+            if not p.is_alive():
+                raise RuntimeError(f"Worker de inferencia {p.pid} terminó (exitcode={p.exitcode})")
+
+    def _drenar(self):
+        while True:
+            try:
+                self.resultados.get_nowait()
+            except queue.Empty:
+                return
+
+    def mapa(self, rutas, leer=None):
+        """Procesa rutas (o cualquier iterable) y produce (item, dets) en orden de llegada. dets=None si no se pudo leer."""
+        leer = leer or (lambda r: cv2.imread(str(r), cv2.IMREAD_COLOR))
+        base = self._siguiente
+        it = iter(enumerate(rutas, base))
+        lock = threading.Lock()
+        parar = threading.Event()
+        pend, enviados, fallidos = {}, [0], queue.Queue()
+        descartes = REG.contador("placas_descartes_total", "Imágenes descartadas", {"motivo": "decode"})
+
+        def decoder():
+            while not parar.is_set():
+                with lock:
+                    nxt = next(it, None)
+                    if nxt is None: return
+                    job, item = nxt
+                    pend[job] = item
+                    enviados[0] += 1
+                t0 = time.perf_counter()
+                img = leer(item)
+                ETAPAS["decode"].observar(time.perf_counter() - t0)
+                if img is None:
+                    descartes.inc()
+                    fallidos.put(job)
+                else:
+                    self.enviar(job, img, parar)
+
+        recibidos = 0
+        ex = ThreadPoolExecutor(self.decoders)
+        futs = [ex.submit(decoder) for _ in range(self.decoders)]
+        try:
+            while True:
+                while not fallidos.empty():
+                    job = fallidos.get(); recibidos += 1
+                    yield pend.pop(job), None
+                terminado = all(f.done() for f in futs)
+                if terminado and recibidos == enviados[0] and fallidos.empty():
+                    break
+                try:
+                    job, dets, dt, dt_nms, _ = self.resultados.get(timeout=0.05)
+                except queue.Empty:
+                    self._revisar_workers()
+                    for f in futs:
+                        if f.done() and f.exception(): raise f.exception()
+                    continue
+                item = pend.pop(job, None)
+                if item is None:
+                    continue    # de una llamada anterior que se cortó antes de recibirlo
+                recibidos += 1
+                self.t_inferencia.append(dt)
+                ETAPAS["inferencia"].observar(dt); ETAPAS["nms"].observar(dt_nms)
+                yield item, dets
+            for f in futs:
+                f.result()  # propaga excepciones de los decoders
+        finally:
+            # corte temprano (break del consumidor, error o worker caído): frenar decoders y descartar lo pendiente
+            parar.set()
+            ex.shutdown(wait=True)
+            self._siguiente = base + enviados[0]
+            self._drenar()
+
+    def cerrar(self):
+        for _ in self.procs:
+            self.tareas.put(None)
+        for p in self.procs:
+            p.join(timeout=10)
+        del self.buf, self.pre
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.cerrar()
@@ -0,0 +1,59 @@
+# preproceso.py
+# Letterbox fusionado sobre buffers preasignados para la entrada del detector.
+# En vez de canvas nuevo + copia + ::-1 + transpose + astype + /255 (varios temporales de frame completo):
+#   1) cv2.resize(..., dst=) sobre un buffer uint8 reutilizado del tamaño escalado
+#   2) una pasada por canal: BGR->RGB, uint8->float32 *1/255 y HWC->CHW escribiendo directo en la
+#      región útil del buffer de entrada (B,3,S,S)
+#   3) el relleno (114/255) solo se reescribe cuando cambia la geometría de ese slot
+import threading
+import numpy as np
+import cv2
+from inferencia_onnx import IMGSZ, PAD_VALOR
+
+ESCALA = np.float32(1/255)
+
+def geometria(h, w, imgsz):
+    r = min(imgsz/h, imgsz/w)
+    nw, nh = int(round(w*r)), int(round(h*r))
+    return r, nw, nh, (imgsz - nw)//2, (imgsz - nh)//2
+
+class Preproceso:
+    """
+    pre = Preproceso(640, batch=8)            # o dst=<array (B,3,S,S) float32 existente, p.ej. memoria compartida>
+    meta = pre(bgr, i)                        # escribe en pre.entrada[i]; meta = (r, padx, pady)
+    Seguro entre hilos mientras cada hilo escriba slots distintos.
+    """
+    def __init__(self, imgsz=IMGSZ, batch=1, dst=None):
+        self.imgsz = imgsz
+        self.entrada = dst if dst is not None else np.empty((batch, 3, imgsz, imgsz), dtype=np.float32)
+        assert self.entrada.dtype == np.float32 and self.entrada.shape[1:] == (3, imgsz, imgsz)
+        self._geo = [None]*len(self.entrada)
+        self._local = threading.local()
+
+    def _tmp(self, nh, nw):
+        """Buffer uint8 contiguo (nh,nw,3) por hilo, reutilizado mientras la resolución de entrada se repita."""
+        cache = getattr(self._local, "cache", None)
+        if cache is None:
+            cache = self._local.cache = {}
+        t = cache.get((nh, nw))
+        if t is None:
+            if len(cache) >= 8: cache.clear()
+            t = cache[(nh, nw)] = np.empty((nh, nw, 3), dtype=np.uint8)
+        return t
+
+    def __call__(self, bgr, i=0):
+        h, w = bgr.shape[:2]
+        r, nw, nh, padx, pady = geo = geometria(h, w, self.imgsz)
+        x = self.entrada[i]
+        if self._geo[i] != geo:
+            x.fill(PAD_VALOR/255.0)
+            self._geo[i] = geo
+        if (nw, nh) == (w, h):
+            src = bgr
+        else:
+            src = self._tmp(nh, nw)
+            cv2.resize(bgr, (nw, nh), dst=src, interpolation=cv2.INTER_LINEAR)
+        roi = x[:, pady:pady+nh, padx:padx+nw]
+        for c in range(3):
+            np.multiply(src[..., 2 - c], ESCALA, out=roi[c], casting="unsafe")
+        return (r, padx, pady)
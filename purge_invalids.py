@@ -1,5 +1,6 @@
 from pathlib import Path
-import csv, shutil
+import csv
+from cuarentena import Cuarentena
 
 ROOT = Path(".")
 CSV_PATH = ROOT / "audit_out" / "baseline_labels_invalidos.csv"
@@ -13,6 +14,7 @@ def main():
 
     moved_imgs = moved_lbls = 0
     TRASH.mkdir(exist_ok=True)
+    plan = Cuarentena()
 
     with open(CSV_PATH, newline="", encoding="utf-8") as f:
         r = csv.DictReader(f)
@@ -25,22 +27,17 @@ def main():
             img = ROOT / split / "images" / img_name
             lbl = ROOT / split / "labels" / lbl_name if lbl_name and lbl_name != "N/A" else None
 
-            # rutas destino (papelera)
-            (TRASH / split / "images").mkdir(parents=True, exist_ok=True)
-            (TRASH / split / "labels").mkdir(parents=True, exist_ok=True)
-
-            # mover imagen
-            if img.exists():
-                shutil.move(str(img), str(TRASH / split / "images" / img.name))
+            # planificar (se mueve todo junto al final, por lotes)
+            if img.exists() and plan.agregar(img, TRASH / split / "images"):
                 moved_imgs += 1
-            # mover label (si existe)
-            if lbl and lbl.exists():
-                shutil.move(str(lbl), str(TRASH / split / "labels" / lbl.name))
+            if lbl and lbl.exists() and plan.agregar(lbl, TRASH / split / "labels"):
                 moved_lbls += 1
 
+    plan.ejecutar()
     print(f"Movidas a papelera: {moved_imgs} imágenes y {moved_lbls} labels.")
     print("Papelera en:", TRASH)
-    print("Si quieres revertir, solo vuelve a mover los archivos a train/valid/test.")
+    if plan.movidos:
+        print(f"Diario: {plan.journal}. Para revertir: python cuarentena.py undo {plan.journal}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+# recortes_lpr.py
+# Extracción de recortes de placa para entrenar el LPR/OCR (CTC, ver docs/ACTIVATIONS.md):
+# cada imagen se decodifica una sola vez, se cortan todas sus cajas válidas del label YOLO
+# (line_to_bbox de sanitize_labels_detect: polígono->caja, rangos y MIN_BOX_AREA), con padding
+# y reescaladas a alto fijo. Los recortes se empaquetan por split en un único archivo para lectura
+# secuencial con np.memmap:
+#   <split>.bin          píxeles uint8 (ALTO, ancho_i, C) concatenados
+#   <split>.idx.npy      índice (REC_DTYPE): offset/forma del recorte + imagen fuente + caja de origen
+#   <split>.fuentes.txt  rutas de las imágenes fuente (relativas a --root), una por línea = src_id
+# Uso:
+#   python recortes_lpr.py pack --root . --out lpr_crops [--alto 32 --pad 0.1 --gris]
+#   python recortes_lpr.py info --dir lpr_crops
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse, os
+import numpy as np
+import cv2
+from tqdm import tqdm
+from sanitize_labels_detect import line_to_bbox
+
+SPLITS = ["train", "valid", "test"]
+IMG_EXTS = {".jpg",".jpeg",".png",".bmp",".webp"}
+ALTO = 32          # alto fijo de entrada del OCR
+ANCHO_MAX = 256    # tope de ancho tras reescalar (placas muy alargadas o cajas mal anotadas)
+PAD = 0.10         # padding por lado, fracción del ancho/alto de la caja
+WORKERS = os.cpu_count() or 1
+
+REC_DTYPE = np.dtype([
+    ("off", "u8"), ("alto", "u2"), ("ancho", "u2"), ("canales", "u1"),
+    ("src", "u4"), ("caja", "u2"), ("cls", "u2"),
+    ("x1", "f4"), ("y1", "f4"), ("x2", "f4"), ("y2", "f4"),   # región recortada (con padding), normalizada
+])
+
+def cajas_validas(lbl: Path):
+    """(cajas, inválidas): cajas (i, cls, cx, cy, w, h) que pasan line_to_bbox y tienen clase entera (cabe en u2);
+    i = número de línea en el label. Las líneas no vacías que no pasan se cuentan en `inválidas`."""
+    if not lbl.exists():
+        return [], 0
+    out, malas = [], 0
+    for i, ln in enumerate(lbl.read_text(encoding="utf-8", errors="ignore").splitlines()):
+        parts = ln.split()
+        if not parts:
+            continue
+        b = line_to_bbox(parts)          # ignora la clase (la fuerza a 0): se valida aparte
+        try:
+            cls = int(float(parts[0]))
+        except (ValueError, OverflowError):
+            cls = -1
+        if b is None or not 0 <= cls <= 0xFFFF:
+            malas += 1
+            continue
+        out.append((i, cls, *b[1:]))
+    return out, malas
+
+def recortar(img, cajas, alto=ALTO, pad=PAD, ancho_max=ANCHO_MAX, gris=False):
+    """Imagen ya decodificada + cajas -> [(caja_i, cls, (x1,y1,x2,y2) norm, recorte uint8 (alto, ancho, C))]."""
+    H, W = img.shape[:2]
+    if gris:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    out = []
+    for i, cls, cx, cy, w, h in cajas:
+        x1, y1 = max(0.0, cx - w/2 - pad*w), max(0.0, cy - h/2 - pad*h)
+        x2, y2 = min(1.0, cx + w/2 + pad*w), min(1.0, cy + h/2 + pad*h)
+        a, b, c, d = int(x1*W), int(y1*H), int(np.ceil(x2*W)), int(np.ceil(y2*H))
+        if c - a < 2 or d - b < 2:
+            continue
+        roi = img[b:d, a:c]
+        ancho = int(min(ancho_max, max(1, round((c - a)*alto/(d - b)))))
+        interp = cv2.INTER_AREA if d - b > alto else cv2.INTER_LINEAR
+        rec = cv2.resize(roi, (ancho, alto), interpolation=interp)
+        out.append((i, cls, (x1, y1, x2, y2), rec))
+    return out
+
+def _lote(args):
+    """Worker: lista de (src_id, img, lbl) -> ([(src_id, caja_i, cls, región, recorte)], líneas inválidas)."""
+    items, alto, pad, ancho_max, gris = args
+    out, malas = [], 0
+    for src, img_p, lbl_p in items:
+        cajas, m = cajas_validas(Path(lbl_p))
+        malas += m
+        if not cajas:
+            continue
+        img = cv2.imread(img_p, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        out += [(src, *r) for r in recortar(img, cajas, alto, pad, ancho_max, gris)]
+    return out, malas
+
+def pack_split(root: Path, split: str, out: Path, alto=ALTO, pad=PAD, ancho_max=ANCHO_MAX, gris=False,
+               workers=WORKERS, chunk=64):
+    img_dir, lbl_dir = root/split/"images", root/split/"labels"
+    if not img_dir.exists():
+        print(f"[AVISO] No existe {img_dir}")
+        return 0
+    imgs = sorted(p for p in img_dir.iterdir() if p.suffix.lower() in IMG_EXTS)
+    items = [(k, str(p), str(lbl_dir/(p.stem + ".txt"))) for k, p in enumerate(imgs)]
+    tareas = [(items[i:i+chunk], alto, pad, ancho_max, gris) for i in range(0, len(items), chunk)]
+    (out/f"{split}.fuentes.txt").write_text("\n".join(p.relative_to(root).as_posix() for p in imgs) + "\n", encoding="utf-8")
+
+    idx, off, malas = [], 0, 0
+    # ex.map conserva el orden de los lotes: el archivo queda determinista y ordenado por imagen fuente
+    with open(out/f"{split}.bin", "wb") as f, ProcessPoolExecutor(max_workers=workers) as ex:
+        for res, m in tqdm(ex.map(_lote, tareas), total=len(tareas), desc=f"recortando {split}"):
+            malas += m
+            for src, caja, cls, (x1, y1, x2, y2), rec in res:
+                f.write(rec.tobytes())
+                idx.append((off, rec.shape[0], rec.shape[1], 1 if rec.ndim == 2 else rec.shape[2], src, caja, cls, x1, y1, x2, y2))
+                off += rec.nbytes
+    np.save(out/f"{split}.idx.npy", np.array(idx, dtype=REC_DTYPE))
+    print(f"[OK] {split}: {len(idx)} recortes de {len(imgs)} imágenes | {off/2**20:.1f} MB | {malas} líneas de label inválidas")
+    return len(idx)
+
+class RecortesLPR:
+    """
+    r = RecortesLPR("lpr_crops", "train")
+    rec = r[i]                 # (alto, ancho, C) uint8, vista del memmap
+    ruta, caja = r.fuente(i)   # imagen de origen y nº de línea en su label
+    for i, rec in r: ...       # lectura secuencial
+    """
+    def __init__(self, carpeta, split):
+        d = Path(carpeta)
+        self.idx = np.load(d/f"{split}.idx.npy")
+        self.fuentes = (d/f"{split}.fuentes.txt").read_text(encoding="utf-8").splitlines()
+        tam = (d/f"{split}.bin").stat().st_size
+        self.datos = np.memmap(d/f"{split}.bin", dtype=np.uint8, mode="r") if tam else np.zeros(0, np.uint8)
+
+    def __len__(self): return len(self.idx)
+
+    def __getitem__(self, i):
+        r = self.idx[i]
+        h, w, c = int(r["alto"]), int(r["ancho"]), int(r["canales"])
+        a = self.datos[int(r["off"]):int(r["off"]) + h*w*c]
+        return a.reshape(h, w, c) if c > 1 else a.reshape(h, w)
+
+    def fuente(self, i):
+        r = self.idx[i]
+        return self.fuentes[int(r["src"])], int(r["caja"])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield i, self[i]
+
+def main():
+    ap = argparse.ArgumentParser(description="Recortes de placa empaquetados para entrenar el OCR")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("pack")
+    a.add_argument("--root", type=Path, default=Path("."))
+    a.add_argument("--out", type=Path, default=Path("lpr_crops"))
+    a.add_argument("--splits", nargs="+", default=SPLITS)
+    a.add_argument("--alto", type=int, default=ALTO)
+    a.add_argument("--pad", type=float, default=PAD)
+    a.add_argument("--ancho-max", type=int, default=ANCHO_MAX)
+    a.add_argument("--gris", action="store_true", help="recortes en escala de grises (1 canal)")
+    a.add_argument("--workers", type=int, default=WORKERS)
+    b = sub.add_parser("info")
+    b.add_argument("--dir", type=Path, default=Path("lpr_crops"))
+    b.add_argument("--splits", nargs="+", default=SPLITS)
+    args = ap.parse_args()
+
+    if args.cmd == "pack":
+        args.out.mkdir(parents=True, exist_ok=True)
+        for s in args.splits:
+            pack_split(args.root, s, args.out, args.alto, args.pad, args.ancho_max, args.gris, args.workers)
+    else:
+        for s in args.splits:
+            if not (args.dir/f"{s}.idx.npy").exists():
+                continue
+            r = RecortesLPR(args.dir, s)
+            an = r.idx["ancho"]
+            if not len(r):
+                print(f"{s}: 0 recortes"); continue
+            print(f"{s}: {len(r)} recortes | alto {r.idx['alto'][0]} x {r.idx['canales'][0]} canal(es) | ancho medio {an.mean():.0f} "
+                  f"(min {an.min()}, max {an.max()}) | {len(r.fuentes)} imágenes fuente")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# registros.py
+# Almacén columnar compacto para los escaneos del dataset.
+# En vez de un dict por imagen (Path + floats ~ KB) se guarda:
+#   - un array estructurado de NumPy (una fila de ~30 bytes por imagen)
+#   - una tabla de rutas internada: directorios únicos + nombres en un blob de bytes
+# Las etapas trabajan con arrays de índices sobre estas columnas.
+from pathlib import Path
+from array import array
+import numpy as np
+
+# Campos por imagen que usan make_subsets_series.py (y limpieza_etapas.py, extendidos abajo)
+SCAN_DTYPE = np.dtype([
+    ("split", "u1"),       # índice en SPLITS
+    ("vivo", "?"),         # False cuando ya se movió a cuarentena
+    ("w", "u4"), ("h", "u4"),
+    ("var", "f4"),         # varianza del Laplaciano
+    ("bri", "f4"),         # brillo medio (canal V)
+    ("pha", "u8"),         # pHash 64 bits como entero
+    ("tiene_pha", "?"),
+])
+
+# limpieza_etapas.py agrega lo que se calcula al escanear y viaja en los resultados por shard (--shard i/N)
+LIMPIEZA_DTYPE = np.dtype(SCAN_DTYPE.descr + [
+    ("sha", "S20"),        # SHA1 binario de los bytes del archivo
+    ("lbl", "u1"),         # estado del label: 0 = sin calcular, 1 = ok, 2 = bad_label, 3 = tiny_box
+])
+
+class TablaRutas:
+    """Rutas de imagen internadas: dirs únicos + nombres concatenados en un blob."""
+    def __init__(self):
+        self.dirs = []
+        self._dir_idx = {}
+        self._dir_de = array("H")
+        self._blob = bytearray()
+        self._off = array("q", [0])
+
+    def dir_id(self, d: Path):
+        d = Path(d)
+        if d not in self._dir_idx:
+            self._dir_idx[d] = len(self.dirs)
+            self.dirs.append(d)
+        return self._dir_idx[d]
+
+    def agregar(self, dir_id: int, nombre: str):
+        self._blob += nombre.encode("utf-8")
+        self._off.append(len(self._blob))
+        self._dir_de.append(dir_id)
+        return len(self._dir_de) - 1
+
+    def __len__(self): return len(self._dir_de)
+
+    def nombre(self, i):
+        i = int(i)
+        return self._blob[self._off[i]:self._off[i+1]].decode("utf-8")
+
+    def img(self, i):
+        return self.dirs[self._dir_de[int(i)]]/self.nombre(i)
+
+    def lbl(self, i):
+        return self.dirs[self._dir_de[int(i)]].parent/"labels"/(Path(self.nombre(i)).stem + ".txt")
+
+    def nbytes(self):
+        return len(self._blob) + self._off.itemsize*len(self._off) + self._dir_de.itemsize*len(self._dir_de)
+
+def construir(filas, dtype=SCAN_DTYPE, bloque=1<<16):
+    """Consume un iterable de tuplas (en el orden de dtype) y devuelve el array estructurado."""
+    arr = np.zeros(bloque, dtype=dtype)
+    n = 0
+    for fila in filas:
+        if n == len(arr):
+            nuevo = np.zeros(2*len(arr), dtype=dtype)
+            nuevo[:n] = arr
+            arr = nuevo
+        arr[n] = fila
+        n += 1
+    return arr[:n].copy()
+
+def phash_int(h):
+    """imagehash.ImageHash -> (entero 64 bits, ok)."""
+    if h is None: return 0, False
+    return int(str(h), 16), True
+
+_POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def hamming(a, b):
+    """Distancia de Hamming vectorizada entre pHash de 64 bits (uint64)."""
+    x = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.int32)
+    x = np.atleast_1d(x)
+    return _POP8[x.view(np.uint8).reshape(x.shape + (8,))].sum(axis=-1, dtype=np.int32)
+
+def grupos(claves, idx=None, min_tam=2):
+    """Agrupa índices por clave igual. Devuelve lista de arrays de índices (orden estable)."""
+    claves = np.asarray(claves)
+    idx = np.arange(len(claves)) if idx is None else np.asarray(idx)
+    if len(claves) == 0: return []
+    orden = np.argsort(claves, kind="stable")
+    cs = claves[orden]
+    cortes = np.flatnonzero(cs[1:] != cs[:-1]) + 1
+    out = []
+    for g in np.split(orden, cortes):
+        if len(g) >= min_tam:
+            out.append(idx[g])
+    return out
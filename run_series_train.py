@@ -1,5 +1,5 @@
 # run_series_train.py
-import subprocess, sys
+import csv, subprocess, sys
 from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -7,6 +7,8 @@ from datetime import datetime
 
 # ==================== CONFIG ====================
 NS = [500, 1000, 1500, 2000, 2514]   # tamaños de train a correr
+NS_AUTO = False                      # True: antes de cada N se consulta curva_aprendizaje.py y se saltan
+                                     # los N cuya mejora prevista no justifica la corrida
 MODEL = "yolov8n.pt"
 IMGSZ = 640
 EPOCHS = 50
@@ -18,6 +20,11 @@ BATCH  = 8
 PROJECT = "runs"
 NAME_PREFIX = "placas_v8n_N"  # quedará placas_v8n_N0500, etc.
 
+# Costo de despliegue por corrida: best.pt -> ONNX por cada imgsz (+ INT8 opcional), validado y medido en CPU
+EXPORT_IMGSZ = [IMGSZ]        # [] = no exportar; p. ej. [640, 480, 320]
+EXPORT_INT8 = False           # además, INT8 estático calibrado con imágenes del subset
+BENCH_CSV = "bench_onnx.csv"  # en la carpeta de la corrida; lo lee agrega_resultados.py
+
 BASE = Path(".")
 PLOTS_DIR = BASE/"audit_out"/"plots"
 PLOTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -103,15 +110,46 @@ def plot_and_append(results_csv: Path, exp_name: str, N: int):
         "plot_pr": str(out_pr) if out_pr else ""
     }
 
-    if SUMMARY_CSV.exists():
-        pd.concat([pd.read_csv(SUMMARY_CSV), pd.DataFrame([row])], ignore_index=True)\
-          .to_csv(SUMMARY_CSV, index=False)
-    else:
-        pd.DataFrame([row]).to_csv(SUMMARY_CSV, index=False)
+    # append puro: no se relee ni reescribe el historial
+    nuevo = not SUMMARY_CSV.exists() or SUMMARY_CSV.stat().st_size == 0
+    with open(SUMMARY_CSV, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(row))
+        if nuevo: w.writeheader()
+        w.writerow(row)
 
     print("Gráficos:", out_map, ("| " + out_pr if out_pr else ""))
     print("Resumen actualizado:", SUMMARY_CSV)
 
+def exportar_y_medir(run_dir: Path, data_yaml: Path, N: int):
+    """Una fila por variante (imgsz[_int8]) con mAP del modelo exportado + FPS/p95 de scripts/bench_onnx_cpu.py."""
+    best = run_dir/"weights"/"best.pt"
+    if not EXPORT_IMGSZ:
+        return
+    if not best.exists():
+        print(f"[AVISO] No encuentro {best}; no exporto ni mido {run_dir.name}.")
+        return
+    from bench_modelos import exportar_onnx, cuantizar_int8, validar, medir_onnx
+    calib = sorted((BASE/"subsets_series"/f"train_{N}"/"images").glob("*.*"))
+    filas = []
+    for s in EXPORT_IMGSZ:
+        try:
+            onnx = exportar_onnx(best, s)
+            variantes = [(str(s), onnx)]
+            if EXPORT_INT8:
+                variantes.append((f"{s}_int8", cuantizar_int8(onnx, calib, s)))
+            for v, p in variantes:
+                m50, m5095 = validar(p, data_yaml, s, BATCH, DEVICE)
+                lat = medir_onnx(p, s) or {"fps": float("nan"), "p95_ms": float("nan")}
+                filas.append({"variante": v, "imgsz": s, "int8": int(v.endswith("_int8")),
+                              "mAP50": m50, "mAP50_95": m5095, **lat, "onnx": str(p)})
+                print(f"[BENCH] {run_dir.name} {v}: mAP50 {m50:.3f} | {lat['fps']:.1f} FPS | p95 {lat['p95_ms']:.1f} ms")
+        except Exception as e:
+            print(f"[AVISO] Falló export/benchmark de {run_dir.name} a imgsz={s}: {e}  — sigo.")
+    if filas:
+        with open(run_dir/BENCH_CSV, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(filas[0]))
+            w.writeheader(); w.writerows(filas)
+
 def main():
     for N in NS:
         data_yaml = BASE/"subsets_series"/f"train_{N}"/f"data_{N}.yaml"
@@ -119,6 +157,13 @@ def main():
             print(f"[AVISO] No existe {data_yaml}. ¿Ya generaste subsets_series para N={N}? Me salto.")
             continue
 
+        if NS_AUTO:
+            from curva_aprendizaje import vale_la_pena
+            vale, motivo = vale_la_pena(N)
+            print(f"[AUTO] N={N}: {'entreno' if vale else 'me salto'} — {motivo}")
+            if not vale:
+                continue
+
         exp_name = f"{NAME_PREFIX}{N:04d}"
         cmd = [
             "yolo", "detect", "train",
@@ -142,6 +187,7 @@ def main():
                 results_csv = found[0]
 
         plot_and_append(results_csv, exp_name, N)
+        exportar_y_medir(results_csv.parent, data_yaml, N)
 
     print("\n=== LISTO ===")
     print("Gráficas por corrida en:", PLOTS_DIR)
@@ -1,7 +1,12 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse, csv, os, stat, tempfile
+import numpy as np
 
 # Ajustes
 MIN_BOX_AREA = 0.0005  # descarta cajas minúsculas
+WORKERS = os.cpu_count() or 1
+DIFF_CSV = Path("audit_out")/"sanitize_diff.csv"
 SPLITS_TO_FIX = [
     Path("valid/labels"),
     Path("test/labels"),
@@ -13,9 +18,6 @@ SPLITS_TO_FIX = [
     Path("subsets_series/train_2514/labels"),
 ]
 
-def clamp01(x):
-    return max(0.0, min(1.0, x))
-
 def line_to_bbox(parts):
     """
     parts: lista de strings. Formatos posibles:
@@ -35,23 +37,19 @@ def line_to_bbox(parts):
         # ya está en formato bbox
         cx, cy, w, h = nums
     else:
-        # formato segmento: pares (x,y)
+        # formato segmento: pares (x,y) -> min/max vectorizado
         if len(nums) % 2 != 0 or len(nums) < 6:
             return None
-        xs = nums[0::2]
-        ys = nums[1::2]
-        # min/max ya están normalizados 0..1 (asumido)
-        x1, x2 = min(xs), max(xs)
-        y1, y2 = min(ys), max(ys)
-        # clamp a [0,1] por seguridad
-        x1 = clamp01(x1); x2 = clamp01(x2)
-        y1 = clamp01(y1); y2 = clamp01(y2)
-        w = x2 - x1
-        h = y2 - y1
+        xy = np.asarray(nums, dtype=np.float64).reshape(-1, 2)
+        # min/max ya están normalizados 0..1 (asumido); clamp a [0,1] por seguridad
+        x1, y1 = np.clip(xy.min(axis=0), 0.0, 1.0)
+        x2, y2 = np.clip(xy.max(axis=0), 0.0, 1.0)
+        w = float(x2 - x1)
+        h = float(y2 - y1)
         if w <= 0 or h <= 0:
             return None
-        cx = x1 + w/2
-        cy = y1 + h/2
+        cx = float(x1) + w/2
+        cy = float(y1) + h/2
 
     # validar rangos
     if not (0 <= cx <= 1 and 0 <= cy <= 1 and 0 < w <= 1 and 0 < h <= 1):
@@ -60,54 +58,109 @@ def line_to_bbox(parts):
         return None
     return (cls, cx, cy, w, h)
 
-def sanitize_dir(lbl_dir: Path):
-    fixed_files = 0
-    dropped_lines = 0
-    total_lines = 0
-    changed = 0
+def sanitize_text(txt: str):
+    """Devuelve (contenido_nuevo, líneas_totales, líneas_descartadas)."""
+    out = []
+    total = dropped = 0
+    for ln in txt.splitlines():
+        ln = ln.strip()
+        if not ln:
+            continue
+        total += 1
+        bbox = line_to_bbox(ln.split())
+        if bbox is None:
+            dropped += 1
+            continue
+        cls, cx, cy, w, h = bbox
+        out.append(f"{cls} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}")
+    # si todas las líneas eran inválidas, queda vacío
+    return ("\n".join(out) + "\n") if out else "", total, dropped
+
+def write_atomic(path: Path, data: bytes):
+    """Escribe en un temporal del mismo directorio y reemplaza con os.replace (nunca deja un label truncado)."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush(); os.fsync(f.fileno())
+        if path.exists():   # mkstemp crea con 0600: conservar los permisos del label original
+            os.chmod(tmp, stat.S_IMODE(path.stat().st_mode))
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+def sanitize_file(txt: Path, dry=False):
+    """Procesa un label. Devuelve (ruta, estado, total, descartadas, n_antes, n_despues); estado: igual|cambiado|vaciado|error."""
+    try:
+        old = txt.read_bytes()
+        new_txt, total, dropped = sanitize_text(old.decode("utf-8"))
+    except Exception:
+        return str(txt), "error", 0, 0, 0, 0
+    new = new_txt.encode("utf-8")
+    n_old = sum(1 for ln in old.splitlines() if ln.strip())
+    n_new = new_txt.count("\n")
+    if new == old:
+        return str(txt), "igual", total, dropped, n_old, n_new
+    if not dry:
+        write_atomic(txt, new)
+    return str(txt), ("cambiado" if new else "vaciado"), total, dropped, n_old, n_new
 
-    if not lbl_dir.exists():
-        print(f"[AVISO] No existe {lbl_dir}")
-        return
+def _lote(args):
+    files, dry = args
+    return [sanitize_file(Path(f), dry) for f in files]
 
-    for txt in lbl_dir.glob("*.txt"):
-        try:
-            lines = [ln.strip() for ln in txt.read_text(encoding="utf-8").splitlines()]
-        except Exception:
+def sanitize_dirs(dirs, dry=False, workers=WORKERS, chunk=256):
+    """Sanitiza todos los labels de `dirs` con un pool de procesos. Devuelve {dir: [resultados]}."""
+    tareas = []
+    for d in dirs:
+        if not d.exists():
+            print(f"[AVISO] No existe {d}")
             continue
-        out = []
-        any_change = False
-        for ln in lines:
-            if not ln:
-                continue
-            total_lines += 1
-            parts = ln.split()
-            bbox = line_to_bbox(parts)
-            if bbox is None:
-                dropped_lines += 1
-                any_change = True
-                continue
-            cls, cx, cy, w, h = bbox
-            new_ln = f"{cls} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}"
-            if new_ln != ln or parts[0] != "0" or len(parts) != 5:
-                any_change = True
-            out.append(new_ln)
+        files = sorted(str(p) for p in d.glob("*.txt"))
+        tareas += [(d, files[i:i+chunk]) for i in range(0, len(files), chunk)]
+    res = {d: [] for d in dirs if d.exists()}
+    if workers <= 1:
+        for d, files in tareas:
+            res[d] += _lote((files, dry))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for (d, _), out in zip(tareas, ex.map(_lote, [(f, dry) for _, f in tareas])):
+                res[d] += out
+    return res
 
-        if any_change:
-            if out:
-                txt.write_text("\n".join(out) + "\n", encoding="utf-8")
-                fixed_files += 1
-                changed += 1
-            else:
-                # si todas las líneas eran inválidas, deja el archivo vacío
-                txt.write_text("", encoding="utf-8")
-                changed += 1
+def sanitize_dir(lbl_dir: Path, dry=False, workers=WORKERS):
+    filas = sanitize_dirs([lbl_dir], dry, workers).get(lbl_dir, [])
+    if lbl_dir.exists(): resumen(lbl_dir, filas, dry)
+    return filas
 
-    print(f"[OK] {lbl_dir} -> archivos modificados: {fixed_files}, líneas totales: {total_lines}, líneas descartadas: {dropped_lines}, cambiados: {changed}")
+def resumen(lbl_dir: Path, filas, dry=False):
+    fixed_files = sum(1 for r in filas if r[1] == "cambiado")
+    changed = fixed_files + sum(1 for r in filas if r[1] == "vaciado")
+    total_lines = sum(r[2] for r in filas)
+    dropped_lines = sum(r[3] for r in filas)
+    tag = "[DRY] " if dry else "[OK] "
+    verbo = "a modificar" if dry else "modificados"
+    print(f"{tag}{lbl_dir} -> archivos {verbo}: {fixed_files}, líneas totales: {total_lines}, líneas descartadas: {dropped_lines}, cambiados: {changed}, sin cambios: {sum(1 for r in filas if r[1]=='igual')}")
 
 def main():
-    for d in SPLITS_TO_FIX:
-        sanitize_dir(d)
+    ap = argparse.ArgumentParser(description="Sanitiza labels YOLO (segmentos -> bbox, clase única, descarta cajas inválidas)")
+    ap.add_argument("--dry-run", action="store_true", help=f"No escribe; resume los cambios y los detalla en {DIFF_CSV}")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+
+    res = sanitize_dirs(SPLITS_TO_FIX, args.dry_run, args.workers)
+    for d, filas in res.items():
+        resumen(d, filas, args.dry_run)
+    if args.dry_run:
+        DIFF_CSV.parent.mkdir(exist_ok=True)
+        with open(DIFF_CSV, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["archivo", "estado", "lineas_totales", "lineas_descartadas", "lineas_antes", "lineas_despues"])
+            for filas in res.values():
+                w.writerows(r for r in filas if r[1] != "igual")
+        print("Detalle de cambios:", DIFF_CSV)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,29 @@
 # ONNXRuntime CPU benchmark
-import argparse, onnxruntime as ort, numpy as np, time, os
+import argparse, onnxruntime as ort, numpy as np, time, os, sys, glob
 p=argparse.ArgumentParser()
 p.add_argument('--onnx', required=True)
 p.add_argument('--imgsz', type=int, default=640)
+p.add_argument('--images', help='optional image glob (e.g. "valid/images/*.jpg"): also times the real letterbox preprocessing')
 a=p.parse_args()
 assert os.path.exists(a.onnx), f'ONNX not found: {a.onnx}'
 sess = ort.InferenceSession(a.onnx, providers=['CPUExecutionProvider'])
 name = sess.get_inputs()[0].name
 dummy = np.random.randn(1,3,a.imgsz,a.imgsz).astype(np.float32)
+prep = None
+if a.images:
+    import cv2
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from preproceso import Preproceso
+    frames = [cv2.imread(f) for f in sorted(glob.glob(a.images))[:64]]
+    frames = [f for f in frames if f is not None]
+    assert frames, f'no images match {a.images}'
+    pre = Preproceso(a.imgsz, dst=dummy)
+    def prep(i): pre(frames[i % len(frames)], 0)
 for _ in range(50): _ = sess.run(None, {name: dummy})
-ts=[]
-for _ in range(200):
-    t0=time.time(); _ = sess.run(None, {name: dummy}); ts.append((time.time()-t0)*1000)
+ts=[]; tp=[]
+for i in range(200):
+    t0=time.time()
+    if prep: prep(i)
+    t1=time.time(); _ = sess.run(None, {name: dummy}); ts.append((time.time()-t0)*1000); tp.append((t1-t0)*1000)
 p95 = sorted(ts)[int(0.95*len(ts))-1]; fps = 1000.0/(sum(ts)/len(ts))
-print(f'ONNXRuntime CPU  FPS={fps:.1f}   p95(ms)={p95:.2f}')
\ No newline at end of file
+print(f'ONNXRuntime CPU  FPS={fps:.1f}   p95(ms)={p95:.2f}' + (f'   preprocess(ms)={sum(tp)/len(tp):.2f}' if prep else ''))
@@ -0,0 +1,137 @@
+# Scaling benchmark for the data-preparation scripts on synthetic datasets (see gen_dataset_sintetico.py)
+# python scripts/bench_pipelines.py --sizes 1000 10000 --work /tmp/bench_ds
+# Records wall time, throughput, peak RSS and detection of each injected defect type.
+import argparse, csv, json, os, shutil, subprocess, sys, time
+from collections import defaultdict
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from gen_dataset_sintetico import generate
+
+# limpieza reason -> GT defect it should catch
+REASON_DEFECT = {"duplicate_exact": "exact_dup", "near_duplicate": "near_dup", "too_small": "small",
+                 "blurry": "blurry", "exposure_extreme": "dark|bright", "bad_label": "bad_label", "tiny_box": "tiny_box"}
+
+def load_gt(ds: Path):
+    with open(ds/"gt.csv", newline="", encoding="utf-8") as f:
+        return {(r["split"], r["image"]): r["defect"] for r in csv.DictReader(f)}
+
+def base_defect(d): return d.split(":")[0]
+
+def recall_table(gt, flagged):
+    """flagged: {(split,image): defect_family_predicted}. Recall per GT defect + false positive rate on ok images."""
+    tot, hit = defaultdict(int), defaultdict(int)
+    for k, d in gt.items():
+        b = base_defect(d)
+        tot[b] += 1
+        pred = flagged.get(k)
+        if b == "ok":
+            hit[b] += pred is not None
+        elif pred is not None and b in pred.split("|"):
+            hit[b] += 1
+    out = {f"recall_{b}": round(hit[b]/tot[b], 3) for b in tot if b != "ok"}
+    out["fp_rate_ok"] = round(hit["ok"]/max(tot["ok"], 1), 4)
+    return out
+
+def check_limpieza(ds, gt):
+    flagged = {}
+    with open(ds/"audit_out"/"moves_log.csv", newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            p = Path(r["src_img"])
+            reason = "near_duplicate" if r["reason"].startswith("near_duplicate") else r["reason"]
+            flagged.setdefault((p.parts[-3], p.name), REASON_DEFECT.get(reason, reason))
+    return recall_table(gt, flagged)
+
+def check_baseline(ds, gt):
+    with open(ds/"audit_out"/"baseline_antes_por_split.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    found = sum(int(r["labels_invalidos"]) for r in rows)
+    expected = sum(1 for d in gt.values() if base_defect(d) in ("bad_label", "tiny_box"))
+    missing = sum(1 for d in gt.values() if d == "bad_label:missing")
+    return {"invalid_found": found, "invalid_expected": expected,
+            "missing_found": sum(int(r["imgs_sin_label"]) for r in rows), "missing_expected": missing}
+
+def check_sanitize(ds, gt):
+    changed = set()
+    with open(ds/"audit_out"/"sanitize_diff.csv", newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            p = Path(r["archivo"]); changed.add((p.parts[0], p.stem + ".jpg"))
+    should = {k for k, d in gt.items() if k[0] in ("valid", "test") and d in ("bad_label:coords", "bad_label:format", "tiny_box")}
+    ok = {k for k, d in gt.items() if k[0] in ("valid", "test") and d == "ok"}
+    return {"recall_fixable_labels": round(len(changed & should)/max(len(should), 1), 3),
+            "fp_rate_ok": round(len(changed & ok)/max(len(ok), 1), 4)}
+
+def check_subsets(ds, gt):
+    sub = sorted((ds/"subsets_series").glob("train_*"), key=lambda p: int(p.name.split("_")[1]))
+    if not sub: return {}
+    chosen = {("train", p.name) for p in (sub[-1]/"images").iterdir()}
+    bad_train = {k for k, d in gt.items() if k[0] == "train" and d != "ok"}
+    return {"largest_subset": len(chosen), "contaminated": len(chosen & bad_train),
+            "train_defects_excluded": round(1 - len(chosen & bad_train)/max(len(bad_train), 1), 3)}
+
+PIPELINES = {
+    "limpieza": (["limpieza_etapas.py"], check_limpieza),
+    "baseline": (["baseline_antes.py"], check_baseline),
+    "sanitize": (["sanitize_labels_detect.py", "--dry-run"], check_sanitize),
+    "subsets": (["make_subsets_series.py"], check_subsets),
+}
+
+def run(cmd, cwd):
+    """Runs cmd in cwd; returns (returncode, wall_s, peak_rss_mb) using wait4 for the child's own rusage."""
+    env = dict(os.environ, PYTHONPATH=str(REPO) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    t0 = time.perf_counter()
+    p = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    err = p.stderr.read()
+    _, status, ru = os.wait4(p.pid, 0)
+    wall = time.perf_counter() - t0
+    p.returncode = os.waitstatus_to_exitcode(status)
+    if p.returncode != 0:
+        print(err.decode(errors="ignore")[-2000:], file=sys.stderr)
+    return p.returncode, wall, ru.ru_maxrss/1024
+
+def fresh_copy(src: Path, dst: Path):
+    """Hard-linked copy: the pipelines rename or atomically replace files, so the pristine dataset stays intact."""
+    if dst.exists(): shutil.rmtree(dst)
+    shutil.copytree(src, dst, copy_function=os.link)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark data-prep pipelines on synthetic datasets")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--work", type=Path, default=Path("bench_ds"))
+    ap.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    ap.add_argument("--python", default=sys.executable, help="interpreter for the pipelines (make_subsets_series needs >= 3.12)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, default=Path("audit_out")/"bench_pipelines.csv")
+    a = ap.parse_args()
+
+    rows = []
+    for n in a.sizes:
+        ds = a.work/f"synth_{n}_s{a.seed}"
+        if not (ds/"gt.csv").exists():
+            print(f"generating {ds} ...")
+            generate(ds, n, a.seed)
+        gt = load_gt(ds)
+        for name in a.pipelines:
+            args, check = PIPELINES[name]
+            runs = a.work/"run"
+            fresh_copy(ds, runs)
+            rc, wall, rss = run([a.python, str(REPO/args[0]), *args[1:]], runs)
+            metrics = check(runs, gt) if rc == 0 else {}
+            row = {"pipeline": name, "n_images": len(gt), "returncode": rc, "wall_s": round(wall, 2),
+                   "img_per_s": round(len(gt)/wall, 1), "peak_rss_mb": round(rss, 1), "metrics": json.dumps(metrics)}
+            rows.append(row)
+            print(f"{name:9s} n={len(gt):7d}  {wall:8.2f}s  {row['img_per_s']:8.1f} img/s  rss={rss:7.1f}MB  {metrics}")
+        shutil.rmtree(a.work/"run", ignore_errors=True)
+
+    a.out.parent.mkdir(parents=True, exist_ok=True)
+    new = not a.out.exists()
+    with open(a.out, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["timestamp", *rows[0]] if rows else ["timestamp"])
+        if new: w.writeheader()
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for r in rows: w.writerow({"timestamp": ts, **r})
+    print("Results:", a.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Multi-process ONNX inference: shared-memory ring (pool_shm.py) vs pickling frames to a multiprocessing.Pool
+# python scripts/bench_pool_shm.py --onnx yolov8n.onnx --workers 1 2 4 8 --frames 400
+import argparse, os, sys, time
+import multiprocessing as mp
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from inferencia_onnx import Detector, letterbox
+from pool_shm import PoolInferencia
+
+_det = None
+def _init(onnx):
+    global _det
+    _det = Detector(onnx, hilos=1)
+
+def _infer_pickled(args):
+    x, meta, shape = args  # the (3,S,S) float32 tensor travels pickled
+    return _det.detectar(x[None], [meta], [shape])[0]
+
+def bench_pickle(onnx, workers, frames, imgsz):
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init, initargs=(onnx,)) as pool:
+        pool.map(_infer_pickled, [(*letterbox(frames[0], imgsz), frames[0].shape[:2])]*workers)  # warm-up
+        t0 = time.perf_counter()
+        gen = ((*letterbox(f, imgsz), f.shape[:2]) for f in frames)
+        n = sum(1 for _ in pool.imap_unordered(_infer_pickled, gen, chunksize=1))
+        return n/(time.perf_counter() - t0)
+
+def bench_shm(onnx, workers, frames, imgsz):
+    with PoolInferencia(onnx, workers=workers, imgsz=imgsz) as pool:
+        list(pool.mapa(frames[:workers], leer=lambda f: f))  # warm-up (model load)
+        t0 = time.perf_counter()
+        n = sum(1 for _ in pool.mapa(frames, leer=lambda f: f))
+        return n/(time.perf_counter() - t0)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--onnx', required=True)
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--frames', type=int, default=200)
+    a = p.parse_args()
+    assert os.path.exists(a.onnx), f'ONNX not found: {a.onnx}'
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(16)]
+    frames = [frames[i % 16] for i in range(a.frames)]
+    print(f'cpus={os.cpu_count()}  frames={a.frames}  imgsz={a.imgsz}')
+    for w in a.workers:
+        fp = bench_pickle(a.onnx, w, frames, a.imgsz)
+        fs = bench_shm(a.onnx, w, frames, a.imgsz)
+        print(f'workers={w:2d}  pickle FPS={fp:7.1f}   shared-memory FPS={fs:7.1f}')
+
+if __name__ == '__main__':
+    main()
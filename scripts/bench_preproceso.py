@@ -0,0 +1,52 @@
+# Letterbox preprocessing benchmark: straightforward version vs fused/preallocated (preproceso.py)
+# python scripts/bench_preproceso.py --imgsz 640 --src 720x1280
+import argparse, sys, time, tracemalloc
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from inferencia_onnx import letterbox
+from preproceso import Preproceso
+
+def bench(fn, frames, n):
+    for f in frames[:10]: fn(f)
+    ts = []
+    for i in range(n):
+        f = frames[i % len(frames)]
+        t0 = time.perf_counter(); fn(f); ts.append((time.perf_counter()-t0)*1000)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(frames[0])
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    ts.sort()
+    return sum(ts)/len(ts), ts[int(0.95*len(ts))-1], peak/2**20
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--imgsz', type=int, default=640)
+    p.add_argument('--src', default='720x1280', help='HxW of the input frames')
+    p.add_argument('--batch', type=int, default=8)
+    p.add_argument('--n', type=int, default=300)
+    a = p.parse_args()
+    h, w = map(int, a.src.split('x'))
+    frames = [np.random.default_rng(i).integers(0, 255, (h, w, 3), dtype=np.uint8) for i in range(8)]
+
+    batch = np.empty((a.batch, 3, a.imgsz, a.imgsz), np.float32)
+    k = [0]
+    def naive(f):
+        x, meta = letterbox(f, a.imgsz)
+        batch[k[0] % a.batch] = x; k[0] += 1
+        return meta
+    pre = Preproceso(a.imgsz, dst=batch)
+    def fused(f):
+        meta = pre(f, k[0] % a.batch); k[0] += 1
+        return meta
+
+    for name, fn in (('straightforward', naive), ('fused', fused)):
+        mean, p95, peak = bench(fn, frames, a.n)
+        print(f'{name:16s} mean={mean:6.2f}ms  p95={p95:6.2f}ms  temp alloc/frame={peak:6.2f}MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# Synthetic YOLO dataset generator with injected defects at known rates (ground truth in gt.csv)
+# python scripts/gen_dataset_sintetico.py --out /tmp/synth_10k --n 10000
+import argparse, csv, os, json
+from multiprocessing import Pool
+from pathlib import Path
+import numpy as np, cv2
+
+SPLITS = {"train": 0.8, "valid": 0.1, "test": 0.1}
+# defect -> default rate (fraction of n). exact/near duplicates are extra copies of train images in valid/test.
+RATES = {"exact_dup": 0.02, "near_dup": 0.02, "blurry": 0.02, "dark": 0.01, "bright": 0.01,
+         "small": 0.01, "bad_label": 0.02, "tiny_box": 0.01}
+BAD_KINDS = ["coords", "format", "empty", "missing"]
+
+def render(rng, w, h):
+    """Textured background with a bright plate-like box. Returns (bgr, [cx,cy,bw,bh])."""
+    small = rng.integers(0, 256, (max(h//16, 2), max(w//16, 2), 3), dtype=np.uint8)
+    img = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    img = cv2.add(img, rng.integers(0, 40, (h, w, 3), dtype=np.uint8))
+    bw, bh = rng.uniform(0.12, 0.35), rng.uniform(0.05, 0.12)
+    cx, cy = rng.uniform(bw/2, 1-bw/2), rng.uniform(bh/2, 1-bh/2)
+    x1, y1, x2, y2 = int((cx-bw/2)*w), int((cy-bh/2)*h), int((cx+bw/2)*w), int((cy+bh/2)*h)
+    cv2.rectangle(img, (x1, y1), (x2, y2), (235, 235, 235), -1)
+    for k in range(6):  # fake characters
+        xa = x1 + (k+0.5)*(x2-x1)/6.5
+        cv2.line(img, (int(xa), y1+3), (int(xa), y2-3), (20, 20, 20), 2)
+    return img, [cx, cy, bw, bh]
+
+def fmt_label(boxes):
+    return "".join(f"0 {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}\n" for cx, cy, bw, bh in boxes)
+
+def make_one(job):
+    """job: (out, split, name, defect, seed, w, h, src) -> writes image+label."""
+    out, split, name, defect, seed, w, h, src = job
+    rng = np.random.default_rng(seed)
+    img_p = Path(out)/split/"images"/f"{name}.jpg"
+    lbl_p = Path(out)/split/"labels"/f"{name}.txt"
+    if defect in ("exact_dup", "near_dup"):
+        s_img = Path(out)/"train"/"images"/f"{src}.jpg"
+        s_lbl = Path(out)/"train"/"labels"/f"{src}.txt"
+        if defect == "exact_dup":
+            img_p.write_bytes(s_img.read_bytes())
+        else:
+            im = cv2.imread(str(s_img))
+            im = cv2.resize(im, (int(im.shape[1]*0.95), int(im.shape[0]*0.95)), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(str(img_p), cv2.convertScaleAbs(im, alpha=1.0, beta=4), [cv2.IMWRITE_JPEG_QUALITY, 85])
+        lbl_p.write_bytes(s_lbl.read_bytes())
+        return
+    if defect == "small":
+        w, h = w*3//8, h*3//8
+    img, box = render(rng, w, h)
+    if defect == "blurry":
+        img = cv2.GaussianBlur(img, (0, 0), 6)
+    elif defect == "dark":
+        img = cv2.subtract(img // 2, 65)  # saturating, keeps texture
+    elif defect == "bright":
+        img = cv2.convertScaleAbs(img, alpha=0.3, beta=180)
+    cv2.imwrite(str(img_p), img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    boxes = [box]
+    if defect == "tiny_box":
+        lbl_p.write_text(fmt_label([[box[0], box[1], 0.01, 0.01]]), encoding="utf-8")
+    elif defect.startswith("bad_label"):
+        kind = defect.split(":")[1]
+        if kind == "coords":
+            lbl_p.write_text(fmt_label([[1.4, box[1], box[2], box[3]]]), encoding="utf-8")
+        elif kind == "format":
+            lbl_p.write_text(f"0 {box[0]:.6f} {box[1]:.6f}\n", encoding="utf-8")
+        elif kind == "empty":
+            lbl_p.write_text("", encoding="utf-8")
+        # missing: no label file
+    else:
+        lbl_p.write_text(fmt_label(boxes), encoding="utf-8")
+
+def plan(n, seed, rates):
+    """Returns (base, dups): lists of (split, name, defect, seed, src). Base images are generated before duplicates."""
+    rng = np.random.default_rng(seed)
+    n_dup = {d: int(round(rates.get(d, 0)*n)) for d in ("exact_dup", "near_dup")}
+    n_base = n - sum(n_dup.values())
+    defects = []
+    for d in ("blurry", "dark", "bright", "small", "bad_label", "tiny_box"):
+        k = int(round(rates.get(d, 0)*n))
+        if d == "bad_label":
+            defects += [f"bad_label:{BAD_KINDS[i % len(BAD_KINDS)]}" for i in range(k)]
+        else:
+            defects += [d]*k
+    defects += ["ok"]*max(n_base - len(defects), 0)
+    defects = np.array(defects[:n_base], dtype=object)
+    rng.shuffle(defects)
+    splits = rng.choice(list(SPLITS), size=n_base, p=list(SPLITS.values()))
+    base = [(str(splits[i]), f"img_{i:07d}", str(defects[i]), seed*1_000_003 + i, None) for i in range(n_base)]
+    train_ok = [b[1] for b in base if b[0] == "train" and b[2] == "ok"]
+    dups = []
+    for d, k in n_dup.items():
+        srcs = rng.choice(train_ok, size=min(k, len(train_ok)), replace=False) if train_ok else []
+        for j, src in enumerate(srcs):
+            dups.append((str(rng.choice(["valid", "test"])), f"{d}_{j:07d}", d, 0, str(src)))
+    return base, dups
+
+def generate(out: Path, n: int, seed=0, rates=RATES, w=416, h=320, workers=None):
+    for s in SPLITS:
+        (out/s/"images").mkdir(parents=True, exist_ok=True)
+        (out/s/"labels").mkdir(parents=True, exist_ok=True)
+    base, dups = plan(n, seed, rates)
+    with Pool(workers or os.cpu_count()) as pool:
+        for rows in (base, dups):  # duplicates need their train source on disk first
+            pool.map(make_one, [(str(out), s, nm, d, sd, w, h, src) for s, nm, d, sd, src in rows], chunksize=64)
+    with open(out/"gt.csv", "w", newline="", encoding="utf-8") as f:
+        wr = csv.writer(f); wr.writerow(["split", "image", "defect", "src"])
+        for s, nm, d, _, src in base + dups:
+            wr.writerow([s, f"{nm}.jpg", d, src or ""])
+    meta = {"n": len(base) + len(dups), "seed": seed, "rates": rates, "w": w, "h": h}
+    (out/"gt_meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    return meta
+
+def main():
+    p = argparse.ArgumentParser(description="Synthetic YOLO dataset with injected defects")
+    p.add_argument("--out", type=Path, required=True)
+    p.add_argument("--n", type=int, default=1000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--w", type=int, default=416)
+    p.add_argument("--h", type=int, default=320)
+    p.add_argument("--workers", type=int, default=None)
+    for d, r in RATES.items():
+        p.add_argument(f"--rate-{d.replace('_', '-')}", dest=d, type=float, default=r)
+    a = p.parse_args()
+    meta = generate(a.out, a.n, a.seed, {d: getattr(a, d) for d in RATES}, a.w, a.h, a.workers)
+    print(f"Generated {meta['n']} images in {a.out} (ground truth: {a.out/'gt.csv'})")
+
+if __name__ == "__main__":
+    main()
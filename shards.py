@@ -0,0 +1,177 @@
+# shards.py
+# Formato empaquetado del dataset para I/O secuencial (NFS: la latencia por archivo domina).
+# Por split se generan:
+#   <split>_NNN.bin        bytes de imagen (JPEG/PNG tal cual) + bytes del label, concatenados
+#   <split>.idx.npy        índice (IDX_DTYPE), ordenado por stem
+#   <split>.boxes.npy      cajas (M,5) float32 [cls,cx,cy,w,h] ya parseadas
+# Uso:
+#   python shards.py pack   --root . --out shards
+#   python shards.py unpack --shards shards --out /scratch/dataset   (layout YOLO, p.ej. para entrenar)
+#   python shards.py info   --shards shards
+from pathlib import Path
+import argparse, os
+import numpy as np
+from tqdm import tqdm
+
+SPLITS = ["train", "valid", "test"]
+IMG_EXTS = {".jpg",".jpeg",".png",".bmp",".webp"}
+SHARD_MB = 1024
+
+IDX_DTYPE = np.dtype([
+    ("stem", "S128"),
+    ("ext", "S8"),
+    ("shard", "u2"),
+    ("img_off", "u8"), ("img_len", "u4"),
+    ("lbl_off", "u8"), ("lbl_len", "i4"),   # lbl_len = -1 si no hay label
+    ("box_ini", "u4"), ("box_n", "u2"),
+    ("img_mtime_ns", "i8"),                  # mtime del archivo al empaquetar (para detectar cambios posteriores)
+])
+
+def parse_boxes(txt: bytes):
+    """Líneas 'cls cx cy w h' parseables -> array (n,5) float32 (las demás se ignoran; el texto crudo se conserva)."""
+    out = []
+    for ln in txt.decode("utf-8", errors="ignore").splitlines():
+        s = ln.split()
+        if len(s) < 5: continue
+        try:
+            out.append((float(int(s[0])), *map(float, s[1:5])))
+        except ValueError:
+            continue
+    return np.asarray(out, dtype=np.float32).reshape(-1, 5)
+
+def pack_split(root: Path, split: str, out: Path, shard_mb=SHARD_MB):
+    img_dir, lbl_dir = root/split/"images", root/split/"labels"
+    if not img_dir.exists():
+        print(f"[AVISO] No existe {img_dir}")
+        return 0
+    imgs = sorted((p for p in img_dir.iterdir() if p.suffix.lower() in IMG_EXTS), key=lambda p: p.stem)
+    idx = np.zeros(len(imgs), dtype=IDX_DTYPE)
+    boxes = []
+    nbox = 0
+    shard, off, f = 0, 0, None
+    limite = shard_mb << 20
+    try:
+        for i, img in enumerate(tqdm(imgs, desc=f"empaquetando {split}")):
+            if f is None or off >= limite:
+                if f: f.close()
+                shard = shard + 1 if f else 0
+                f = open(out/f"{split}_{shard:03d}.bin", "wb"); off = 0
+            if len(img.stem.encode("utf-8")) > IDX_DTYPE["stem"].itemsize:
+                raise ValueError(f"stem demasiado largo para el índice: {img.stem}")
+            mtime = img.stat().st_mtime_ns
+            data = img.read_bytes()
+            lbl = lbl_dir/(img.stem + ".txt")
+            ltxt = lbl.read_bytes() if lbl.exists() else None
+            b = parse_boxes(ltxt) if ltxt else np.zeros((0, 5), np.float32)
+            idx[i] = (img.stem.encode("utf-8"), img.suffix.encode(), shard, off, len(data),
+                      off + len(data), -1 if ltxt is None else len(ltxt), nbox, len(b), mtime)
+            f.write(data)
+            if ltxt: f.write(ltxt)
+            off += len(data) + (len(ltxt) if ltxt else 0)
+            boxes.append(b); nbox += len(b)
+    finally:
+        if f: f.close()
+    np.save(out/f"{split}.idx.npy", idx)
+    np.save(out/f"{split}.boxes.npy", np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32))
+    return len(imgs)
+
+class Shards:
+    """Lector memory-mapped de un split empaquetado: acceso por stem y recorrido secuencial."""
+    def __init__(self, shards_dir: Path, split: str):
+        self.dir, self.split = Path(shards_dir), split
+        self.idx = np.load(self.dir/f"{split}.idx.npy")
+        self.boxes = np.load(self.dir/f"{split}.boxes.npy", mmap_mode="r")
+        self._mm = {}
+
+    def __len__(self): return len(self.idx)
+
+    def _shard(self, k):
+        k = int(k)
+        if k not in self._mm:
+            self._mm[k] = np.memmap(self.dir/f"{self.split}_{k:03d}.bin", dtype=np.uint8, mode="r")
+        return self._mm[k]
+
+    def pos(self, stem: str):
+        key = stem.encode("utf-8")
+        i = int(np.searchsorted(self.idx["stem"], key))
+        if i >= len(self.idx) or self.idx["stem"][i] != key:
+            raise KeyError(stem)
+        return i
+
+    def img_bytes(self, i):
+        r = self.idx[i]
+        o = int(r["img_off"])
+        return self._shard(r["shard"])[o:o + int(r["img_len"])]
+
+    def lbl_bytes(self, i):
+        r = self.idx[i]
+        if r["lbl_len"] < 0: return None
+        o = int(r["lbl_off"])
+        return bytes(self._shard(r["shard"])[o:o + int(r["lbl_len"])])
+
+    def boxes_de(self, i):
+        r = self.idx[i]
+        o = int(r["box_ini"])
+        return self.boxes[o:o + int(r["box_n"])]
+
+    def stem(self, i): return self.idx["stem"][i].decode("utf-8")
+    def nombre(self, i): return self.stem(i) + self.idx["ext"][i].decode()
+
+    def leer_img(self, i, flags=None):
+        import cv2
+        return cv2.imdecode(np.asarray(self.img_bytes(i)), cv2.IMREAD_COLOR if flags is None else flags)
+
+    def __getitem__(self, stem):
+        i = self.pos(stem)
+        return self.img_bytes(i), self.boxes_de(i)
+
+    def __iter__(self):
+        """Recorre en orden de shard/offset (lectura secuencial). Produce (i, stem, img_bytes, boxes)."""
+        orden = np.lexsort((self.idx["img_off"], self.idx["shard"]))
+        for i in orden:
+            yield int(i), self.stem(i), self.img_bytes(i), self.boxes_de(i)
+
+def unpack(shards_dir: Path, out_root: Path, splits=SPLITS):
+    n = 0
+    for split in splits:
+        if not (Path(shards_dir)/f"{split}.idx.npy").exists(): continue
+        sh = Shards(shards_dir, split)
+        (out_root/split/"images").mkdir(parents=True, exist_ok=True)
+        (out_root/split/"labels").mkdir(parents=True, exist_ok=True)
+        for i, stem, data, _ in tqdm(sh, total=len(sh), desc=f"desempaquetando {split}"):
+            (out_root/split/"images"/sh.nombre(i)).write_bytes(data.tobytes())
+            lbl = sh.lbl_bytes(i)
+            if lbl is not None:
+                (out_root/split/"labels"/(stem + ".txt")).write_bytes(lbl)
+            n += 1
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Empaqueta/desempaqueta el dataset YOLO en shards secuenciales")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack"); p.add_argument("--root", type=Path, default=Path("."))
+    p.add_argument("--out", type=Path, default=Path("shards")); p.add_argument("--shard-mb", type=int, default=SHARD_MB)
+    p.add_argument("--splits", nargs="+", default=SPLITS)
+    u = sub.add_parser("unpack"); u.add_argument("--shards", type=Path, default=Path("shards"))
+    u.add_argument("--out", type=Path, required=True); u.add_argument("--splits", nargs="+", default=SPLITS)
+    i = sub.add_parser("info"); i.add_argument("--shards", type=Path, default=Path("shards"))
+    args = ap.parse_args()
+
+    if args.cmd == "pack":
+        args.out.mkdir(parents=True, exist_ok=True)
+        for split in args.splits:
+            n = pack_split(args.root, split, args.out, args.shard_mb)
+            print(f"{split}: {n} imágenes empaquetadas")
+        print("Shards en:", args.out)
+    elif args.cmd == "unpack":
+        n = unpack(args.shards, args.out, args.splits)
+        print(f"Desempaquetadas: {n} imágenes en {args.out}")
+    else:
+        for idx in sorted(args.shards.glob("*.idx.npy")):
+            split = idx.name[:-len(".idx.npy")]
+            sh = Shards(args.shards, split)
+            mb = sum(os.path.getsize(p) for p in args.shards.glob(f"{split}_*.bin")) / 2**20
+            print(f"{split}: {len(sh)} imágenes | {len(sh.boxes)} cajas | {mb:.1f} MB en {len(list(args.shards.glob(f'{split}_*.bin')))} shards")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# telemetria.py
+# Instrumentación liviana del runtime de inferencia (detector / OCR):
+#   - Histograma: cubetas fijas (bisect sobre una tupla corta + incremento), sin asignar memoria por muestra
+#   - Contador (drops, aciertos/fallos de caché) y Medidor (profundidad de colas; acepta una función
+#     que se evalúa recién al exportar, así el camino caliente no paga nada)
+#   - Exportación en texto Prometheus por HTTP local (/metrics) y volcado JSON (/metrics.json o a_json())
+# Uso:
+#   from telemetria import REG, ETAPAS
+#   t0 = time.perf_counter(); ...; ETAPAS["inferencia"].observar(time.perf_counter() - t0)
+#   REG.servir(9108)                       # http://127.0.0.1:9108/metrics
+#   python telemetria.py                   # costo por muestra
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json, threading, time
+
+# segundos, de 50 µs a 10 s (latencias de decode/preproceso/inferencia/NMS/OCR)
+LIMITES_S = (5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_BATCH = (1, 2, 4, 8, 16, 32, 64)
+
+def _etiquetas(et):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in et.items()) + "}" if et else ""
+
+class _PorHilo:
+    """Cada hilo escribe en su propia lista (sin lock en el camino caliente); la exportación suma todas."""
+    def _init_hilos(self, largo):
+        self._largo, self._local, self._todas, self._lock = largo, threading.local(), [], threading.Lock()
+
+    def _nuevo(self):
+        c = [0]*self._largo
+        with self._lock:
+            self._todas.append(c)
+        self._local.c = c
+        return c
+
+    def _total(self):
+        with self._lock:
+            listas = list(self._todas)
+        return [sum(x) for x in zip(*listas)] if listas else [0]*self._largo
+
+class Histograma(_PorHilo):
+    """Cuentas por cubeta (le=límite) + suma. observar() < 1 µs en CPython (bisect + 2 incrementos, sin lock)."""
+    tipo = "histogram"
+    def __init__(self, nombre, ayuda="", limites=LIMITES_S, etiquetas=None):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas or {}
+        self.limites = tuple(limites)
+        self._init_hilos(len(self.limites) + 2)     # cubetas (la última es +Inf) + suma al final
+
+    def observar(self, v):
+        try:
+            c = self._local.c
+        except AttributeError:
+            c = self._nuevo()
+        c[bisect_left(self.limites, v)] += 1
+        c[-1] += v
+
+    @property
+    def cuentas(self):
+        return self._total()[:-1]
+
+    @property
+    def suma(self):
+        return self._total()[-1]
+
+    def cronometro(self):
+        """with h.cronometro(): ...  (cómodo; en bucles muy calientes usar perf_counter + observar)"""
+        return _Crono(self)
+
+    def cuantil(self, q, cuentas=None):
+        """Estimación por interpolación lineal dentro de la cubeta (como histogram_quantile)."""
+        cuentas = self.cuentas if cuentas is None else cuentas
+        n = sum(cuentas)
+        if n == 0:
+            return None
+        objetivo, acum = q*n, 0
+        for i, c in enumerate(cuentas):
+            if acum + c >= objetivo and c:
+                lo = self.limites[i - 1] if i > 0 else 0.0
+                hi = self.limites[i] if i < len(self.limites) else self.limites[-1]
+                return lo + (hi - lo)*(objetivo - acum)/c
+            acum += c
+        return self.limites[-1]
+
+    def prometheus(self):
+        et, tot = self.etiquetas, self._total()
+        acum, out = 0, []
+        for lim, c in zip(self.limites + ("+Inf",), tot[:-1]):
+            acum += c
+            out.append(f"{self.nombre}_bucket{_etiquetas({**et, 'le': lim})} {acum}")
+        out.append(f"{self.nombre}_sum{_etiquetas(et)} {tot[-1]}")
+        out.append(f"{self.nombre}_count{_etiquetas(et)} {acum}")
+        return out
+
+    def a_dict(self):
+        tot = self._total()
+        cuentas, suma = tot[:-1], tot[-1]
+        n = sum(cuentas)
+        return {"etiquetas": self.etiquetas, "n": n, "suma": suma, "media": suma/n if n else None,
+                "p50": self.cuantil(0.5, cuentas), "p95": self.cuantil(0.95, cuentas), "p99": self.cuantil(0.99, cuentas),
+                "cubetas": dict(zip([str(l) for l in self.limites] + ["+Inf"], cuentas))}
+
+class _Crono:
+    __slots__ = ("h", "t0")
+    def __init__(self, h): self.h = h
+    def __enter__(self): self.t0 = time.perf_counter(); return self
+    def __exit__(self, *exc): self.h.observar(time.perf_counter() - self.t0)
+
+class Contador(_PorHilo):
+    tipo = "counter"
+    def __init__(self, nombre, ayuda="", etiquetas=None):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas or {}
+        self._init_hilos(1)
+
+    def inc(self, n=1):
+        try:
+            c = self._local.c
+        except AttributeError:
+            c = self._nuevo()
+        c[0] += n
+
+    @property
+    def valor(self):
+        return self._total()[0]
+
+    def prometheus(self):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas)} {self.valor}"]
+
+    def a_dict(self):
+        return {"etiquetas": self.etiquetas, "valor": self.valor}
+
+class Medidor:
+    """Valor instantáneo. fijar(v), o fuente=callable que se lee al exportar (p.ej. lambda: cola.qsize())."""
+    tipo = "gauge"
+    def __init__(self, nombre, ayuda="", etiquetas=None, fuente=None):
+        self.nombre, self.ayuda, self.etiquetas, self.fuente = nombre, ayuda, etiquetas or {}, fuente
+        self.valor = 0
+
+    def fijar(self, v):
+        self.valor = v
+
+    def leer(self):
+        if self.fuente is None:
+            return self.valor
+        try:
+            return self.fuente()
+        except Exception:
+            return float("nan")
+
+    def prometheus(self):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas)} {self.leer()}"]
+
+    def a_dict(self):
+        return {"etiquetas": self.etiquetas, "valor": self.leer()}
+
+class Registro:
+    """Conjunto de métricas; mismo nombre + etiquetas distintas = una familia Prometheus."""
+    def __init__(self):
+        self.metricas = {}
+        self._lock = threading.Lock()
+        self._srv = None
+
+    def _obtener(self, cls, nombre, ayuda, etiquetas, **kw):
+        clave = (nombre, tuple(sorted((etiquetas or {}).items())))
+        with self._lock:
+            m = self.metricas.get(clave)
+            if m is None:
+                m = self.metricas[clave] = cls(nombre, ayuda, etiquetas=etiquetas, **kw)
+        return m
+
+    def histograma(self, nombre, ayuda="", etiquetas=None, limites=LIMITES_S):
+        return self._obtener(Histograma, nombre, ayuda, etiquetas, limites=limites)
+
+    def contador(self, nombre, ayuda="", etiquetas=None):
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre, ayuda="", etiquetas=None, fuente=None):
+        m = self._obtener(Medidor, nombre, ayuda, etiquetas)
+        if fuente is not None:
+            m.fuente = fuente
+        return m
+
+    def prometheus(self):
+        lineas, vistos = [], set()
+        for (nombre, _), m in sorted(self.metricas.items(), key=lambda kv: kv[0]):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                if m.ayuda: lineas.append(f"# HELP {nombre} {m.ayuda}")
+                lineas.append(f"# TYPE {nombre} {m.tipo}")
+            lineas += m.prometheus()
+        return "\n".join(lineas) + "\n"
+
+    def a_json(self, path=None):
+        d = {}
+        for (nombre, _), m in sorted(self.metricas.items(), key=lambda kv: kv[0]):
+            d.setdefault(nombre, []).append(m.a_dict())
+        d = {"ts": time.time(), "metricas": d}
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(d, f, indent=2)
+        return d
+
+    def servir(self, puerto, host="127.0.0.1"):
+        """Endpoint HTTP en un hilo daemon: /metrics (Prometheus) y /metrics.json."""
+        reg = self
+        class H(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    cuerpo, tipo = json.dumps(reg.a_json()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    cuerpo, tipo = reg.prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404); return
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+            def log_message(self, *a):
+                pass
+        self._srv = ThreadingHTTPServer((host, puerto), H)
+        threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+        return self._srv
+
+    def detener(self):
+        if self._srv:
+            self._srv.shutdown(); self._srv.server_close(); self._srv = None
+
+REG = Registro()
+ETAPAS = {e: REG.histograma("placas_etapa_segundos", "Latencia por etapa del pipeline", {"etapa": e})
+          for e in ("decode", "preproceso", "inferencia", "nms", "ocr", "total")}
+TAM_BATCH = REG.histograma("placas_batch_tamano", "Imágenes por batch de inferencia", limites=LIMITES_BATCH)
+
+def bench(n=200_000):
+    h = Histograma("bench")
+    vals = [1e-4*(i % 997) for i in range(n)]
+    t0 = time.perf_counter()
+    for v in vals:
+        h.observar(v)
+    dt = time.perf_counter() - t0
+    c = Contador("bench_c")
+    t1 = time.perf_counter()
+    for _ in range(n):
+        c.inc()
+    dc = time.perf_counter() - t1
+    print(f"Histograma.observar: {dt/n*1e9:.0f} ns/muestra | Contador.inc: {dc/n*1e9:.0f} ns")
+
+if __name__ == "__main__":
+    bench()